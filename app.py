@@ -1,16 +1,43 @@
 import json
 import os
 import re
+import atexit
+import contextvars
+import bisect
+import gzip
+import hashlib
+import heapq
+import hmac
+import io
+import math
+import mmap
+import multiprocessing
 import logging
 import asyncio
 import signal
+import struct
+import sys
+import tempfile
+import time
+import sqlite3
+import uuid
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, List
+from enum import IntEnum
+from itertools import accumulate, chain, pairwise
+from types import MappingProxyType
+from typing import Awaitable, Callable, Iterable, Iterator, Optional, Tuple, List, Union
+from urllib.parse import parse_qs, urlsplit
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, BaseRateLimiter, BaseUpdateProcessor, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 import traceback
 from functools import wraps
-from flask import Flask
+from flask import Flask, request
 import threading
 
 # إعداد الـ logging المتقدم
@@ -41,1615 +68,7977 @@ ADMIN_IDS = [1124247595, 1108589010]
 
 DB_FILE = "accounts_db.json"
 
-BACKUP_DIR = "backups"
+JOURNAL_FILE = "accounts_db.journal"
 
-# الإعدادات الافتراضية
+# صيغة الـ snapshot في تخزين json: json (الافتراضي) أو binary (أعمدة مضغوطة بتتحمل أسرع)
 
-DEFAULT_PENDING_HOURS = 36
+SNAPSHOT_FORMAT = os.environ.get("SNAPSHOT_FORMAT", "json")
 
-DEFAULT_COOLDOWN_HOURS = 36
+BINARY_DB_FILE = "accounts_db.bin"
 
-DEFAULT_FIXED_PASSWORD = "PsPcXbox999"
+# نوع التخزين: json (الافتراضي) أو sqlite
 
-# متغير للتحكم في إعادة التشغيل
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
 
-should_restart = False
+SQLITE_FILE = "accounts.db"
 
-def error_handler(func):
+BACKUP_DIR = "backups"
 
-    """ديكوريتر لمعالجة الأخطاء"""
+# النسخ الاحتياطية التزايدية: كل قد إيه بتتعمل نقطة استرجاع، وأقدم نقطة بتتحفظ
 
-    @wraps(func)
+BACKUP_INTERVAL_SECONDS = 60 * 60
 
-    async def wrapper(*args, **kwargs):
+BACKUP_RETENTION_HOURS = 7 * 24
 
-        try:
+# عدد العمليات في الـ journal قبل ضغطه في snapshot جديد
 
-            return await func(*args, **kwargs)
+JOURNAL_COMPACT_OPS = 5000
 
-        except Exception as e:
+# الكتابة المؤجلة: تجميع العمليات وحفظها مرة كل فترة أو كل عدد عمليات
 
-            logger.error(f"خطأ في {func.__name__}: {e}")
+FLUSH_INTERVAL_MS = 200
 
-            logger.error(traceback.format_exc())
+FLUSH_MAX_OPS = 500
 
+# محاولات كتابة الدفعة قبل ما الـ flusher يعتبر الكتابة فاشلة (flush بيرجع False والعمليات الجديدة بتترفض)، وبعدها محاولة كل FLUSH_FAILED_RETRY_SECONDS
 
+FLUSH_MAX_RETRIES = 5
 
-            try:
+FLUSH_FAILED_RETRY_SECONDS = 30
 
-                if args and hasattr(args[0], 'message'):
+# نشر نسخة القراءة: عدد محاولات نسخ الحسابات والأعمدة بره القفل (لو حصل تعديل وسط النسخ) قبل ما تتنسخ تحته
 
-                    await args[0].message.reply_text(
+SNAPSHOT_COPY_RETRIES = 3
 
-                        f"❌ **حدث خطأ:**\n`{str(e)}`\n\nتم تسجيل التفاصيل في السجل.",
+# جدولة تفعيل الحسابات: أقصى نوم بين الفحوصات وحجم الـ tick اللي بيتجمع فيه التفعيل
 
-                        parse_mode='Markdown'
+PROMOTION_TICK_SECONDS = 1
 
-                    )
+PROMOTION_MAX_SLEEP_SECONDS = 60
 
-            except:
+# إرسال إشعار للأدمن لما حسابات تبقى متاحة (1 للتفعيل)
 
-                pass
+NOTIFY_PROMOTIONS = os.environ.get("NOTIFY_PROMOTIONS", "0") == "1"
 
+# سجل الأنشطة: ملف NDJSON منفصل بيتقسم بالحجم + آخر سجلات في الذاكرة
 
+ACTIVITY_LOG_FILE = "activity_log.ndjson"
 
-            return None
+ACTIVITY_LOG_MAX_BYTES = 10 * 1024 * 1024
 
-    return wrapper
+ACTIVITY_LOG_BACKUPS = 5
 
-class AccountManager:
+ACTIVITY_LOG_MEMORY = 1000
 
-    def __init__(self):
+# أنواع العمليات اللي ليها فلتر في عرض السجل وعدد السجلات في الصفحة
 
-        self.create_backup_dir()
+ACTIVITY_LOG_FILTERS = ["استخدام حساب", "إضافة حساب", "إضافة حسابات", "تعديل باسورد", "حذف حساب"]
 
-        self.load_database()
+ACTIVITY_LOG_PAGE_SIZE = 10
 
-        self.setup_auto_backup()
+# حجز دفعة حسابات: مدة الـ lease قبل ما ترجع للمتاح لو متأكدتش، وأقصى عدد، وأكبر دفعة تتبعت في رسالة بدل ملف
 
+LEASE_SECONDS = 10 * 60
 
+BATCH_CHECKOUT_MAX = 200
 
-    def create_backup_dir(self):
+BATCH_MESSAGE_LIMIT = 15
 
-        """إنشاء مجلد النسخ الاحتياطية"""
+# مهلة تثبيت سحب الحساب أو الحجز على القرص قبل تسليم البيانات (لو خلصت البيانات مبتتبعتش والحساب بيرجع)
 
-        if not os.path.exists(BACKUP_DIR):
+DELIVERY_FLUSH_SECONDS = 10
 
-            os.makedirs(BACKUP_DIR)
+# عدد الحسابات في كل صفحة من عرض الكل وتبويباته بالترتيب
 
+ACCOUNTS_PAGE_SIZE = 10
 
+ACCOUNTS_BROWSER_TABS = {"available": "✅ المتاحة", "pending": "⏳ في الانتظار", "cooldown": "🔄 في Cooldown"}
 
-    def setup_auto_backup(self):
+# توقع الإتاحة: عدد الساعات في الـ histogram والمدد اللي بتتعرض كملخص
 
-        """إعداد النسخ الاحتياطي التلقائي"""
+FORECAST_HOURS = 48
 
-        try:
+FORECAST_HORIZONS = (6, 12, 24)
 
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+# استيراد ملفات الحسابات: الامتدادات المقبولة وأقصى حجم (حد التحميل في Bot API) وعدد السطور في كل دفعة وأقل وقت بين تحديثات رسالة التقدم
 
-            backup_file = os.path.join(BACKUP_DIR, f"auto_backup_{timestamp}.json")
+IMPORT_EXTENSIONS = (".txt", ".csv")
 
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
 
+IMPORT_BATCH_LINES = 5000
 
-            if os.path.exists(DB_FILE):
+IMPORT_PROGRESS_SECONDS = 2
 
-                import shutil
+# الاستخراج المتوازي: عدد العمليات، وأقل حجم نص يستاهل العمليات (أصغر منه بيتحلل inline)، وأقل عدد سطور في كل جزء
 
-                shutil.copy2(DB_FILE, backup_file)
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
 
-                logger.info(f"تم إنشاء نسخة احتياطية: {backup_file}")
+PARALLEL_PARSE_MIN_CHARS = 200_000
 
+PARALLEL_PARSE_CHUNK_LINES = 2000
 
+# قياسات الأداء: حدود الـ histogram بالثواني (زي حدود Prometheus الافتراضية) وعدد العمليات في رد /perf
 
-                # حذف النسخ القديمة (الاحتفاظ بآخر 10)
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
 
-                backup_files = [f for f in os.listdir(BACKUP_DIR) if f.startswith('auto_backup_')]
+PERF_TOP = 15
 
-                backup_files.sort()
+# طابور الإرسال: حدود تيليجرام (حوالي 30 رسالة في الثانية للبوت ورسالة في الثانية لكل chat مع دفعة صغيرة) ومهلة تفريغه قبل الإيقاف
 
+SEND_GLOBAL_RATE = 30
 
+SEND_CHAT_RATE = 1
 
-                if len(backup_files) > 10:
+SEND_CHAT_BURST = 3
 
-                    for old_backup in backup_files[:-10]:
+SEND_DRAIN_SECONDS = 10
 
-                        try:
+# عدد مرات إعادة المحاولة بعد RetryAfter للإرسال المباشر (اللي مش بيعدي على الطابور)
 
-                            os.remove(os.path.join(BACKUP_DIR, old_backup))
+SEND_MAX_RETRIES = 3
 
-                        except:
+# طريقة التشغيل: flask (الافتراضي - Flask في الخيط الرئيسي والبوت في خيط تاني) أو integrated (عملية واحدة بـ event loop واحد للبوت والـ endpoints)
 
-                            pass
+SERVE_MODE = os.environ.get("SERVE_MODE", "flask")
 
-        except Exception as e:
+# الخادم المدمج: أقصى وقت سكوت على اتصال keep-alive قبل قفله
 
-            logger.error(f"خطأ في النسخ الاحتياطي: {e}")
+STATUS_KEEPALIVE_SECONDS = 5
 
+# استقبال التحديثات: polling (الافتراضي) أو webhook على نفس منفذ الـ endpoints - WEBHOOK_URL هو العنوان العام للخدمة والـ secret بيتبعت من تيليجرام في كل طلب
 
+UPDATE_MODE = os.environ.get("UPDATE_MODE", "polling")
 
-    def load_database(self):
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")
 
-        """تحميل قاعدة البيانات مع معالجة الأخطاء"""
+WEBHOOK_PATH = "/telegram-webhook"
 
-        try:
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
 
-            if os.path.exists(DB_FILE):
+WEBHOOK_MAX_BYTES = 1024 * 1024
 
-                with open(DB_FILE, 'r', encoding='utf-8') as f:
+# عنوان Bot API (بيتغير لخادم محلي وقت الاختبار زي benchmarks/fake_bot_api.py)
 
-                    content = f.read().strip()
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org").rstrip("/")
 
-                    if content:
+# أقصى عدد تحديثات بتتعالج في نفس الوقت (تحديثات كل أدمن بالترتيب، والأدمنز المختلفين بالتوازي)
 
-                        self.db = json.loads(content)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "32"))
 
-                        self._validate_database()
+# الإعدادات الافتراضية
 
-                    else:
+DEFAULT_PENDING_HOURS = 36
 
-                        self._create_default_db()
+DEFAULT_COOLDOWN_HOURS = 36
 
-            else:
+DEFAULT_FIXED_PASSWORD = "PsPcXbox999"
 
-                self._create_default_db()
+# متغير للتحكم في إعادة التشغيل
 
+should_restart = False
 
 
-            logger.info(f"تم تحميل قاعدة البيانات: {len(self.db['accounts'])} حساب")
 
+class LatencyMetrics:
 
+    """قياسات زمن التنفيذ في الذاكرة لكل عملية (handler / storage / parse): histogram بحدود ثابتة وعدد المرات والأخطاء
 
-        except json.JSONDecodeError as e:
+    الخطأ = استثناء طالع من العملية أو سجل ERROR اتكتب جواها (أغلب الـ handlers بتمسك أخطاءها وتسجلها)"""
 
-            logger.error(f"خطأ في قراءة JSON: {e}")
 
-            self._restore_from_backup()
 
-        except Exception as e:
+    def __init__(self, buckets: Tuple[float, ...] = METRICS_BUCKETS):
 
-            logger.error(f"خطأ في تحميل قاعدة البيانات: {e}")
+        self.buckets = tuple(buckets)
 
-            self._create_default_db()
+        self._lock = threading.Lock()
 
+        # (kind, name) -> [عدادات الحدود + خانة أكبر من آخر حد، عدد المرات، مجموع الثواني، عدد الأخطاء]
 
+        self._series = {}
 
-    def _validate_database(self):
+        # حالة العملية الجارية في الـ task أو الـ thread الحالي عشان سجلات ERROR تتحسب عليها
 
-        """التحقق من صحة بنية قاعدة البيانات"""
+        self._active = contextvars.ContextVar("active_operation", default=None)
 
-        if not isinstance(self.db, dict):
 
-            raise ValueError("قاعدة البيانات ليست dict")
 
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False):
 
+        index = bisect.bisect_left(self.buckets, seconds)
 
-        if "accounts" not in self.db:
+        with self._lock:
 
-            self.db["accounts"] = {}
+            series = self._series.get((kind, name))
 
+            if series is None:
 
+                series = self._series[(kind, name)] = [[0] * (len(self.buckets) + 1), 0, 0.0, 0]
 
-        if "settings" not in self.db:
+            series[0][index] += 1
 
-            self.db["settings"] = {
+            series[1] += 1
 
-                "pending_hours": DEFAULT_PENDING_HOURS,
+            series[2] += seconds
 
-                "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+            if error:
 
-                "fixed_password": DEFAULT_FIXED_PASSWORD
+                series[3] += 1
 
-            }
 
 
+    @contextmanager
 
-        if "fixed_password" not in self.db["settings"]:
+    def track(self, kind: str, name: str):
 
-            self.db["settings"]["fixed_password"] = DEFAULT_FIXED_PASSWORD
+        """قياس زمن الكتلة وتسجيله تحت (kind, name)"""
 
+        state = {"error": False}
 
+        token = self._active.set(state)
 
-        if "logs" not in self.db:
+        start = time.perf_counter()
 
-            self.db["logs"] = []
+        try:
 
+            yield
 
+        except BaseException:
 
-        if "stats" not in self.db:
+            state["error"] = True
 
-            self.db["stats"] = {
+            raise
 
-                "total_requests": 0,
+        finally:
 
-                "successful_requests": 0,
+            self._active.reset(token)
 
-                "last_restart": datetime.now().isoformat()
+            self.observe(kind, name, time.perf_counter() - start, state["error"])
 
-            }
 
 
+    def timed(self, kind: str):
 
-        # التحقق من بيانات كل حساب
+        """ديكوريتر لقياس دالة عادية أو async باسمها"""
 
-        for email, data in list(self.db["accounts"].items()):
 
-            if not isinstance(data, dict):
 
-                del self.db["accounts"][email]
+        def decorator(func):
 
-                continue
+            if asyncio.iscoroutinefunction(func):
 
+                @wraps(func)
 
+                async def async_wrapper(*args, **kwargs):
 
-            required_fields = {
+                    with self.track(kind, func.__name__):
 
-                "password": "",
+                        return await func(*args, **kwargs)
 
-                "added_at": datetime.now().isoformat(),
+                return async_wrapper
 
-                "available_at": datetime.now().isoformat(),
 
-                "status": "available",
 
-                "last_used": None,
+            @wraps(func)
 
-                "use_count": 0,
+            def wrapper(*args, **kwargs):
 
-                "priority": 1
+                with self.track(kind, func.__name__):
 
-            }
+                    return func(*args, **kwargs)
 
+            return wrapper
 
+        return decorator
 
-            for field, default_value in required_fields.items():
 
-                if field not in data:
 
-                    data[field] = default_value
+    def mark_error(self):
 
+        """تسجيل خطأ على العملية الجارية (من MetricsLogHandler)"""
 
+        state = self._active.get()
 
-    def _create_default_db(self):
+        if state is not None:
 
-        """إنشاء قاعدة بيانات افتراضية"""
+            state["error"] = True
 
-        self.db = {
 
-            "accounts": {},
 
-            "settings": {
+    def summary(self) -> List[dict]:
 
-                "pending_hours": DEFAULT_PENDING_HOURS,
+        """ملخص كل عملية مترتب بالزمن الكلي: العدد والأخطاء والمتوسط وp50 / p95 من الـ histogram"""
 
-                "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+        with self._lock:
 
-                "fixed_password": DEFAULT_FIXED_PASSWORD
+            series = [(kind, name, list(counts), count, total, errors)
 
-            },
+                      for (kind, name), (counts, count, total, errors) in self._series.items()]
 
-            "logs": [],
+        rows = []
 
-            "stats": {
+        for kind, name, counts, count, total, errors in series:
 
-                "total_requests": 0,
+            rows.append({
 
-                "successful_requests": 0,
+                "kind": kind,
 
-                "last_restart": datetime.now().isoformat()
+                "name": name,
 
-            }
+                "count": count,
 
-        }
+                "errors": errors,
 
-        self.save_database()
+                "total_seconds": total,
 
-        logger.info("تم إنشاء قاعدة بيانات جديدة")
+                "avg_ms": total / count * 1000,
 
+                "p50_ms": self._quantile(counts, count, 0.5) * 1000,
 
+                "p95_ms": self._quantile(counts, count, 0.95) * 1000
 
-    def _restore_from_backup(self):
+            })
 
-        """استعادة من النسخة الاحتياطية"""
+        rows.sort(key=lambda row: row["total_seconds"], reverse=True)
 
-        try:
+        return rows
 
-            backup_files = [f for f in os.listdir(BACKUP_DIR) if f.startswith('auto_backup_')]
 
-            backup_files.sort(reverse=True)
 
+    def _quantile(self, counts: List[int], count: int, q: float) -> float:
 
+        """تقدير الـ quantile بالتوزيع الخطي جوه الحد زي histogram_quantile في Prometheus"""
 
-            if backup_files:
+        rank = q * count
 
-                latest_backup = os.path.join(BACKUP_DIR, backup_files[0])
+        cumulative = 0
 
-                with open(latest_backup, 'r', encoding='utf-8') as f:
+        for index, bucket_count in enumerate(counts):
 
-                    self.db = json.load(f)
+            if cumulative + bucket_count >= rank and bucket_count:
 
-                self._validate_database()
+                if index == len(self.buckets):
 
-                self.save_database()
+                    # أكبر من آخر حد - مفيش حد أعلى فبنرجع آخر حد
 
-                logger.info(f"تم الاستعادة من النسخة الاحتياطية: {backup_files[0]}")
+                    return self.buckets[-1]
 
-            else:
+                lower = self.buckets[index - 1] if index else 0.0
 
-                self._create_default_db()
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
 
-        except Exception as e:
+            cumulative += bucket_count
 
-            logger.error(f"فشل في الاستعادة من النسخة الاحتياطية: {e}")
+        return 0.0
 
-            self._create_default_db()
 
 
+    def prometheus(self) -> str:
 
-    def save_database(self):
+        """كل القياسات بصيغة Prometheus text (histogram تراكمي + عداد أخطاء)"""
 
-        """حفظ قاعدة البيانات مع معالجة الأخطاء"""
+        with self._lock:
 
-        max_retries = 3
+            series = sorted((key, list(counts), count, total, errors)
 
-        for attempt in range(max_retries):
+                            for key, (counts, count, total, errors) in self._series.items())
 
-            try:
+        lines = [
 
-                temp_file = f"{DB_FILE}.tmp"
+            "# HELP bot_operation_duration_seconds زمن تنفيذ الـ handlers والتخزين والاستخراج",
 
-                with open(temp_file, 'w', encoding='utf-8') as f:
+            "# TYPE bot_operation_duration_seconds histogram"
 
-                    json.dump(self.db, f, ensure_ascii=False, indent=2)
+        ]
 
+        for (kind, name), counts, count, total, _ in series:
 
+            labels = f'kind="{kind}",name="{name}"'
 
-                if os.path.exists(DB_FILE):
+            for bound, cumulative in zip(self.buckets, accumulate(counts)):
 
-                    os.replace(temp_file, DB_FILE)
+                lines.append(f'bot_operation_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
 
-                else:
+            lines.append(f'bot_operation_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
 
-                    os.rename(temp_file, DB_FILE)
+            lines.append(f"bot_operation_duration_seconds_sum{{{labels}}} {total}")
 
+            lines.append(f"bot_operation_duration_seconds_count{{{labels}}} {count}")
 
+        lines.append("# HELP bot_operation_errors_total عدد العمليات اللي انتهت بخطأ")
 
-                return True
+        lines.append("# TYPE bot_operation_errors_total counter")
 
+        for (kind, name), _, _, _, errors in series:
 
+            lines.append(f'bot_operation_errors_total{{kind="{kind}",name="{name}"}} {errors}')
 
-            except Exception as e:
+        return "\n".join(lines) + "\n"
 
-                logger.error(f"محاولة {attempt + 1}: خطأ في حفظ قاعدة البيانات: {e}")
 
-                if attempt == max_retries - 1:
 
-                    # في حالة فشل كل المحاولات، نحفظ نسخة احتياطية طارئة
+class MetricsLogHandler(logging.Handler):
 
-                    emergency_file = f"emergency_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    """أي سجل ERROR أثناء عملية متقاسة بيتحسب خطأ عليها"""
 
-                    try:
 
-                        with open(emergency_file, 'w', encoding='utf-8') as f:
 
-                            json.dump(self.db, f, ensure_ascii=False, indent=2)
+    def __init__(self, metrics: LatencyMetrics):
 
-                        logger.info(f"تم حفظ نسخة احتياطية طارئة: {emergency_file}")
+        super().__init__(level=logging.ERROR)
 
-                    except:
+        self.metrics = metrics
 
-                        pass
 
-                    return False
 
+    def emit(self, record: logging.LogRecord):
 
+        self.metrics.mark_error()
 
-        return False
 
 
+metrics = LatencyMetrics()
 
-    def add_log(self, action: str, details: str = ""):
+logger.addHandler(MetricsLogHandler(metrics))
 
-        """إضافة سجل للأنشطة"""
 
-        try:
 
-            log_entry = {
+class TokenBucket:
 
-                "timestamp": datetime.now().isoformat(),
+    """token bucket: rate توكن في الثانية لحد capacity (الدفعة المسموحة)"""
 
-                "action": action,
+    __slots__ = ("rate", "capacity", "tokens", "updated")
 
-                "details": details
 
-            }
 
-            self.db["logs"].append(log_entry)
+    def __init__(self, rate: float, capacity: float):
 
+        self.rate = rate
 
+        self.capacity = capacity
 
-            if len(self.db["logs"]) > 200:
+        self.tokens = capacity
 
-                self.db["logs"] = self.db["logs"][-200:]
+        self.updated = time.monotonic()
 
 
 
-            # حفظ فوري للسجلات المهمة
+    def _refill(self, now: float):
 
-            if action in ["إضافة حساب", "حذف حساب", "استخدام حساب"]:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
 
-                self.save_database()
+        self.updated = now
 
 
 
-        except Exception as e:
+    def wait_time(self, now: float) -> float:
 
-            logger.error(f"خطأ في إضافة السجل: {e}")
+        """الثواني لحد ما يبقى فيه توكن"""
 
+        self._refill(now)
 
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
 
-    def is_valid_email(self, email: str) -> bool:
 
-        """التحقق من صحة الإيميل"""
 
-        if not email or not isinstance(email, str):
+    def take(self, now: float):
 
-            return False
+        self._refill(now)
 
+        self.tokens -= 1
 
 
-        email = email.strip().lower()
 
+@dataclass(slots=True)
 
+class SendJob:
 
-        if len(email) < 5 or len(email) > 100:
+    """عملية واحدة في طابور الإرسال: call بترجع الـ coroutine وقت التنفيذ (عشان التعديل يستبدلها بالنص الأحدث)"""
 
-            return False
+    kind: str
 
+    call: Callable[[], Awaitable]
 
+    future: asyncio.Future
 
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    # التأخير بيتحسب من وقت ما العملية اللي قبلها في نفس الـ chat تخلص
 
-        return re.match(pattern, email) is not None
+    delay: float = 0.0
 
+    ready_at: float = 0.0
 
+    edit_key: Optional[tuple] = None
 
-    def extract_credentials(self, text: str) -> List[Tuple[str, str]]:
 
-        """استخراج الإيميل والباسورد مع الحفاظ على الرموز الخاصة"""
 
-        credentials = []
+class PendingMessage:
 
+    """رسالة متبعتة من طابور الإرسال: ممكن تتعدل أو تتحذف قبل ما توصل (عمليات الـ chat الواحد بتتنفذ بالترتيب)
 
+    و await عليها بيرجع الـ Message بعد الإرسال"""
 
-        try:
+    __slots__ = ("queue", "chat_id", "future")
 
-            # لا نحذف الرموز الخاصة - نحافظ على النص كما هو
 
-            lines = text.strip().split('\n')
 
+    def __init__(self, queue: "SendQueue", chat_id: int, future: asyncio.Future):
 
+        self.queue = queue
 
-            # أنماط البحث عن الإيميلات
+        self.chat_id = chat_id
 
-            email_patterns = [
+        self.future = future
 
-                r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
 
-                r'[a-zA-Z0-9._%+-]+\[at\][a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
 
-                r'[a-zA-Z0-9._%+-]+\(at\)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    def __await__(self):
 
-            ]
+        return self.future.__await__()
 
 
 
-            # البحث في كل سطر
+    def edit_text(self, text: str, **kwargs) -> asyncio.Future:
 
-            for line_num, line in enumerate(lines):
+        return self.queue.edit(self, text, **kwargs)
 
-                if not line.strip():
 
-                    continue
 
+    def delete(self) -> asyncio.Future:
 
+        return self.queue.delete(self)
 
-                # البحث عن إيميلات في السطر الحالي
 
-                found_emails = []
 
-                for pattern in email_patterns:
+class SendQueue:
 
-                    emails = re.findall(pattern, line, re.IGNORECASE)
+    """طابور الإرسال المشترك لرسايل البوت: الـ handler بيرجع فوراً والإرسال بيكمل في الخلفية على نفس الـ event loop
 
-                    for email in emails:
+    - token bucket عام (SEND_GLOBAL_RATE) وواحد لكل chat (SEND_CHAT_RATE / SEND_CHAT_BURST) للإرسال والتعديل
 
-                        clean_email = email.replace('[at]', '@').replace('(at)', '@').lower().strip()
+    - RetryAfter بيوقف الإرسال كله المدة المطلوبة ويعيد نفس العملية (زي AIORateLimiter في PTB)
 
-                        if clean_email and clean_email not in found_emails:
+    - تعديلات نفس الرسالة اللي لسه متنفذتش بتتدمج في آخر نص، والحذف بيلغي التعديلات اللي مستنية
 
-                            found_emails.append(clean_email)
+    - عمليات الـ chat الواحد بتتنفذ بالترتيب واحدة ورا التانية، والـ chats المختلفة بالتوازي
 
+    - أي طلب تاني للـ Bot API بره الطابور بياخد من نفس التوكنز عن طريق SendRateLimiter"""
 
+    # الحذف مش محسوب في حدود تيليجرام للرسايل
 
-                # لكل إيميل، البحث عن الباسورد
+    LIMITED_KINDS = frozenset(("send", "edit"))
 
-                for email in found_emails:
+    # True جوه عملية بينفذها الطابور (توكنزها اتاخدت قبل ما تبدأ) فـ SendRateLimiter بيعديها
 
-                    password = self._find_password_comprehensive(email, line, lines, line_num)
+    dispatching = contextvars.ContextVar("send_queue_dispatching", default=False)
 
-                    if password:
 
-                        credentials.append((email, password))
 
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
 
+                 chat_burst: float = SEND_CHAT_BURST):
 
-            # إذا لم نجد شيء، نجرب طريقة أخرى
+        self.global_bucket = TokenBucket(global_rate, global_rate)
 
-            if not credentials:
+        self.chat_rate = chat_rate
 
-                credentials = self._alternative_extraction(text)
+        self.chat_burst = chat_burst
 
+        self._buckets = {}
 
+        # chat_id -> العمليات المستنية بالترتيب (أول واحدة ممكن تكون شغالة لو الـ chat في _busy)
 
-            return credentials
+        self._chats = {}
 
+        self._busy = set()
 
+        # مفتاح الرسالة -> التعديل اللي لسه متنفذش عليها
 
-        except Exception as e:
+        self._edits = {}
 
-            logger.error(f"خطأ في استخراج البيانات: {e}")
+        self._paused_until = 0.0
 
-            return []
+        self._wakeup = None
 
+        self._idle = None
 
+        self._worker = None
 
-    def _find_password_comprehensive(self, email: str, current_line: str, all_lines: List[str], line_index: int) -> Optional[str]:
 
-        """البحث الشامل عن الباسورد"""
 
-        try:
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop):
 
-            # 1. البحث في نفس السطر مع فواصل مختلفة
+        if self._worker is not None and not self._worker.done() and self._worker.get_loop() is loop:
 
-            same_line_patterns = [
+            return
 
-                rf'{re.escape(email)}\s+([^\s\n]+)',
+        # loop جديد (إعادة تشغيل أو اختبار): العمليات القديمة تبع loop مقفول
 
-                rf'{re.escape(email)}:([^\s\n]+)',
+        self._chats.clear()
 
-                rf'{re.escape(email)}\|([^\s\n]+)',
+        self._busy.clear()
 
-                rf'{re.escape(email)}\t+([^\s\n]+)',
+        self._edits.clear()
 
-                rf'{re.escape(email)}-([^\s\n]+)',
+        self._wakeup = asyncio.Event()
 
-                rf'{re.escape(email)}_([^\s\n]+)',
+        self._idle = asyncio.Event()
 
-                rf'{re.escape(email)},([^\s\n]+)',
+        self._idle.set()
 
-                rf'{re.escape(email)};([^\s\n]+)',
+        self._worker = loop.create_task(self._run())
 
-                rf'{re.escape(email)}=([^\s\n]+)',
 
-                rf'{re.escape(email)}\s*\(\s*([^)]+)\s*\)',
 
-                rf'{re.escape(email)}\s*\[\s*([^\]]+)\s*\]',
+    @staticmethod
 
-            ]
+    def _retrieve(future: asyncio.Future):
 
+        # الخطأ اتسجل في اللوج - قراءته هنا عشان asyncio ميحذرش لو محدش عمل await
 
+        if not future.cancelled():
 
-            for pattern in same_line_patterns:
+            future.exception()
 
-                match = re.search(pattern, current_line, re.IGNORECASE)
 
-                if match:
 
-                    password = match.group(1).strip()
+    @staticmethod
 
-                    if self._is_valid_password(password):
+    def _resolve(target):
 
-                        return password
+        return target.future.result() if isinstance(target, PendingMessage) else target
 
 
 
-            # 2. البحث بالكلمات في نفس السطر
+    def _submit(self, chat_id: int, kind: str, call: Callable[[], Awaitable], delay: float = 0.0,
 
-            words = current_line.split()
+                edit_key: Optional[tuple] = None) -> asyncio.Future:
 
-            for i, word in enumerate(words):
+        loop = asyncio.get_running_loop()
 
-                if email.lower() in word.lower() and i + 1 < len(words):
+        self._ensure_worker(loop)
 
-                    potential_password = words[i + 1]
+        future = loop.create_future()
 
-                    if self._is_valid_password(potential_password):
+        future.add_done_callback(self._retrieve)
 
-                        return potential_password
+        job = SendJob(kind, call, future, delay, edit_key=edit_key)
 
+        jobs = self._chats.setdefault(chat_id, deque())
 
+        if not jobs:
 
-            # 3. البحث في السطر التالي
+            job.ready_at = time.monotonic() + delay
 
-            if line_index + 1 < len(all_lines):
+        jobs.append(job)
 
-                next_line = all_lines[line_index + 1].strip()
+        if edit_key is not None:
 
-                next_line = re.sub(r'^[^\w]+', '', next_line)
+            self._edits[edit_key] = job
 
+        self._idle.clear()
 
+        self._wakeup.set()
 
-                if next_line:
+        return future
 
-                    if self._is_valid_password(next_line):
 
-                        return next_line
 
+    def reply(self, message, text: str, delay: float = 0.0, **kwargs) -> PendingMessage:
 
+        """رد على رسالة (زي message.reply_text) - delay بالثواني بعد العملية اللي قبلها في نفس الـ chat"""
 
-                    first_word = next_line.split()[0] if next_line.split() else next_line
+        future = self._submit(message.chat_id, "send", lambda: message.reply_text(text, **kwargs), delay)
 
-                    if self._is_valid_password(first_word):
+        return PendingMessage(self, message.chat_id, future)
 
-                        return first_word
 
 
+    def reply_document(self, message, document, delay: float = 0.0, **kwargs) -> PendingMessage:
 
-            # 4. البحث في السطرين التاليين
+        """رد بملف (زي message.reply_document) - document يبقى bytes مش ملف مفتوح عشان يتبعت تاني لو حصل RetryAfter"""
 
-            for offset in [2, 3]:
+        future = self._submit(message.chat_id, "send", lambda: message.reply_document(document, **kwargs), delay)
 
-                if line_index + offset < len(all_lines):
+        return PendingMessage(self, message.chat_id, future)
 
-                    target_line = all_lines[line_index + offset].strip()
 
-                    if target_line and self._is_valid_password(target_line):
 
-                        return target_line
+    def send(self, bot, chat_id: int, text: str, delay: float = 0.0, **kwargs) -> PendingMessage:
 
+        """رسالة جديدة لـ chat (زي bot.send_message)"""
 
+        future = self._submit(chat_id, "send", lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs), delay)
 
-            return None
+        return PendingMessage(self, chat_id, future)
 
 
 
-        except Exception as e:
+    def edit(self, target, text: str, **kwargs) -> asyncio.Future:
 
-            logger.error(f"خطأ في البحث عن الباسورد: {e}")
+        """تعديل نص رسالة (Message أو PendingMessage) - لو فيه تعديل لسه متنفذش لنفس الرسالة نصه بيتستبدل بالأحدث"""
 
-            return None
+        key = (target.chat_id, id(target) if isinstance(target, PendingMessage) else target.message_id)
 
+        call = lambda: self._resolve(target).edit_text(text, **kwargs)
 
+        pending = self._edits.get(key)
 
-    def _alternative_extraction(self, text: str) -> List[Tuple[str, str]]:
+        if pending is not None:
 
-        """طريقة بديلة للاستخراج"""
+            pending.call = call
 
-        try:
+            return pending.future
 
-            credentials = []
+        return self._submit(target.chat_id, "edit", call, edit_key=key)
 
 
 
-            blocks = re.split(r'\n\s*\n', text)
+    def delete(self, target) -> asyncio.Future:
 
+        """حذف رسالة (Message أو PendingMessage) بعد اللي قبله في نفس الـ chat"""
 
+        key = (target.chat_id, id(target) if isinstance(target, PendingMessage) else target.message_id)
 
-            for block in blocks:
+        pending = self._edits.pop(key, None)
 
-                lines = [line.strip() for line in block.split('\n') if line.strip()]
+        if pending is not None:
 
+            # الرسالة هتتحذف فمفيش لازمة للتعديل (التعديل الشغال بيتشال من _edits قبل ما يبدأ)
 
+            self._chats[target.chat_id].remove(pending)
 
-                if len(lines) >= 2:
+            pending.future.set_result(None)
 
-                    for i in range(len(lines) - 1):
+        return self._submit(target.chat_id, "delete", lambda: self._resolve(target).delete())
 
-                        email_match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', lines[i])
 
-                        if email_match:
 
-                            email = email_match.group().lower()
+    async def flush(self, timeout: Optional[float] = None) -> bool:
 
-                            for j in range(i + 1, min(i + 4, len(lines))):
+        """الانتظار لحد ما الطابور يفضى (قبل إيقاف الـ Application)"""
 
-                                potential_password = lines[j].strip()
+        if self._idle is None or self._worker is None or self._worker.get_loop() is not asyncio.get_running_loop():
 
-                                if self._is_valid_password(potential_password):
+            return True
 
-                                    credentials.append((email, potential_password))
+        try:
 
-                                    break
+            await asyncio.wait_for(self._idle.wait(), timeout)
 
+            return True
 
+        except asyncio.TimeoutError:
 
-            return credentials
+            logger.error(f"خطأ في تفريغ طابور الإرسال: فاضل {sum(len(jobs) for jobs in self._chats.values())} عملية")
 
+            return False
 
 
-        except Exception as e:
 
-            logger.error(f"خطأ في الاستخراج البديل: {e}")
+    def _bucket(self, chat_id: int) -> TokenBucket:
 
-            return []
+        bucket = self._buckets.get(chat_id)
 
+        if bucket is None:
 
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
 
-    def _is_valid_password(self, password: str) -> bool:
+        return bucket
 
-        """التحقق من صحة الباسورد مع السماح بكافة الرموز"""
 
-        if not password:
 
-            return False
+    async def acquire(self, chat_id: int):
 
+        """استنى لحد ما يبقى فيه توكن عام وتوكن للـ chat وخدهم (للإرسال المباشر من بره الطابور)"""
 
+        bucket = self._bucket(chat_id)
 
-        password = password.strip()
+        while True:
 
+            now = time.monotonic()
 
+            wait = max(self._paused_until - now, self.global_bucket.wait_time(now), bucket.wait_time(now))
 
-        # تحديد الطول المسموح
+            if wait <= 0:
 
-        if len(password) < 3 or len(password) > 50:
+                self.global_bucket.take(now)
 
-            return False
+                bucket.take(now)
 
+                return
 
+            await asyncio.sleep(wait)
 
-        # استبعاد الكلمات الشائعة
 
-        invalid_words = {
 
-            'email', 'password', 'pass', 'user', 'username', 'login',
+    def pause(self, retry_after: Union[int, float, timedelta]) -> float:
 
-            'account', 'gmail', 'yahoo', 'hotmail', 'outlook', 'mail',
+        """RetryAfter: إيقاف الإرسال كله (الطابور والمباشر) المدة المطلوبة"""
 
-            'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+        seconds = retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
 
-            'with', 'by', 'from', 'of', 'is', 'are', 'was', 'were',
+        logger.warning(f"⏳ حد الإرسال في تيليجرام: إيقاف الإرسال {seconds} ثانية")
 
-            'this', 'that', 'these', 'those', 'here', 'there'
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
 
-        }
+        return seconds
 
 
 
-        if password.lower() in invalid_words:
+    async def _run(self):
 
-            return False
+        """اختيار أقرب chat جاهز (أول عملية وقتها جه والتوكنز متاحة) وتشغيل عمليته في task"""
 
+        while True:
 
+            now = time.monotonic()
 
-        # استبعاد الإيميلات
+            global_wait = max(self._paused_until - now, self.global_bucket.wait_time(now))
 
-        if '@' in password and '.' in password:
+            chosen, wait = None, None
 
-            return False
+            for chat_id, jobs in self._chats.items():
 
+                if chat_id in self._busy:
 
+                    continue
 
-        # استبعاد الأرقام البسيطة جداً
+                job = jobs[0]
 
-        if password.isdigit() and len(password) < 4:
+                ready = job.ready_at - now
 
-            return False
+                if job.kind in self.LIMITED_KINDS:
 
+                    ready = max(ready, global_wait, self._bucket(chat_id).wait_time(now))
 
+                else:
 
-        # استبعاد الأحرف المتكررة
+                    ready = max(ready, self._paused_until - now)
 
-        if len(set(password)) == 1:
+                if wait is None or ready < wait:
 
-            return False
+                    chosen, wait = chat_id, ready
 
+                    if ready <= 0:
 
+                        break
 
-        # يجب أن يحتوي على حروف أو أرقام على الأقل
+            self._wakeup.clear()
 
-        if not re.search(r'[a-zA-Z0-9]', password):
+            if chosen is None:
 
-            return False
+                if not self._busy:
 
+                    self._idle.set()
 
+                await self._wakeup.wait()
 
-        return True
+                continue
 
+            if wait > 0:
 
+                try:
 
-    def is_likely_password(self, text: str) -> bool:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
 
-        """تحديد إذا كان النص باسورد"""
+                except asyncio.TimeoutError:
 
-        if not text or not isinstance(text, str):
+                    pass
 
-            return False
+                continue
 
+            job = self._chats[chosen][0]
 
+            if job.kind in self.LIMITED_KINDS:
 
-        text = text.strip()
+                self.global_bucket.take(now)
 
+                self._bucket(chosen).take(now)
 
+            # أي تعديل جديد من هنا بيبقى عملية بعدها
 
-        if len(text) < 3 or len(text) > 50:
+            if job.edit_key is not None and self._edits.get(job.edit_key) is job:
 
-            return False
+                del self._edits[job.edit_key]
 
+            self._busy.add(chosen)
 
+            asyncio.create_task(self._execute(chosen, job))
 
-        # استبعاد الإيميلات
 
-        if '@' in text and self.is_valid_email(text):
 
-            return False
+    async def _execute(self, chat_id: int, job: SendJob):
 
+        retry = False
 
+        # الـ task دي ليها نسخة context لوحدها فالعلامة مش بتأثر على الـ handlers
 
-        # استبعاد الكلمات الشائعة
+        self.dispatching.set(True)
 
-        excluded = {
+        # اللي مستني على الـ future ممكن يلغيه (timeout) فالنتيجة بتتحط لو لسه مستنية بس
 
-            'email', 'password', 'pass', 'user', 'gmail', 'yahoo', 'hotmail',
+        try:
 
-            'start', 'help', 'info', 'add', 'delete', 'اضافة', 'حذف', 'ايميل'
+            with metrics.track("send", job.kind):
 
-        }
+                result = await job.call()
 
+            if not job.future.done():
 
+                job.future.set_result(result)
 
-        if text.lower() in excluded:
+        except RetryAfter as e:
 
-            return False
+            self.pause(e.retry_after)
 
+            retry = True
 
+        except BadRequest as e:
 
-        if text.count(' ') > 2:
+            if "not modified" in str(e).lower():
 
-            return False
+                if not job.future.done():
 
+                    job.future.set_result(None)
 
+            else:
 
-        if not re.search(r'[a-zA-Z0-9]', text):
+                logger.error(f"خطأ في الإرسال ({job.kind}) لـ {chat_id}: {e}")
 
-            return False
+                if not job.future.done():
 
+                    job.future.set_exception(e)
 
+        except Exception as e:
 
-        return True
+            logger.error(f"خطأ في الإرسال ({job.kind}) لـ {chat_id}: {e}")
 
+            if not job.future.done():
 
+                job.future.set_exception(e)
 
-    def detect_input_type(self, text: str) -> str:
+        finally:
 
-        """تحديد نوع المدخل"""
+            self._busy.discard(chat_id)
 
-        if not text:
+            jobs = self._chats[chat_id]
 
-            return "unknown"
+            if retry:
 
+                # نفس العملية بتفضل أول الطابور، والتعديلات الجديدة عليها بتتدمج فيها تاني
 
+                if job.edit_key is not None:
 
-        text = text.strip()
+                    self._edits.setdefault(job.edit_key, job)
 
+            else:
 
+                jobs.popleft()
 
-        if self.is_valid_email(text):
+                if jobs:
 
-            return "email"
+                    jobs[0].ready_at = time.monotonic() + jobs[0].delay
 
+                else:
 
+                    del self._chats[chat_id]
 
-        if self.is_likely_password(text):
+            self._wakeup.set()
 
-            return "password"
 
 
+class SendRateLimiter(BaseRateLimiter):
 
-        if '@' in text and (' ' in text or ':' in text or '|' in text):
+    """حدود طابور الإرسال على مستوى الـ Bot: أي إرسال أو تعديل من أي handler (حتى اللي بيعمل await على الـ Bot API مباشرة)
 
-            return "mixed"
+    بياخد من نفس الـ token buckets وبيقف وقت إيقاف RetryAfter، فمفيش طريق يعدّي الحدود - عمليات الطابور نفسها بتعدي على طول"""
 
+    # endpoints الرسايل المحسوبة في حدود تيليجرام (الحذف والـ callback answers مش محسوبين)
 
+    LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
 
-        return "unknown"
 
 
+    def __init__(self, queue: SendQueue, max_retries: int = SEND_MAX_RETRIES):
 
-    def get_fixed_password(self) -> str:
+        self.queue = queue
 
-        """الحصول على الباسورد الثابت"""
+        self.max_retries = max_retries
 
-        try:
 
-            if "settings" not in self.db:
 
-                self.db["settings"] = {
+    async def initialize(self) -> None:
 
-                    "pending_hours": DEFAULT_PENDING_HOURS,
+        pass
 
-                    "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
 
-                    "fixed_password": DEFAULT_FIXED_PASSWORD
 
-                }
+    async def shutdown(self) -> None:
 
-                self.save_database()
+        pass
 
 
 
-            fixed_password = self.db["settings"].get("fixed_password", DEFAULT_FIXED_PASSWORD)
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
 
+        chat_id = data.get("chat_id")
 
+        if SendQueue.dispatching.get() or chat_id is None or not endpoint.startswith(self.LIMITED_PREFIXES):
 
-            if not fixed_password:
+            return await callback(*args, **kwargs)
 
-                fixed_password = DEFAULT_FIXED_PASSWORD
+        for attempt in range(self.max_retries + 1):
 
-                self.db["settings"]["fixed_password"] = fixed_password
+            await self.queue.acquire(chat_id)
 
-                self.save_database()
+            try:
 
+                return await callback(*args, **kwargs)
 
+            except RetryAfter as e:
 
-            return fixed_password
+                if attempt == self.max_retries:
 
+                    raise
 
+                self.queue.pause(e.retry_after)
 
-        except Exception as e:
 
-            logger.error(f"خطأ في الحصول على الباسورد الثابت: {e}")
 
-            return DEFAULT_FIXED_PASSWORD
+send_queue = SendQueue()
 
 
 
-    def update_fixed_password(self, new_password: str) -> Tuple[bool, str]:
+class KeyedLocks:
 
-        """تحديث الباسورد الثابت"""
+    """قفل asyncio لكل مفتاح (إيميل حساب أو id أدمن) بيتنشئ عند أول طلب وبيتشال لما محدش يستخدمه
+
+    العمليات على مفاتيح مختلفة بتمشي بالتوازي، وعلى نفس المفتاح بالترتيب"""
+
+
+
+    def __init__(self):
+
+        # المفتاح -> [القفل، عدد اللي ماسكينه أو مستنيينه]
+
+        self._locks = {}
+
+
+
+    def __len__(self):
+
+        return len(self._locks)
+
+
+
+    def locked(self, key) -> bool:
+
+        entry = self._locks.get(key)
+
+        return entry is not None and entry[0].locked()
+
+
+
+    @asynccontextmanager
+
+    async def hold(self, key):
+
+        entry = self._locks.get(key)
+
+        if entry is None:
+
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+
+        entry[1] += 1
+
+        try:
+
+            async with entry[0]:
+
+                yield
+
+        finally:
+
+            entry[1] -= 1
+
+            if not entry[1]:
+
+                del self._locks[key]
+
+
+
+    @asynccontextmanager
+
+    async def hold_many(self, keys: Iterable):
+
+        """قفل كذا مفتاح بترتيب ثابت عشان اتنين ماسكين مفاتيح مشتركة ميستنوش بعض للأبد"""
+
+        async with AsyncExitStack() as stack:
+
+            for key in sorted(set(keys)):
+
+                await stack.enter_async_context(self.hold(key))
+
+            yield
+
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+
+    """معالجة التحديثات بالتوازي بدل واحد ورا التاني: تحديثات نفس الأدمن بالترتيب (حالات الانتظار في user_data
+
+    بتفضل صحيحة) وتحديثات الأدمنز المختلفين بتمشي مع بعض لحد UPDATE_CONCURRENCY
+
+    التحديث بيستنى دور الأدمن بتاعه قبل ما ياخد مكان من UPDATE_CONCURRENCY، فرسايل كتير من أدمن واحد
+
+    بتحجز مكان واحد بس ومبتعطلش الباقيين"""
+
+
+
+    def __init__(self, max_concurrent_updates: int = UPDATE_CONCURRENCY):
+
+        super().__init__(max_concurrent_updates)
+
+        self._users = KeyedLocks()
+
+
+
+    async def process_update(self, update: object, coroutine: Awaitable):
+
+        user = update.effective_user if isinstance(update, Update) else None
+
+        if user is None:
+
+            await super().process_update(update, coroutine)
+
+            return
+
+        async with self._users.hold(user.id):
+
+            await super().process_update(update, coroutine)
+
+
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+
+        await coroutine
+
+
+
+    async def initialize(self):
+
+        pass
+
+
+
+    async def shutdown(self):
+
+        pass
+
+
+
+# أقفال الحسابات بالإيميل: الـ handler اللي بيقرا حساب ويعدله (أو يحجزه) ماسكه لحد ما يرد على الأدمن
+
+account_locks = KeyedLocks()
+
+
+
+def error_handler(func):
+
+    """ديكوريتر لمعالجة الأخطاء وقياس زمن الـ handler (metrics بنوع handler)"""
+
+
+
+    @wraps(func)
+
+    async def wrapper(*args, **kwargs):
+
+        with metrics.track("handler", func.__name__):
+
+            try:
+
+                return await func(*args, **kwargs)
+
+            except Exception as e:
+
+                logger.error(f"خطأ في {func.__name__}: {e}")
+
+                logger.error(traceback.format_exc())
+
+                try:
+
+                    if args and hasattr(args[0], 'message'):
+
+                        await args[0].message.reply_text(
+
+                            f"❌ **حدث خطأ:**\n`{str(e)}`\n\nتم تسجيل التفاصيل في السجل.",
+
+                            parse_mode='Markdown'
+
+                        )
+
+                except:
+
+                    pass
+
+                return None
+
+    return wrapper
+
+def synchronized(func):
+
+    """ديكوريتر لتنفيذ دوال المدير تحت القفل بتاعه (البوت بيكتب وFlask بيقرأ من خيط تاني)"""
+
+    @wraps(func)
+
+    def wrapper(self, *args, **kwargs):
+
+        with self._lock:
+
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+
+class CredentialExtractor:
+
+    """استخراج الحسابات في مرور واحد على السطور بأنماط مُجمّعة مسبقاً ومستقلة عن الإيميل"""
+
+
+
+    # أنماط البحث عن الإيميلات
+
+    EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', re.IGNORECASE)
+
+    BRACKET_AT_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+\[at\][a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', re.IGNORECASE)
+
+    PAREN_AT_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+\(at\)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', re.IGNORECASE)
+
+    BLOCK_EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+
+
+    # الفواصل بين الإيميل والباسورد في نفس السطر بترتيب الأولوية
+
+    SEPARATOR_PATTERNS = [re.compile(pattern) for pattern in (
+
+        r'\s+([^\s\n]+)',
+
+        r':([^\s\n]+)',
+
+        r'\|([^\s\n]+)',
+
+        r'\t+([^\s\n]+)',
+
+        r'-([^\s\n]+)',
+
+        r'_([^\s\n]+)',
+
+        r',([^\s\n]+)',
+
+        r';([^\s\n]+)',
+
+        r'=([^\s\n]+)',
+
+        r'\s*\(\s*([^)]+)\s*\)',
+
+        r'\s*\[\s*([^\]]+)\s*\]',
+
+    )]
+
+
+
+    LEADING_SYMBOLS_PATTERN = re.compile(r'^[^\w]+')
+
+    # أبعد سطر بعد الإيميل ممكن يكون فيه الباسورد (_find_password)
+
+    LOOKAHEAD_LINES = 3
+
+    BLOCK_SEPARATOR_PATTERN = re.compile(r'\n\s*\n')
+
+    ALNUM_PATTERN = re.compile(r'[a-zA-Z0-9]')
+
+
+
+    # الكلمات الشائعة اللي مش ممكن تكون باسورد
+
+    INVALID_WORDS = frozenset({
+
+        'email', 'password', 'pass', 'user', 'username', 'login',
+
+        'account', 'gmail', 'yahoo', 'hotmail', 'outlook', 'mail',
+
+        'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+
+        'with', 'by', 'from', 'of', 'is', 'are', 'was', 'were',
+
+        'this', 'that', 'these', 'those', 'here', 'there'
+
+    })
+
+
+
+    def extract(self, text: str) -> List[Tuple[str, str]]:
+
+        """استخراج (الإيميل، الباسورد) من النص كله"""
+
+        credentials = self.extract_lines(text.strip().split('\n'))
+
+
+
+        # إذا لم نجد شيء، نجرب طريقة أخرى
+
+        if not credentials:
+
+            credentials = self.extract_blocks(text)
+
+        return credentials
+
+
+
+    def extract_lines(self, lines: List[str], stop: Optional[int] = None) -> List[Tuple[str, str]]:
+
+        """المرور على السطور مرة واحدة والبحث عن باسورد لكل إيميل
+
+        لو stop متحدد بيتدور على الإيميلات في السطور قبله بس والباقي بيتستخدم للبحث عن الباسورد"""
+
+        credentials = []
+
+        for line_index, line in enumerate(lines[:stop]):
+
+            if not line.strip():
+
+                continue
+
+
+
+            found_emails = self._line_emails(line)
+
+            if not found_emails:
+
+                continue
+
+
+
+            line_key = self._case_key(line)
+
+            for email in found_emails:
+
+                password = self._find_password(email, line, line_key, lines, line_index)
+
+                if password:
+
+                    credentials.append((email, password))
+
+        return credentials
+
+
+
+    def extract_stream(self, lines: Iterable[str], batch_lines: int = 5000) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+
+        """استخراج من سطور جاية من ملف على دفعات من غير تحميله كله
+
+        بترجع (عدد السطور المقروءة، حسابات الدفعة) - آخر LOOKAHEAD_LINES سطور من كل دفعة بتتأجل للدفعة الجاية
+
+        عشان الباسورد ممكن يكون في السطور التالية للإيميل"""
+
+        for lines_read, batch, stop in self.iter_batches(lines, batch_lines):
+
+            yield lines_read, self.extract_lines(batch, stop)
+
+    def iter_batches(self, lines: Iterable[str], batch_lines: int = 5000) -> Iterator[Tuple[int, List[str], Optional[int]]]:
+
+        """تقسيم السطور لدفعات (عدد السطور المقروءة، الدفعة، stop) جاهزة لـ extract_lines
+
+        كل دفعة فيها LOOKAHEAD_LINES سطور زيادة من الدفعة الجاية للبحث عن الباسورد بس"""
+
+        batch = []
+
+        lines_read = 0
+
+        for line in lines:
+
+            batch.append(line.rstrip('\r\n'))
+
+            lines_read += 1
+
+            if len(batch) >= batch_lines + self.LOOKAHEAD_LINES:
+
+                stop = len(batch) - self.LOOKAHEAD_LINES
+
+                yield lines_read, batch, stop
+
+                batch = batch[stop:]
+
+        if batch:
+
+            yield lines_read, batch, None
+
+    def extract_blocks(self, text: str) -> List[Tuple[str, str]]:
+
+        """طريقة بديلة: الإيميل في سطر والباسورد في أحد السطور التالية داخل نفس الفقرة"""
+
+        credentials = []
+
+        for block in self.BLOCK_SEPARATOR_PATTERN.split(text):
+
+            lines = [line.strip() for line in block.split('\n') if line.strip()]
+
+            for i in range(len(lines) - 1):
+
+                email_match = self.BLOCK_EMAIL_PATTERN.search(lines[i])
+
+                if not email_match:
+
+                    continue
+
+                email = email_match.group().lower()
+
+                for j in range(i + 1, min(i + 4, len(lines))):
+
+                    if self.is_valid_password(lines[j]):
+
+                        credentials.append((email, lines[j]))
+
+                        break
+
+        return credentials
+
+
+
+    def is_valid_password(self, password: str) -> bool:
+
+        """التحقق من صحة الباسورد مع السماح بكافة الرموز"""
+
+        if not password:
+
+            return False
+
+        password = password.strip()
+
+
+
+        # تحديد الطول المسموح
+
+        if len(password) < 3 or len(password) > 50:
+
+            return False
+
+        # استبعاد الكلمات الشائعة
+
+        if password.lower() in self.INVALID_WORDS:
+
+            return False
+
+        # استبعاد الإيميلات
+
+        if '@' in password and '.' in password:
+
+            return False
+
+        # استبعاد الأرقام البسيطة جداً
+
+        if password.isdigit() and len(password) < 4:
+
+            return False
+
+        # استبعاد الأحرف المتكررة
+
+        if len(set(password)) == 1:
+
+            return False
+
+        # يجب أن يحتوي على حروف أو أرقام على الأقل
+
+        return self.ALNUM_PATTERN.search(password) is not None
+
+
+
+    def _line_emails(self, line: str) -> List[str]:
+
+        """الإيميلات في السطر بالترتيب: العادية ثم [at] ثم (at)"""
+
+        patterns = [self.EMAIL_PATTERN]
+
+        if '[' in line:
+
+            patterns.append(self.BRACKET_AT_PATTERN)
+
+        if '(' in line:
+
+            patterns.append(self.PAREN_AT_PATTERN)
+
+
+
+        found_emails = []
+
+        for pattern in patterns:
+
+            for email in pattern.findall(line):
+
+                clean_email = email.replace('[at]', '@').replace('(at)', '@').lower().strip()
+
+                if clean_email and clean_email not in found_emails:
+
+                    found_emails.append(clean_email)
+
+        return found_emails
+
+
+
+    @staticmethod
+
+    def _case_key(line: str) -> str:
+
+        """نسخة lowercase من السطر بنفس الطول عشان مواضع الإيميل تفضل صحيحة"""
+
+        if line.isascii():
+
+            return line.lower()
+
+        return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in line)
+
+
+
+    def _find_password(self, email: str, line: str, line_key: str, lines: List[str], line_index: int) -> Optional[str]:
+
+        """البحث الشامل عن الباسورد لإيميل معين"""
+
+        # 1. البحث في نفس السطر بعد كل ظهور للإيميل مع فواصل مختلفة
+
+        positions = []
+
+        position = line_key.find(email)
+
+        while position != -1:
+
+            positions.append(position + len(email))
+
+            position = line_key.find(email, position + 1)
+
+
+
+        for pattern in self.SEPARATOR_PATTERNS:
+
+            for position in positions:
+
+                match = pattern.match(line, position)
+
+                if match:
+
+                    password = match.group(1).strip()
+
+                    if self.is_valid_password(password):
+
+                        return password
+
+                    break
+
+
+
+        # 2. البحث بالكلمات في نفس السطر
+
+        words = line.split()
+
+        for i, word in enumerate(words):
+
+            if email in word.lower() and i + 1 < len(words):
+
+                if self.is_valid_password(words[i + 1]):
+
+                    return words[i + 1]
+
+
+
+        # 3. البحث في السطر التالي
+
+        if line_index + 1 < len(lines):
+
+            next_line = self.LEADING_SYMBOLS_PATTERN.sub('', lines[line_index + 1].strip())
+
+            if next_line:
+
+                if self.is_valid_password(next_line):
+
+                    return next_line
+
+                first_word = next_line.split()[0] if next_line.split() else next_line
+
+                if self.is_valid_password(first_word):
+
+                    return first_word
+
+
+
+        # 4. البحث في السطرين التاليين
+
+        for offset in [2, 3]:
+
+            if line_index + offset < len(lines):
+
+                target_line = lines[line_index + offset].strip()
+
+                if target_line and self.is_valid_password(target_line):
+
+                    return target_line
+
+        return None
+
+
+
+credential_extractor = CredentialExtractor()
+
+
+
+_parse_pool = None
+
+
+
+def start_parse_pool() -> Optional[ProcessPoolExecutor]:
+
+    """إنشاء مجموعة عمليات الاستخراج - main() بتناديها أول حاجة قبل أي thread (النسخ الاحتياطي والبوت وFlask)
+
+    fork من عملية فيها threads ممكن يعلّق العملية الجديدة على قفل كان ممسوك وقتها (زي قفل الـ logging)،
+
+    فالعمليات كلها بتتعمل هنا مرة واحدة بمهمة فاضية. fork عشان العمليات متستوردش app.py من الأول وتنشئ قاعدة بيانات.
+
+    الاستيراد نفسه مبيعملش عمليات ولا threads (الـ flusher بيبدأ مع أول كتابة).
+
+    لو fork مش متاح أو فيه threads شغالة بالفعل بترجع None والاستخراج بيتم في threads الـ loop"""
+
+    global _parse_pool
+
+    if "fork" not in multiprocessing.get_all_start_methods() or threading.active_count() > 1:
+
+        logger.warning("مجموعة عمليات الاستخراج محتاجة fork قبل أي thread - الاستخراج هيتم في threads")
+
+        return None
+
+    try:
+
+        pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("fork"))
+
+        # أول مهمة بتعمل العمليات كلها دلوقتي (مع fork مبتتعملش عند الطلب بعدين)
+
+        pool.submit(int).result()
+
+    except Exception as e:
+
+        logger.warning(f"تعذر إنشاء مجموعة عمليات الاستخراج - الاستخراج هيتم في threads: {e}")
+
+        return None
+
+    atexit.register(pool.shutdown, cancel_futures=True)
+
+    _parse_pool = pool
+
+    return pool
+
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+
+    """مجموعة عمليات الاستخراج - None يعني run_in_executor هيستخدم threads الـ loop الافتراضية"""
+
+    return _parse_pool
+
+
+
+def extract_chunk(lines: List[str], stop: Optional[int] = None) -> List[Tuple[str, str]]:
+
+    """استخراج جزء من السطور داخل عملية من مجموعة العمليات"""
+
+    return credential_extractor.extract_lines(lines, stop)
+
+
+
+class AccountStatus(IntEnum):
+
+    """حالة الحساب كرقم صغير بدل النص (نفس الأرقام في أعمدة AccountColumns والـ snapshot الثنائي)"""
+
+    PENDING = 0
+
+    AVAILABLE = 1
+
+    USED = 2
+
+    LEASED = 3
+
+
+
+    @property
+
+    def label(self) -> str:
+
+        """اسم الحالة في شكل JSON (pending / available / used / leased)"""
+
+        return self.name.lower()
+
+
+
+@dataclass(slots=True)
+
+class Account:
+
+    """سجل حساب واحد بحقول ثابتة (__slots__) بدل dict بمفاتيح نصية
+
+    الأوقات epoch بالتوقيت المحلي والحالة AccountStatus، والتحويل من وإلى شكل JSON القديم من غير فقد"""
+
+    # مفاتيح شكل JSON اللي ليها حقول (أي مفتاح تاني بيروح extra)
+
+    JSON_FIELDS = frozenset(("password", "added_at", "available_at", "status", "last_used", "use_count", "priority", "lease_id", "version"))
+
+    # اسم كل حالة برقمها والعكس (أسرع من خصائص الـ enum في التحويل لكل سجل)
+
+    STATUS_LABELS = tuple(status.label for status in AccountStatus)
+
+    STATUS_BY_LABEL = dict(zip(STATUS_LABELS, AccountStatus))
+
+    password: str
+
+    added_at: float
+
+    available_at: float
+
+    status: AccountStatus = AccountStatus.PENDING
+
+    last_used: Optional[float] = None
+
+    use_count: int = 0
+
+    priority: int = 1
+
+    lease_id: Optional[str] = None
+
+    # رقم نسخة السجل: بيزيد مع كل تعديل (evolve) وبيتقارن في compare-and-set لما أكتر من أدمن يعدلوا نفس الحساب
+
+    version: int = 1
+
+    # أي مفاتيح تانية في السجل (أو حالة مش معروفة) بتتحفظ كما هي وبترجع مع to_dict
+
+    extra: Optional[dict] = None
+
+
+
+    @classmethod
+
+    def from_dict(cls, data: dict) -> "Account":
+
+        """سجل من شكل JSON (تواريخ ISO وحالة نصية) - الحقول الناقصة بتاخد القيم الافتراضية"""
+
+        extra = None
+
+        if not data.keys() <= cls.JSON_FIELDS:
+
+            extra = {key: value for key, value in data.items() if key not in cls.JSON_FIELDS}
+
+        status = data.get("status", "available")
+
+        status_code = cls.STATUS_BY_LABEL.get(status) if isinstance(status, str) else None
+
+        if status_code is None:
+
+            # حالة مش معروفة بتتحفظ زي ما هي وبتتعامل كانتظار
+
+            extra = dict(extra or {}, status=status)
+
+            status_code = AccountStatus.PENDING
+
+        added_at = cls.parse_time(data.get("added_at"))
+
+        available_at = cls.parse_time(data.get("available_at"))
+
+        if added_at is None or available_at is None:
+
+            now_ts = datetime.now().timestamp()
+
+            added_at = now_ts if added_at is None else added_at
+
+            available_at = now_ts if available_at is None else available_at
+
+        return cls(
+
+            data.get("password", ""),
+
+            added_at,
+
+            available_at,
+
+            status_code,
+
+            cls.parse_time(data.get("last_used")),
+
+            data.get("use_count", 0),
+
+            data.get("priority", 1),
+
+            data.get("lease_id") or None,
+
+            data.get("version", 1),
+
+            extra
+
+        )
+
+
+
+    def evolve(self, **changes) -> "Account":
+
+        """نسخة جديدة من السجل بتعديل بعض الحقول (copy-on-write) - نفس dataclasses.replace بنص التكلفة
+
+        النسخة (version) بتزيد واحد إلا لو اتبعتت في changes"""
+
+        record = Account(self.password, self.added_at, self.available_at, self.status, self.last_used,
+
+                         self.use_count, self.priority, self.lease_id, self.version + 1, self.extra)
+
+        for name, value in changes.items():
+
+            setattr(record, name, value)
+
+        return record
+
+
+
+    def to_dict(self) -> dict:
+
+        """السجل بشكل JSON المحفوظ (نفس المفاتيح والصيغ اللي from_dict بيقراها)"""
+
+        data = {
+
+            "password": self.password,
+
+            "added_at": self.format_time(self.added_at),
+
+            "available_at": self.format_time(self.available_at),
+
+            "status": self.STATUS_LABELS[self.status],
+
+            "last_used": self.format_time(self.last_used),
+
+            "use_count": self.use_count,
+
+            "priority": self.priority
+
+        }
+
+        if self.lease_id:
+
+            data["lease_id"] = self.lease_id
+
+        if self.version != 1:
+
+            data["version"] = self.version
+
+        if self.extra:
+
+            data.update(self.extra)
+
+        return data
+
+
+
+    @staticmethod
+
+    def parse_time(value: Optional[str]) -> Optional[float]:
+
+        """تاريخ ISO محلي إلى epoch (None للقيم الفاضية)"""
+
+        return datetime.fromisoformat(value).timestamp() if value else None
+
+
+
+    @staticmethod
+
+    def format_time(timestamp: Optional[float]) -> Optional[str]:
+
+        """epoch إلى تاريخ ISO محلي بنفس صيغة datetime.isoformat (الدقة ميكروثانية فالتحويل بيرجع نفس النص)"""
+
+        return None if timestamp is None else datetime.fromtimestamp(timestamp).isoformat()
+
+
+
+    @staticmethod
+
+    def json_default(obj) -> dict:
+
+        """default لـ json.dumps: السجلات بتتكتب بشكل JSON القديم في الـ snapshot والـ journal"""
+
+        if isinstance(obj, Account):
+
+            return obj.to_dict()
+
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+
+class VersionConflict(Exception):
+
+    """compare-and-set فشل: الحساب اتعدل (أو اتحذف أو اتضاف) بعد ما الأدمن قرا النسخة اللي بيعدل عليها
+
+    current هو السجل الحالي (None لو الحساب مش موجود)
+
+    الوقت اللي الأدمن بيفكر فيه بيحميه فحص النسخة، والـ handler من أول القراءة لحد الرد ماسك قفل الإيميل في account_locks"""
+
+
+
+    def __init__(self, email: str, expected_version: int, current: Optional[Account]):
+
+        self.email = email
+
+        self.expected_version = expected_version
+
+        self.current = current
+
+        self.current_version = current.version if current is not None else 0
+
+        super().__init__(f"{email}: النسخة المتوقعة {expected_version} والحالية {self.current_version}")
+
+
+
+class AvailabilityIndex:
+
+    """فهرس أولوية (heap) لاختيار الحساب المتاح التالي في O(log n) بدل فحص كل الحسابات"""
+
+
+
+    def __init__(self):
+
+        # الحسابات اللي وقتها لسه مجاش: (available_at, counter, email)
+
+        self._waiting = []
+
+        # الحسابات المتاحة: (priority, available_at, use_count, counter, email)
+
+        self._ready = []
+
+        # الـ counter الصالح لكل إيميل - أي entry تاني في الـ heap قديم ويتشال lazily
+
+        self._entries = {}
+
+        self._counter = 0
+
+        # عدادات الحالات بتتحدث مع كل انتقال بدل فحص كل الحسابات
+
+        self._buckets = {}
+
+        self.counts = {"available": 0, "pending": 0, "cooldown": 0}
+
+        # الحسابات اللي اتنقلت للمتاح ولسه متسجلتش (بيفضيها promote_due)
+
+        self.promoted = set()
+
+    def __len__(self):
+
+        return len(self._entries)
+
+
+
+    def build(self, accounts: dict, available_ts: Optional[Iterable[float]] = None):
+
+        """بناء الفهرس من كل الحسابات مرة واحدة في O(n)
+
+        available_ts اختياري: أوقات الإتاحة بنفس ترتيب accounts لو متحسبة قبل كده (من الأعمدة)"""
+
+        self._waiting = []
+
+        self._ready = []
+
+        self._entries = {}
+
+        self._buckets = {}
+
+        self.counts = {"available": 0, "pending": 0, "cooldown": 0}
+
+        self.promoted = set()
+
+        if available_ts is None:
+
+            available_ts = (account.available_at for account in accounts.values())
+
+        for (email, data), account_ts in zip(accounts.items(), available_ts):
+
+            self._counter += 1
+
+            self._entries[email] = self._counter
+
+            self._set_bucket(email, self._waiting_bucket(data))
+
+            self._waiting.append((account_ts, self._counter, email))
+
+        heapq.heapify(self._waiting)
+
+
+
+    def push(self, email: str, data: Account):
+
+        """إضافة أو تحديث حساب في الفهرس"""
+
+        self._counter += 1
+
+        self._entries[email] = self._counter
+
+        self._set_bucket(email, self._waiting_bucket(data))
+
+        heapq.heappush(self._waiting, (data.available_at, self._counter, email))
+
+
+
+    def remove(self, email: str):
+
+        """حذف حساب من الفهرس (الـ entries القديمة تتشال وقت الوصول لها)"""
+
+        self._entries.pop(email, None)
+
+        self._set_bucket(email, None)
+
+
+
+    def promote(self, now_ts: float, accounts: dict) -> List[str]:
+
+        """نقل الحسابات اللي وقتها جه من قائمة الانتظار للمتاحة"""
+
+        promoted = []
+
+        while self._waiting and self._waiting[0][0] <= now_ts:
+
+            available_ts, counter, email = heapq.heappop(self._waiting)
+
+            if self._entries.get(email) != counter:
+
+                continue
+
+            # استبدال السجل بدل تعديله عشان النسخ المنشورة متتأثرش
+
+            data = accounts[email]
+
+            if data.status != AccountStatus.AVAILABLE or data.lease_id:
+
+                self.promoted.add(email)
+
+                # lease انتهى من غير تأكيد - الحساب رجع للمتاح (تحول بالوقت مش تعديل فالنسخة زي ما هي)
+
+                data = data.evolve(status=AccountStatus.AVAILABLE, lease_id=None, version=data.version)
+
+                accounts[email] = data
+
+            self._set_bucket(email, "available")
+
+            heapq.heappush(self._ready, (
+
+                data.priority,
+
+                available_ts,
+
+                data.use_count,
+
+                counter,
+
+                email
+
+            ))
+
+            promoted.append(email)
+
+        return promoted
+
+
+
+    def drain_promoted(self) -> set:
+
+        """الحسابات اللي اتنقلت للمتاح من آخر مرة وتفريغ القائمة"""
+
+        promoted = self.promoted
+
+        self.promoted = set()
+
+        return promoted
+
+
+
+    def pop_ready(self, now_ts: float, accounts: dict) -> Optional[str]:
+
+        """سحب أفضل حساب متاح: الأولوية ثم الأقدم ثم الأقل استخداماً"""
+
+        self.promote(now_ts, accounts)
+
+        while self._ready:
+
+            entry = heapq.heappop(self._ready)
+
+            email = entry[-1]
+
+            if self._entries.get(email) == entry[-2]:
+
+                del self._entries[email]
+
+                self._set_bucket(email, None)
+
+                return email
+
+        return None
+
+
+
+    def peek_waiting(self) -> Optional[Tuple[float, str]]:
+
+        """أقرب حساب هيبقى متاح (الوقت، الإيميل)"""
+
+        while self._waiting:
+
+            available_ts, counter, email = self._waiting[0]
+
+            if self._entries.get(email) == counter:
+
+                return available_ts, email
+
+            heapq.heappop(self._waiting)
+
+        return None
+
+
+
+    def _set_bucket(self, email: str, bucket: Optional[str]):
+
+        old_bucket = self._buckets.pop(email, None)
+
+        if old_bucket:
+
+            self.counts[old_bucket] -= 1
+
+        if bucket:
+
+            self._buckets[email] = bucket
+
+            self.counts[bucket] += 1
+
+
+
+    @staticmethod
+
+    def _waiting_bucket(data: Account) -> str:
+
+        return "pending" if data.status == AccountStatus.PENDING else "cooldown"
+
+
+
+class AccountColumns:
+
+    """تخزين عمودي للحسابات في arrays متوازية: الوقت كـ epoch والحالة كرقم والباسورد كرقم مجموعة"""
+
+
+
+    STATUS_CODES = {label: status.value for label, status in Account.STATUS_BY_LABEL.items()}
+
+    STATUS_NAMES = Account.STATUS_LABELS
+
+    # أكبر من أي إيميل عشان (now_ts, MAX_EMAIL) يبقى حد المتاح في الفهرس المترتب
+
+    MAX_EMAIL = "\U0010ffff"
+
+    def __init__(self):
+
+        self.emails = []
+
+        self.available_at = array("d")
+
+        self.status = array("b")
+
+        self.use_count = array("l")
+
+        self.priority = array("l")
+
+        self.password_group = array("l")
+
+        # رقم الصف لكل إيميل ورقم المجموعة لكل باسورد
+
+        self._rows = {}
+
+        self._groups = {}
+
+        # فهرس مترتب بالوقت لكل حالة: (available_ts, email) للانتظار وللباقي
+
+        self._time_index = ([], [])
+
+    def __len__(self):
+
+        return len(self.emails)
+
+
+
+    def build(self, accounts: dict):
+
+        """بناء الأعمدة من كل الحسابات مرة واحدة"""
+
+        self.emails = []
+
+        self.available_at = array("d")
+
+        self.status = array("b")
+
+        self.use_count = array("l")
+
+        self.priority = array("l")
+
+        self.password_group = array("l")
+
+        self._rows = {}
+
+        self._groups = {}
+
+        # الفهرس بيتبني مرة واحدة بالترتيب بعد ملء الأعمدة بدل إدخال مترتب لكل صف
+
+        self._time_index = None
+
+        for email, data in accounts.items():
+
+            self.upsert(email, data)
+
+        self._build_time_index()
+
+    @classmethod
+
+    def from_arrays(cls, emails: List[str], available_at: array, status: array, use_count: array,
+
+                    priority: array, password_group: array, passwords: List[str]) -> "AccountColumns":
+
+        """بناء الأعمدة مباشرة من arrays جاهزة (snapshot ثنائي) من غير قراءة أي سجل"""
+
+        columns = cls()
+
+        columns.emails = emails
+
+        columns.available_at = array("d", available_at)
+
+        columns.status = array("b", status)
+
+        columns.use_count = array("l", use_count)
+
+        columns.priority = array("l", priority)
+
+        columns.password_group = array("l", password_group)
+
+        columns._rows = {email: row for row, email in enumerate(emails)}
+
+        columns._groups = {password: group for group, password in enumerate(passwords)}
+
+        columns._build_time_index()
+
+        return columns
+
+    def _build_time_index(self):
+
+        self._time_index = ([], [])
+
+        pending_code = self.STATUS_CODES["pending"]
+
+        for row, (available_ts, status) in enumerate(zip(self.available_at, self.status)):
+
+            self._time_index[0 if status == pending_code else 1].append((available_ts, self.emails[row]))
+
+        self._time_index[0].sort()
+
+        self._time_index[1].sort()
+
+
+
+    def copy(self) -> "AccountColumns":
+
+        """نسخة مستقلة من الأعمدة (نسخ الـ arrays نسخ ذاكرة مباشر)"""
+
+        columns = AccountColumns()
+
+        columns.emails = list(self.emails)
+
+        columns.available_at = array("d", self.available_at)
+
+        columns.status = array("b", self.status)
+
+        columns.use_count = array("l", self.use_count)
+
+        columns.priority = array("l", self.priority)
+
+        columns.password_group = array("l", self.password_group)
+
+        columns._rows = dict(self._rows)
+
+        columns._groups = dict(self._groups)
+
+        columns._time_index = (list(self._time_index[0]), list(self._time_index[1]))
+
+        return columns
+
+
+
+    def upsert(self, email: str, data: Account):
+
+        """إضافة صف جديد أو تحديث صف موجود"""
+
+        available_ts = data.available_at
+
+        status = data.status
+
+        group = self._group_id(data.password)
+
+        row = self._rows.get(email)
+
+        if row is None:
+
+            row = len(self.emails)
+
+            self._rows[email] = row
+
+            self.emails.append(email)
+
+            self.available_at.append(available_ts)
+
+            self.status.append(status)
+
+            self.use_count.append(data.use_count)
+
+            self.priority.append(data.priority)
+
+            self.password_group.append(group)
+
+        else:
+
+            self._unindex(row)
+
+            self.available_at[row] = available_ts
+
+            self.status[row] = status
+
+            self.use_count[row] = data.use_count
+
+            self.priority[row] = data.priority
+
+            self.password_group[row] = group
+
+        self._index(row)
+
+    def remove(self, email: str):
+
+        """حذف صف بنقل آخر صف مكانه (O(1) بدون إزاحة الأعمدة)"""
+
+        row = self._rows.get(email)
+
+        if row is None:
+
+            return
+
+        self._unindex(row)
+
+        del self._rows[email]
+
+        last = len(self.emails) - 1
+
+        if row != last:
+
+            moved = self.emails[last]
+
+            self.emails[row] = moved
+
+            self._rows[moved] = row
+
+            for column in (self.available_at, self.status, self.use_count, self.priority, self.password_group):
+
+                column[row] = column[last]
+
+        self.emails.pop()
+
+        for column in (self.available_at, self.status, self.use_count, self.priority, self.password_group):
+
+            column.pop()
+
+
+
+    def _group_id(self, password: str) -> int:
+
+        group = self._groups.get(password)
+
+        if group is None:
+
+            group = len(self._groups)
+
+            self._groups[password] = group
+
+        return group
+
+    def _time_keys(self, row: int) -> Tuple[list, tuple]:
+
+        """القائمة المترتبة اللي فيها الصف ومفتاحه (available_ts, email)"""
+
+        keys = self._time_index[0 if self.status[row] == self.STATUS_CODES["pending"] else 1]
+
+        return keys, (self.available_at[row], self.emails[row])
+
+    def _index(self, row: int):
+
+        if self._time_index is None:
+
+            return
+
+        keys, key = self._time_keys(row)
+
+        bisect.insort(keys, key)
+
+    def _unindex(self, row: int):
+
+        if self._time_index is None:
+
+            return
+
+        keys, key = self._time_keys(row)
+
+        i = bisect.bisect_left(keys, key)
+
+        if i < len(keys) and keys[i] == key:
+
+            del keys[i]
+
+
+
+    def count_password(self, password: str) -> int:
+
+        """عدد الحسابات بباسورد معين - عدّ مباشر على العمود"""
+
+        group = self._groups.get(password)
+
+        if group is None:
+
+            return 0
+
+        return self.password_group.count(group)
+
+
+
+    def emails_with_password(self, password: str) -> List[str]:
+
+        """إيميلات الحسابات بباسورد معين (البحث في العمود نفسه بدل المرور على السجلات)"""
+
+        group = self._groups.get(password)
+
+        if group is None:
+
+            return []
+
+        column = self.password_group
+
+        emails = []
+
+        row = -1
+
+        try:
+
+            while True:
+
+                row = column.index(group, row + 1)
+
+                emails.append(self.emails[row])
+
+        except ValueError:
+
+            return emails
+
+
+
+    def partition(self, now_ts: float) -> Tuple[List[int], List[int], List[int]]:
+
+        """أرقام صفوف المتاح والانتظار والـ cooldown (ومعاه المحجوز) في مرور واحد على عمودين"""
+
+        available, pending, cooldown = [], [], []
+
+        pending_code = self.STATUS_CODES["pending"]
+
+        for row, (available_ts, status) in enumerate(zip(self.available_at, self.status)):
+
+            if available_ts <= now_ts:
+
+                available.append(row)
+
+            elif status == pending_code:
+
+                pending.append(row)
+
+            else:
+
+                cooldown.append(row)
+
+        return available, pending, cooldown
+
+
+
+    def available_by(self, ts: float) -> int:
+
+        """عدد الحسابات اللي هتكون متاحة عند الوقت ts (اللي متاح دلوقتي ومعاه اللي وقته هييجي) - O(log n)"""
+
+        edge = (ts, self.MAX_EMAIL)
+
+        return sum(bisect.bisect_right(keys, edge) for keys in self._time_index)
+
+
+
+    def tab_counts(self, now_ts: float) -> dict:
+
+        """عدد المتاح والانتظار والـ cooldown من حدود الفهرس المترتب (O(log n))"""
+
+        pending_keys, other_keys = self._time_index
+
+        edge = (now_ts, self.MAX_EMAIL)
+
+        pending_due = bisect.bisect_right(pending_keys, edge)
+
+        other_due = bisect.bisect_right(other_keys, edge)
+
+        return {
+
+            "available": pending_due + other_due,
+
+            "pending": len(pending_keys) - pending_due,
+
+            "cooldown": len(other_keys) - other_due
+
+        }
+
+    def page(self, tab: str, now_ts: float, after: Optional[tuple], limit: int) -> Tuple[List[int], Optional[tuple]]:
+
+        """صفحة صفوف من تبويب بعد المؤشر after مع مؤشر الصفحة الجاية - التكلفة على قد الصفحة"""
+
+        edge = (now_ts, self.MAX_EMAIL)
+
+        if tab == "available":
+
+            # المتاح هو بداية القائمتين لحد الوقت الحالي فبندمج أول limit + 1 من كل واحدة
+
+            parts = []
+
+            for keys in self._time_index:
+
+                start = bisect.bisect_right(keys, after) if after else 0
+
+                stop = bisect.bisect_right(keys, edge)
+
+                parts.append(keys[start:min(stop, start + limit + 1)])
+
+            page_keys = list(heapq.merge(*parts))[:limit + 1]
+
+        else:
+
+            keys = self._time_index[0 if tab == "pending" else 1]
+
+            start = bisect.bisect_right(keys, edge)
+
+            if after:
+
+                start = max(start, bisect.bisect_right(keys, after))
+
+            page_keys = keys[start:start + limit + 1]
+
+        next_cursor = page_keys[limit - 1] if len(page_keys) > limit else None
+
+        return [self._rows[email] for _, email in page_keys[:limit]], next_cursor
+
+    def entry(self, row: int, now_ts: float) -> dict:
+
+        """بيانات صف واحد للعرض مع الوقت المتبقي"""
+
+        seconds_left = self.available_at[row] - now_ts
+
+        if seconds_left > 0:
+
+            hours = int(seconds_left // 3600)
+
+            minutes = int((seconds_left % 3600) // 60)
+
+            time_str = f"{hours}س {minutes}د"
+
+            status = self.STATUS_NAMES[self.status[row]]
+
+        else:
+
+            time_str = "متاح الآن"
+
+            status = "available"
+
+        return {
+
+            "email": self.emails[row],
+
+            "status": status,
+
+            "time_left": time_str,
+
+            "use_count": self.use_count[row]
+
+        }
+
+
+
+class AccountsSnapshot:
+
+    """نسخة ثابتة من الحسابات والإحصائيات للقراءة بدون قفل - مبتتعدلش بعد النشر"""
+
+    __slots__ = ("version", "accounts", "columns", "counts", "next_available", "stats", "expires_at")
+
+
+
+    def __init__(self, version: int, accounts: Optional[MappingProxyType], counts: dict,
+
+                 next_available: Optional[Tuple[float, str]], stats: dict,
+
+                 columns: Optional[AccountColumns] = None):
+
+        self.version = version
+
+        # None لما الحسابات مش متحملة في الذاكرة (SQLite)
+
+        self.accounts = accounts
+
+        self.columns = columns
+
+        self.counts = MappingProxyType(dict(counts))
+
+        self.next_available = next_available
+
+        self.stats = MappingProxyType(dict(stats))
+
+        # النسخة بتبقى قديمة لما أقرب حساب في الانتظار يبقى متاح
+
+        self.expires_at = next_available[0] if next_available else None
+
+
+
+    def statistics(self) -> dict:
+
+        """الإحصائيات بنفس شكل get_statistics"""
+
+        stats = {
+
+            "total": self.counts["total"],
+
+            "available": self.counts["available"],
+
+            "pending": self.counts["pending"],
+
+            "cooldown": self.counts["cooldown"],
+
+            "next_available": None,
+
+            "next_available_email": None,
+
+            "total_requests": self.stats.get("total_requests", 0),
+
+            "successful_requests": self.stats.get("successful_requests", 0),
+
+            "success_rate": 0
+
+        }
+
+        if self.next_available:
+
+            next_available_ts, next_email = self.next_available
+
+            seconds_left = max(0, next_available_ts - datetime.now().timestamp())
+
+            hours = int(seconds_left // 3600)
+
+            minutes = int((seconds_left % 3600) // 60)
+
+            stats["next_available"] = f"{hours} ساعة و {minutes} دقيقة"
+
+            stats["next_available_email"] = next_email
+
+        if stats["total_requests"] > 0:
+
+            stats["success_rate"] = (stats["successful_requests"] / stats["total_requests"]) * 100
+
+        return stats
+
+
+
+class WriteBehindFlusher:
+
+    """كتابة مؤجلة في الخلفية: بتجمع سطور الـ journal وتكتبها مرة واحدة كل فترة أو كل عدد عمليات
+
+    بعد FLUSH_MAX_RETRIES محاولة فاشلة ورا بعض بيدخل حالة فشل (error): الدفعة بتفضل في الطابور، flush بيرجع False،
+
+    وsubmit بيرفع الخطأ لحد ما محاولة (كل FLUSH_FAILED_RETRY_SECONDS أو مع flush) تنجح"""
+
+
+
+    def __init__(self, write_func, interval_ms: int = FLUSH_INTERVAL_MS, max_ops: int = FLUSH_MAX_OPS,
+
+                 on_commit=None):
+
+        self._write_func = write_func
+
+        # بيتنادى بعد كل دفعة اتثبتت على القرص
+
+        self._on_commit = on_commit
+
+        self._interval = interval_ms / 1000
+
+        self._max_ops = max_ops
+
+        self._pending = []
+
+        self._submitted = 0
+
+        self._written = 0
+
+        self._urgent = False
+
+        self._stopped = False
+
+        # المحاولات الفاشلة ورا بعض، وكل المحاولات الفاشلة (flush بيستنى محاولة بعد طلبه)
+
+        self._failures = 0
+
+        self._failed_attempts = 0
+
+        # آخر خطأ كتابة بعد ما المحاولات خلصت - None طول ما الكتابة شغالة
+
+        self.error = None
+
+        self._condition = threading.Condition()
+
+        # الخيط بيبدأ مع أول سطر عشان الاستيراد ميشغلش threads قبل مجموعة عمليات الاستخراج
+
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+
+        self._started = False
+
+
+
+    @property
+
+    def dirty(self) -> bool:
+
+        return self._written < self._submitted
+
+
+
+    def submit(self, line: str):
+
+        """إضافة سطر للطابور (بدون أي I/O في خيط المستدعي) - OSError لو الكتابة في حالة فشل"""
+
+        with self._condition:
+
+            if self.error is not None:
+
+                raise OSError(f"الكتابة على القرص واقفة: {self.error}")
+
+            if not self._started:
+
+                self._started = True
+
+                self._thread.start()
+
+            self._pending.append(line)
+
+            self._submitted += 1
+
+            if len(self._pending) == 1 or len(self._pending) >= self._max_ops:
+
+                self._condition.notify_all()
+
+
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+
+        """كتابة كل اللي في الطابور فوراً والانتظار لحد ما يتثبت على القرص
+
+        False لو المهلة خلصت أو الكتابة في حالة فشل (بعد محاولة جديدة على الأقل)"""
+
+        with self._condition:
+
+            target = self._submitted
+
+            if self._written >= target:
+
+                return True
+
+            attempts = self._failed_attempts
+
+            self._urgent = True
+
+            self._condition.notify_all()
+
+            self._condition.wait_for(
+
+                lambda: self._written >= target or self._stopped
+
+                or (self.error is not None and self._failed_attempts > attempts),
+
+                timeout
+
+            )
+
+            return self._written >= target
+
+
+
+    def stop(self, timeout: Optional[float] = None):
+
+        """تفريغ الطابور وإيقاف الخيط"""
+
+        self.flush(timeout)
+
+        with self._condition:
+
+            self._stopped = True
+
+            self._condition.notify_all()
+
+        if self._started:
+
+            self._thread.join(timeout)
+
+
+
+    def _run(self):
+
+        while True:
+
+            with self._condition:
+
+                # انتظار أول عملية ثم مهلة قصيرة لتجميع باقي العمليات معاها
+
+                self._condition.wait_for(lambda: self._pending or self._stopped)
+
+                if self._stopped and (not self._pending or self.error is not None):
+
+                    return
+
+                if self.error is not None:
+
+                    # الكتابة فاشلة: محاولة كل فترة طويلة أو لما حد يطلب flush
+
+                    self._condition.wait_for(lambda: self._urgent or self._stopped, FLUSH_FAILED_RETRY_SECONDS)
+
+                else:
+
+                    self._condition.wait_for(
+
+                        lambda: self._urgent or self._stopped or len(self._pending) >= self._max_ops,
+
+                        self._interval
+
+                    )
+
+                batch = self._pending
+
+                self._pending = []
+
+                self._urgent = False
+
+
+
+            try:
+
+                self._write_func(batch)
+
+            except Exception as e:
+
+                with self._condition:
+
+                    self._pending = batch + self._pending
+
+                    self._failures += 1
+
+                    self._failed_attempts += 1
+
+                    if self._failures >= FLUSH_MAX_RETRIES:
+
+                        if self.error is None:
+
+                            logger.error(f"خطأ في الكتابة المؤجلة بعد {self._failures} محاولات، العمليات الجديدة هتترفض: {e}")
+
+                        self.error = e
+
+                        self._condition.notify_all()
+
+                    else:
+
+                        logger.error(f"خطأ في الكتابة المؤجلة، إعادة المحاولة: {e}")
+
+                        self._condition.wait_for(lambda: self._stopped, self._interval * self._failures)
+
+                continue
+
+            with self._condition:
+
+                self._written += len(batch)
+
+                if self.error is not None:
+
+                    logger.info("✅ الكتابة المؤجلة رجعت تشتغل")
+
+                self._failures = 0
+
+                self.error = None
+
+                self._condition.notify_all()
+
+            if self._on_commit is not None:
+
+                try:
+
+                    self._on_commit()
+
+                except Exception as e:
+
+                    logger.error(f"خطأ بعد تثبيت دفعة الكتابة: {e}")
+
+
+
+class ActivityLog:
+
+    """سجل الأنشطة: آخر السجلات في deque محدود + ملف NDJSON للإضافة فقط بيتقسم لما يكبر"""
+
+
+
+    def __init__(self, path: str = ACTIVITY_LOG_FILE, max_bytes: int = ACTIVITY_LOG_MAX_BYTES,
+
+                 backups: int = ACTIVITY_LOG_BACKUPS, memory: int = ACTIVITY_LOG_MEMORY):
+
+        self.path = path
+
+        self.max_bytes = max_bytes
+
+        self.backups = backups
+
+        self.recent = deque(maxlen=memory)
+
+        self._file = None
+
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        self._file_lock = threading.Lock()
+
+        self._load_recent()
+
+        self._flusher = WriteBehindFlusher(self._write_lines)
+
+        atexit.register(self._flusher.stop, 10)
+
+
+
+    def __len__(self):
+
+        return len(self.recent)
+
+
+
+    def _load_recent(self):
+
+        """تحميل آخر السجلات من الملف الحالي للذاكرة"""
+
+        if not self._size:
+
+            return
+
+        try:
+
+            with open(self.path, 'rb') as log_file:
+
+                lines = log_file.read().split(b"\n")
+
+            for line in lines[-(self.recent.maxlen + 1):]:
+
+                if line:
+
+                    try:
+
+                        self.recent.append(json.loads(line))
+
+                    except ValueError:
+
+                        continue
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تحميل سجل الأنشطة: {e}")
+
+
+
+    def append(self, action: str, details: str = "", timestamp: Optional[str] = None) -> dict:
+
+        """إضافة سجل (الكتابة على الملف بتتم في الخلفية)"""
+
+        # التاريخ أول مفتاح عشان البحث يقراه من أول السطر بدون فك الـ JSON
+
+        entry = {
+
+            "timestamp": timestamp or datetime.now().isoformat(),
+
+            "action": action,
+
+            "details": details
+
+        }
+
+        self.recent.append(entry)
+
+        self._flusher.submit(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return entry
+
+
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+
+        return self._flusher.flush(timeout)
+
+
+
+    def clear(self):
+
+        """مسح كل السجلات من الذاكرة والملفات"""
+
+        self.flush(5)
+
+        with self._file_lock:
+
+            if self._file is not None:
+
+                self._file.close()
+
+                self._file = None
+
+            for path in self.files():
+
+                os.remove(path)
+
+            self._size = 0
+
+        self.recent.clear()
+
+
+
+    def _write_lines(self, lines: List[str]):
+
+        data = "".join(lines).encode("utf-8")
+
+        with self._file_lock:
+
+            if self._size and self._size + len(data) > self.max_bytes:
+
+                self._rotate()
+
+            if self._file is None:
+
+                self._file = open(self.path, 'ab')
+
+            self._file.write(data)
+
+            self._file.flush()
+
+            self._size += len(data)
+
+
+
+    def _rotate(self):
+
+        """تقسيم الملف: الحالي يبقى .1 والقديم يتزحلق لحد عدد النسخ المسموح"""
+
+        if self._file is not None:
+
+            self._file.close()
+
+            self._file = None
+
+        for index in range(self.backups - 1, 0, -1):
+
+            source = f"{self.path}.{index}"
+
+            if os.path.exists(source):
+
+                os.replace(source, f"{self.path}.{index + 1}")
+
+        if self.backups > 0:
+
+            os.replace(self.path, f"{self.path}.1")
+
+        else:
+
+            os.remove(self.path)
+
+        self._size = 0
+
+
+
+    def files(self) -> List[str]:
+
+        """ملفات السجل من الأحدث للأقدم"""
+
+        paths = [self.path] + [f"{self.path}.{index}" for index in range(1, self.backups + 1)]
+
+        return [path for path in paths if os.path.exists(path)]
+
+
+
+    def query(self, action: Optional[str] = None, since: Optional[datetime] = None,
+
+              until: Optional[datetime] = None, offset: int = 0, limit: int = 20) -> Tuple[List[dict], bool]:
+
+        """البحث في السجل من الأحدث للأقدم - بيرجع (الصفحة، فيه صفحات بعدها)
+
+
+
+        الفلترة بتتم على bytes السطر نفسه (التاريخ من أول السطر واسم العملية كنص)،
+
+        وفك الـ JSON بيحصل بس للسطور اللي هتتعرض في الصفحة.
+
+        """
+
+        self.flush(5)
+
+        action_key = b'"action": ' + json.dumps(action, ensure_ascii=False).encode("utf-8") if action else None
+
+        since_key = since.isoformat().encode() if since else None
+
+        until_key = until.isoformat().encode() if until else None
+
+        page = []
+
+        matched = 0
+
+        for path in self.files():
+
+            try:
+
+                with open(path, 'rb') as log_file:
+
+                    lines = log_file.read().split(b"\n")
+
+            except FileNotFoundError:
+
+                continue
+
+            for line in reversed(lines):
+
+                if not line:
+
+                    continue
+
+                timestamp = line[15:line.find(b'"', 15)]
+
+                if until_key and timestamp > until_key:
+
+                    continue
+
+                if since_key and timestamp < since_key:
+
+                    # الملفات مرتبة بالوقت فمفيش أقدم من كده يطابق
+
+                    return page, False
+
+                if action_key and action_key not in line:
+
+                    continue
+
+                if matched >= offset:
+
+                    if len(page) == limit:
+
+                        return page, True
+
+                    try:
+
+                        page.append(json.loads(line))
+
+                    except ValueError:
+
+                        continue
+
+                matched += 1
+
+        return page, False
+
+
+
+class BackupStore:
+
+    """نسخ احتياطية تزايدية: كل نقطة استرجاع = snapshot أساسي + الـ journal بعده (delta)
+
+    المحتوى بيتخزن مضغوط gzip باسم الـ sha256 بتاعه فالمحتوى المتكرر بيتكتب مرة واحدة،
+
+    والنقاط متسجلة بالترتيب في manifest بصيغة NDJSON"""
+
+    def __init__(self, directory: str = BACKUP_DIR, retention_hours: float = BACKUP_RETENTION_HOURS):
+
+        self.directory = directory
+
+        self.objects_dir = os.path.join(directory, "objects")
+
+        self.manifest_path = os.path.join(directory, "manifest.ndjson")
+
+        self.retention = timedelta(hours=retention_hours)
+
+        self._lock = threading.Lock()
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def points(self) -> List[dict]:
+
+        """كل نقاط الاسترجاع من الأقدم للأحدث"""
+
+        if not os.path.exists(self.manifest_path):
+
+            return []
+
+        points = []
+
+        with open(self.manifest_path, 'r', encoding='utf-8') as manifest:
+
+            for line in manifest:
+
+                try:
+
+                    points.append(json.loads(line))
+
+                except ValueError:
+
+                    continue
+
+        return points
+
+    def add(self, base: bytes, delta: bytes, suffix: str, journal_seq: int) -> Optional[dict]:
+
+        """تسجيل نقطة استرجاع - بترجع None لو المحتوى مطابق لآخر نقطة
+
+        journal_seq: رقم آخر عملية موجودة في المحتوى (0 لو التخزين مفيهوش journal زي SQLite)"""
+
+        with self._lock:
+
+            base_hash = self._store(base)
+
+            delta_hash = self._store(delta)
+
+            points = self.points()
+
+            if points and points[-1]["base"] == base_hash and points[-1]["delta"] == delta_hash:
+
+                return None
+
+            point = {
+
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+
+                "base": base_hash,
+
+                "delta": delta_hash,
+
+                "suffix": suffix,
+
+                "journal_seq": journal_seq
+
+            }
+
+            with open(self.manifest_path, 'a', encoding='utf-8') as manifest:
+
+                manifest.write(json.dumps(point) + "\n")
+
+                manifest.flush()
+
+                os.fsync(manifest.fileno())
+
+            return point
+
+    def find(self, at: Optional[datetime] = None) -> Optional[dict]:
+
+        """آخر نقطة استرجاع وقتها قبل at أو عنده (أو آخر نقطة خالص)"""
+
+        at_key = at.isoformat(timespec="seconds") if at else None
+
+        found = None
+
+        for point in self.points():
+
+            if at_key and point["timestamp"] > at_key:
+
+                break
+
+            found = point
+
+        return found
+
+    def read(self, object_hash: str) -> bytes:
+
+        """محتوى object بعد فك الضغط والتأكد من الـ hash"""
+
+        with open(os.path.join(self.objects_dir, f"{object_hash}.gz"), 'rb') as f:
+
+            data = gzip.decompress(f.read())
+
+        if hashlib.sha256(data).hexdigest() != object_hash:
+
+            raise ValueError(f"نسخة احتياطية تالفة: {object_hash}")
+
+        return data
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+
+        """حذف النقاط الأقدم من مدة الاحتفاظ (آخر نقطة بتفضل دايماً) والـ objects اللي مبقاش ليها نقطة"""
+
+        cutoff = ((now or datetime.now()) - self.retention).isoformat(timespec="seconds")
+
+        with self._lock:
+
+            points = self.points()
+
+            kept = [point for point in points[:-1] if point["timestamp"] >= cutoff] + points[-1:]
+
+            if len(kept) != len(points):
+
+                temp_path = f"{self.manifest_path}.tmp"
+
+                with open(temp_path, 'w', encoding='utf-8') as manifest:
+
+                    manifest.writelines(json.dumps(point) + "\n" for point in kept)
+
+                    manifest.flush()
+
+                    os.fsync(manifest.fileno())
+
+                os.replace(temp_path, self.manifest_path)
+
+            referenced = {point[key] for point in kept for key in ("base", "delta")}
+
+            for name in os.listdir(self.objects_dir):
+
+                if name.endswith(".gz") and name[:-3] not in referenced:
+
+                    os.remove(os.path.join(self.objects_dir, name))
+
+            return len(points) - len(kept)
+
+    def _store(self, data: bytes) -> str:
+
+        """كتابة object مضغوط لو مش موجود بالفعل"""
+
+        object_hash = hashlib.sha256(data).hexdigest()
+
+        path = os.path.join(self.objects_dir, f"{object_hash}.gz")
+
+        if not os.path.exists(path):
+
+            temp_path = f"{path}.tmp"
+
+            with open(temp_path, 'wb') as f:
+
+                f.write(gzip.compress(data, compresslevel=6))
+
+                f.flush()
+
+                os.fsync(f.fileno())
+
+            os.replace(temp_path, path)
+
+        return object_hash
+
+
+
+class BinarySnapshot:
+
+    """snapshot ثنائي عمودي لقاعدة البيانات: header بنسخة الـ schema ثم كل عمود كـ array أو جدول نصوص
+
+    التحميل بيقرا الأعمدة من الملف بـ mmap ويبني الأعمدة والفهارس منها من غير JSON ولا تحقق لكل حساب"""
+
+    MAGIC = b"ACSN"
+
+    # 2: الأوقات أعمدة epoch (last_used الفاضي NaN) بدل نصوص ISO - 3: عمود نسخة السجل - النسخ الأقدم لسه بتتقري
+
+    SCHEMA_VERSION = 3
+
+    READABLE_VERSIONS = (1, 2, 3)
+
+    # magic، نسخة الـ schema، عدد الحسابات، رقم آخر عملية في الـ journal، طول الـ meta
+
+    HEADER = struct.Struct("<4sHIQI")
+
+    SECTION = struct.Struct("<Q")
+
+
+
+    def __init__(self, db: dict, journal_seq: int, columns: "AccountColumns"):
+
+        self.db = db
+
+        self.journal_seq = journal_seq
+
+        self.columns = columns
+
+    @classmethod
+
+    def encode(cls, db: dict, journal_seq: int) -> bytes:
+
+        """تحويل القاعدة لملف ثنائي (الحسابات أعمدة والإعدادات والإحصائيات JSON في الـ meta)"""
+
+        accounts = db["accounts"]
+
+        meta = {key: value for key, value in db.items() if key != "accounts"}
+
+        meta["journal_seq"] = journal_seq
+
+        emails, lease_ids, extras = [], [], []
+
+        available_ts = array("d")
+
+        added_ts = array("d")
+
+        last_used_ts = array("d")
+
+        status = array("b")
+
+        use_count = array("q")
+
+        priority = array("q")
+
+        password_group = array("i")
+
+        versions = array("q")
+
+        groups = {}
+
+        for email, data in accounts.items():
+
+            emails.append(email)
+
+            available_ts.append(data.available_at)
+
+            added_ts.append(data.added_at)
+
+            last_used_ts.append(math.nan if data.last_used is None else data.last_used)
+
+            lease_ids.append(data.lease_id or "")
+
+            use_count.append(data.use_count)
+
+            priority.append(data.priority)
+
+            password_group.append(groups.setdefault(data.password, len(groups)))
+
+            versions.append(data.version)
+
+            status.append(data.status)
+
+            # المفاتيح الإضافية (ومعاها الحالة لو مش معروفة) بتتحفظ كما هي
+
+            extras.append(json.dumps(data.extra, ensure_ascii=False) if data.extra else "")
+
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+        parts = [cls.HEADER.pack(cls.MAGIC, cls.SCHEMA_VERSION, len(emails), journal_seq, len(meta_bytes)), meta_bytes]
+
+        for column in (available_ts, added_ts, last_used_ts, status, use_count, priority, password_group, versions):
+
+            parts.extend(cls._pack_section(cls._to_bytes(column)))
+
+        for values in (emails, list(groups), lease_ids, extras):
+
+            offsets = array("Q", accumulate(map(len, values), initial=0))
+
+            parts.extend(cls._pack_section(cls._to_bytes(offsets)))
+
+            parts.extend(cls._pack_section("".join(values).encode("utf-8")))
+
+        return b"".join(parts)
+
+    @classmethod
+
+    def load(cls, path: str) -> "BinarySnapshot":
+
+        """قراءة snapshot ثنائي من ملف بـ mmap - ValueError لو الملف مش snapshot أو ناقص أو تالف أو نسخة الـ schema مختلفة"""
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+            return cls.decode(mapped)
+
+    @classmethod
+
+    def decode(cls, data) -> "BinarySnapshot":
+
+        """قراءة snapshot ثنائي من bytes أو mmap - أي ملف ناقص أو تالف بيطلع ValueError (عشان الاستعادة من نسخة احتياطية)
+
+        الأجزاء المقصوصة من الـ memoryview بتتحرر قبل ما الـ mmap يتقفل، وإلا الإقفال بيفشل بـ BufferError"""
+
+        view = memoryview(data)
+
+        sections = []
+
+        try:
+
+            return cls._decode(view, sections)
+
+        except (struct.error, BufferError, IndexError, KeyError, TypeError, OverflowError) as e:
+
+            raise ValueError(f"ملف snapshot تالف: {e}") from e
+
+        finally:
+
+            for section in sections:
+
+                section.release()
+
+            view.release()
+
+
+
+    @classmethod
+
+    def _decode(cls, view: memoryview, sections: list) -> "BinarySnapshot":
+
+        """فك الـ snapshot - sections بيتملى بأجزاء view عشان decode يحررها مهما حصل"""
+
+        if len(view) < cls.HEADER.size:
+
+            raise ValueError("ملف snapshot ناقص")
+
+        magic, version, count, journal_seq, meta_length = cls.HEADER.unpack_from(view)
+
+        if magic != cls.MAGIC:
+
+            raise ValueError("الملف مش snapshot ثنائي")
+
+        if version not in cls.READABLE_VERSIONS:
+
+            raise ValueError(f"نسخة schema غير مدعومة: {version}")
+
+        position = cls.HEADER.size + meta_length
+
+        if position > len(view):
+
+            raise ValueError("ملف snapshot ناقص")
+
+        meta = json.loads(bytes(view[cls.HEADER.size:position]))
+
+        while position < len(view):
+
+            (length,) = cls.SECTION.unpack_from(view, position)
+
+            position += cls.SECTION.size
+
+            if position + length > len(view):
+
+                raise ValueError("ملف snapshot ناقص")
+
+            sections.append(view[position:position + length])
+
+            position += length
+
+        if version == 1:
+
+            available_ts, status, use_count, priority, password_group = (
+
+                cls._from_bytes(typecode, section) for typecode, section in zip("dbqqi", sections)
+
+            )
+
+            emails, passwords, added_at, _, last_used, lease_ids, extras = (
+
+                cls._unpack_strings(sections[i], sections[i + 1]) for i in range(5, 19, 2)
+
+            )
+
+            added_at = [Account.parse_time(value) for value in added_at]
+
+            last_used = [Account.parse_time(value) for value in last_used]
+
+        else:
+
+            available_ts, added_at, last_used, status, use_count, priority, password_group = (
+
+                cls._from_bytes(typecode, section) for typecode, section in zip("dddbqqi", sections)
+
+            )
+
+        if version < 3:
+
+            versions = array("q", [1]) * count
+
+        else:
+
+            versions = cls._from_bytes("q", sections[7])
+
+        if version == 2:
+
+            emails, passwords, lease_ids, extras = (
+
+                cls._unpack_strings(sections[i], sections[i + 1]) for i in range(7, 15, 2)
+
+            )
+
+        elif version == 3:
+
+            emails, passwords, lease_ids, extras = (
+
+                cls._unpack_strings(sections[i], sections[i + 1]) for i in range(8, 16, 2)
+
+            )
+
+        if len(emails) != count:
+
+            raise ValueError("عدد الحسابات في الـ snapshot مش مطابق للـ header")
+
+        statuses = tuple(AccountStatus)
+
+        accounts = {}
+
+        for row, email in enumerate(emails):
+
+            last_used_ts = last_used[row]
+
+            accounts[email] = Account(
+
+                passwords[password_group[row]],
+
+                added_at[row],
+
+                available_ts[row],
+
+                statuses[status[row]],
+
+                # NaN (أو None في نسخة 1) = الحساب لسه متستخدمش
+
+                None if last_used_ts is None or last_used_ts != last_used_ts else last_used_ts,
+
+                use_count[row],
+
+                priority[row],
+
+                lease_ids[row] or None,
+
+                versions[row],
+
+                json.loads(extras[row]) if extras[row] else None
+
+            )
+
+        db = dict(meta, accounts=accounts)
+
+        columns = AccountColumns.from_arrays(emails, available_ts, status, use_count, priority, password_group, passwords)
+
+        return cls(db, journal_seq, columns)
+
+    @classmethod
+
+    def _pack_section(cls, data: bytes) -> Tuple[bytes, bytes]:
+
+        return cls.SECTION.pack(len(data)), data
+
+    @staticmethod
+
+    def _to_bytes(column: array) -> bytes:
+
+        """الأعمدة بتتكتب little-endian دايماً"""
+
+        if sys.byteorder != "little":
+
+            column = array(column.typecode, column)
+
+            column.byteswap()
+
+        return column.tobytes()
+
+    @staticmethod
+
+    def _from_bytes(typecode: str, data) -> array:
+
+        column = array(typecode)
+
+        column.frombytes(data)
+
+        if sys.byteorder != "little":
+
+            column.byteswap()
+
+        return column
+
+    @classmethod
+
+    def _unpack_strings(cls, offsets_data, blob) -> List[str]:
+
+        """جدول نصوص: offsets بالحروف ثم النصوص كلها ورا بعض - فك ترميز واحد وقص لكل قيمة"""
+
+        offsets = cls._from_bytes("Q", offsets_data)
+
+        text = str(blob, "utf-8")
+
+        return [text[start:end] for start, end in pairwise(offsets)]
+
+
+
+class AccountManager:
+
+    # ملف التخزين الأساسي وامتداد النسخ الاحتياطية
+
+    database_file = BINARY_DB_FILE if SNAPSHOT_FORMAT == "binary" else DB_FILE
+
+    backup_suffix = ".bin" if SNAPSHOT_FORMAT == "binary" else ".json"
+
+    # امتدادات نقط الاسترجاع اللي ليها journal (نقط SQLite ملهاش)
+
+    JOURNAL_SUFFIXES = (".json", ".bin")
+
+
+
+    def __init__(self):
+
+        self._lock = threading.RLock()
+
+        self._file_lock = threading.Lock()
+
+        # نسخة القراءة المنشورة ورقم آخر تعديل (بيزيد مع كل عملية في الـ journal)
+
+        self._version = 0
+
+        self._snapshot = None
+
+        self._flusher = WriteBehindFlusher(self._write_journal_lines, on_commit=self.publish_snapshot)
+
+        atexit.register(self._flusher.stop, 10)
+
+        self._journal_file = None
+
+        self._journal_seq = 0
+
+        self._journal_ops = 0
+
+        self._compacting = False
+
+        self._compaction_thread = None
+
+        self._availability = AvailabilityIndex()
+
+        self.activity = ActivityLog()
+
+        self._columns = AccountColumns()
+
+        self.create_backup_dir()
+
+        self.backups = BackupStore()
+
+        self.load_database()
+
+        self.publish_snapshot()
+
+
+
+    def create_backup_dir(self):
+
+        """إنشاء مجلد النسخ الاحتياطية"""
+
+        if not os.path.exists(BACKUP_DIR):
+
+            os.makedirs(BACKUP_DIR)
+
+
+
+    def setup_auto_backup(self):
+
+        """تشغيل النسخ الاحتياطي التزايدي في thread كل BACKUP_INTERVAL_SECONDS (أول نقطة فوراً)
+
+        main() بتشغله بعد مجموعة عمليات الاستخراج - مش وقت الاستيراد"""
+
+        self._backup_stop = threading.Event()
+
+        def run():
+
+            while True:
+
+                self.run_backup()
+
+                if self._backup_stop.wait(BACKUP_INTERVAL_SECONDS):
+
+                    return
+
+        self._backup_thread = threading.Thread(target=run, name="db-backup", daemon=True)
+
+        self._backup_thread.start()
+
+        atexit.register(self._backup_stop.set)
+
+    def run_backup(self) -> Optional[dict]:
+
+        """نقطة استرجاع جديدة لو المحتوى اتغير من آخر نقطة، وحذف النقاط الأقدم من مدة الاحتفاظ"""
+
+        try:
+
+            base, delta = self._backup_sources()
+
+            point = self.backups.add(base, delta, self.backup_suffix, self._backup_journal_seq(base, delta))
+
+            if point:
+
+                logger.info(f"تم إنشاء نقطة استرجاع: {point['timestamp']}")
+
+            pruned = self.backups.prune()
+
+            if pruned:
+
+                logger.info(f"تم حذف {pruned} نقطة استرجاع قديمة")
+
+            return point
+
+        except Exception as e:
+
+            logger.error(f"خطأ في النسخ الاحتياطي: {e}")
+
+            return None
+
+    def _backup_sources(self) -> Tuple[bytes, bytes]:
+
+        """آخر snapshot على القرص والـ journal اللي بعده (.old + الحالي) كما هم"""
+
+        while True:
+
+            # ضغط شغال بيغير الـ snapshot والـ journal فبنستنى يخلص
+
+            running = self._compaction_thread
+
+            if running is not None and running.is_alive():
+
+                running.join()
+
+            with self._lock:
+
+                if not self._compacting:
+
+                    with self._file_lock:
+
+                        return self._read_backup_files()
+
+            time.sleep(0.05)
+
+    def _read_backup_files(self) -> Tuple[bytes, bytes]:
+
+        base = b""
+
+        if os.path.exists(self.database_file):
+
+            with open(self.database_file, 'rb') as f:
+
+                base = f.read()
+
+        delta = []
+
+        for path in (f"{JOURNAL_FILE}.old", JOURNAL_FILE):
+
+            if os.path.exists(path):
+
+                with open(path, 'rb') as f:
+
+                    delta.append(f.read())
+
+        return base, b"".join(delta)
+
+    def _backup_journal_seq(self, base: bytes, delta: bytes) -> int:
+
+        """رقم آخر عملية في محتوى النسخة: آخر سطر سليم في الـ delta، ولو فاضي فالرقم المتسجل في الـ snapshot نفسه
+
+        مش self._journal_seq لأن العمليات اللي لسه في طابور الكتابة مش في الملفات"""
+
+        for line in reversed(delta.splitlines()):
+
+            try:
+
+                return json.loads(line)["seq"]
+
+            except (ValueError, KeyError, TypeError):
+
+                # سطر مقطوع في آخر الـ journal
+
+                continue
+
+        if not base or self.backup_suffix not in self.JOURNAL_SUFFIXES:
+
+            return 0
+
+        try:
+
+            if self.backup_suffix == ".bin":
+
+                return BinarySnapshot.HEADER.unpack_from(base)[3]
+
+            return json.loads(base).get("journal_seq", 0)
+
+        except (struct.error, ValueError, AttributeError):
+
+            # snapshot تالف - النسخة بتتسجل برضه والاستعادة بتعتمد على الـ seq اللي جوه المحتوى
+
+            return 0
+
+
+
+    def _copy_database_file(self, backup_path: str):
+
+        """نسخ ملف قاعدة البيانات كما هو"""
+
+        import shutil
+
+        shutil.copy2(self.database_file, backup_path)
+
+
+
+    def write_backup(self, backup_path: str):
+
+        """كتابة نسخة احتياطية محدثة من قاعدة البيانات"""
+
+        self.compact_database(background=False)
+
+        self._copy_database_file(backup_path)
+
+
+
+    def load_database(self):
+
+        """تحميل قاعدة البيانات مع معالجة الأخطاء"""
+
+        # الأعمدة الجاهزة من الـ snapshot الثنائي (بتتلغي لو الـ journal غيّر الحسابات)
+
+        columns = None
+
+        try:
+
+            snapshot_file = self._latest_snapshot_file()
+
+            if snapshot_file == BINARY_DB_FILE:
+
+                # نسخة الـ schema اتأكدت من الـ header فمفيش تحقق لكل حساب
+
+                snapshot = BinarySnapshot.load(BINARY_DB_FILE)
+
+                self.db = snapshot.db
+
+                columns = snapshot.columns
+
+            elif snapshot_file:
+
+                with open(DB_FILE, 'r', encoding='utf-8') as f:
+
+                    content = f.read().strip()
+
+                    if content:
+
+                        self.db = json.loads(content)
+
+                        self._validate_database()
+
+                    else:
+
+                        self._create_default_db()
+
+            else:
+
+                self._create_default_db()
+
+            # إعادة تطبيق العمليات المسجلة في الـ journal بعد آخر snapshot
+
+            replayed = self._replay_journal()
+
+            if replayed:
+
+                columns = None
+
+                logger.info(f"تم استرجاع {replayed} عملية من الـ journal")
+
+                self.compact_database(background=False)
+
+            logger.info(f"تم تحميل قاعدة البيانات: {len(self.db['accounts'])} حساب")
+
+        except ValueError as e:
+
+            # JSON بايظ أو snapshot ثنائي ناقص/بايظ أو بنسخة schema مختلفة
+
+            columns = None
+
+            logger.error(f"خطأ في قراءة ملف قاعدة البيانات: {e}")
+
+            self._restore_from_backup()
+
+        except Exception as e:
+
+            columns = None
+
+            logger.error(f"خطأ في تحميل قاعدة البيانات: {e}")
+
+            # ملف موجود ومتقراش: التشغيل بيقف بدل ما قاعدة فاضية تتكتب فوقه
+
+            if self._latest_snapshot_file() is not None:
+
+                raise
+
+            self._create_default_db()
+
+        self._migrate_legacy_logs()
+
+        self._rebuild_indexes(columns)
+
+    @staticmethod
+
+    def _latest_snapshot_file() -> Optional[str]:
+
+        """أحدث snapshot موجود من الصيغتين - عشان تغيير SNAPSHOT_FORMAT ميرجعش لملف قديم"""
+
+        existing = [path for path in (DB_FILE, BINARY_DB_FILE) if os.path.exists(path)]
+
+        return max(existing, key=os.path.getmtime, default=None)
+
+
+
+    def _migrate_legacy_logs(self):
+
+        """نقل السجلات المحفوظة جوه ملف القاعدة (النسخ القديمة) لسجل الأنشطة مرة واحدة"""
+
+        legacy_logs = self.db.pop("logs", None)
+
+        if not legacy_logs:
+
+            return
+
+        for entry in legacy_logs:
+
+            self.activity.append(entry.get("action", ""), entry.get("details", ""), entry.get("timestamp"))
+
+        self.activity.flush()
+
+        self.compact_database(background=False)
+
+        logger.info(f"تم نقل {len(legacy_logs)} سجل لملف {ACTIVITY_LOG_FILE}")
+
+
+
+    def _rebuild_indexes(self, columns: Optional[AccountColumns] = None):
+
+        """بناء الفهارس في الذاكرة من الحسابات المحملة (أو من أعمدة جاهزة بنفس ترتيب الحسابات)"""
+
+        # الحالة كلها اتغيرت (تحميل أو استرجاع) - أي نسخة قراءة بتتنسخ وقتها بتتعاد ونسخة جديدة بتتنشر
+
+        self._version += 1
+
+        if columns is None:
+
+            self._columns.build(self.db["accounts"])
+
+        else:
+
+            self._columns = columns
+
+        self._availability.build(self.db["accounts"], self._columns.available_at)
+
+        # الـ leases المفتوحة متسجلة في الحسابات نفسها فبترجع بعد إعادة التشغيل
+
+        self._leases = {}
+
+        now_ts = datetime.now().timestamp()
+
+        for email, data in self.db["accounts"].items():
+
+            if data.status == AccountStatus.LEASED and data.lease_id and data.available_at > now_ts:
+
+                self._leases.setdefault(data.lease_id, []).append(email)
+
+
+
+    def _validate_database(self):
+
+        """التحقق من صحة بنية قاعدة البيانات"""
+
+        if not isinstance(self.db, dict):
+
+            raise ValueError("قاعدة البيانات ليست dict")
+
+
+
+        if "accounts" not in self.db:
+
+            self.db["accounts"] = {}
+
+
+
+        if "settings" not in self.db:
+
+            self.db["settings"] = {
+
+                "pending_hours": DEFAULT_PENDING_HOURS,
+
+                "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+
+                "fixed_password": DEFAULT_FIXED_PASSWORD
+
+            }
+
+
+
+        if "fixed_password" not in self.db["settings"]:
+
+            self.db["settings"]["fixed_password"] = DEFAULT_FIXED_PASSWORD
+
+        if "stats" not in self.db:
+
+            self.db["stats"] = {
+
+                "total_requests": 0,
+
+                "successful_requests": 0,
+
+                "last_restart": datetime.now().isoformat()
+
+            }
+
+
+
+        # التحقق من بيانات كل حساب وتحويله لسجل Account (الحقول الناقصة بتاخد القيم الافتراضية)
+
+        self.db["accounts"] = {
+
+            email: Account.from_dict(data)
+
+            for email, data in self.db["accounts"].items()
+
+            if isinstance(data, dict)
+
+        }
+
+
+
+    def _default_db(self) -> dict:
+
+        """بنية قاعدة البيانات الافتراضية"""
+
+        return {
+
+            "accounts": {},
+
+            "settings": {
+
+                "pending_hours": DEFAULT_PENDING_HOURS,
+
+                "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+
+                "fixed_password": DEFAULT_FIXED_PASSWORD
+
+            },
+
+            "stats": {
+
+                "total_requests": 0,
+
+                "successful_requests": 0,
+
+                "last_restart": datetime.now().isoformat()
+
+            }
+
+        }
+
+
+
+    def _create_default_db(self):
+
+        """إنشاء قاعدة بيانات افتراضية"""
+
+        self.db = self._default_db()
+
+        self._write_snapshot(self._serialize_db())
+
+        logger.info("تم إنشاء قاعدة بيانات جديدة")
+
+
+
+    def _restore_from_backup(self, at: Optional[datetime] = None):
+
+        """استعادة من آخر نقطة استرجاع قبل at (أو آخر نقطة) - ومن ملفات auto_backup القديمة لو مفيش نقاط"""
+
+        try:
+
+            point = self.backups.find(at)
+
+            if point is not None:
+
+                # العمليات الأحدث من النقطة موجودة في الـ journal الحالي
+
+                self._load_backup_point(point, include_files=True)
+
+                self.compact_database(background=False)
+
+                logger.info(f"تم الاستعادة من نقطة الاسترجاع: {point['timestamp']}")
+
+                return
+
+            backup_files = [f for f in os.listdir(BACKUP_DIR) if f.startswith('auto_backup_')]
+
+            backup_files.sort(reverse=True)
+
+            if backup_files:
+
+                latest_backup = os.path.join(BACKUP_DIR, backup_files[0])
+
+                if latest_backup.endswith(".bin"):
+
+                    self.db = BinarySnapshot.load(latest_backup).db
+
+                else:
+
+                    with open(latest_backup, 'r', encoding='utf-8') as f:
+
+                        self.db = json.load(f)
+
+                    self._validate_database()
+
+                # العمليات الأحدث من النسخة الاحتياطية موجودة في الـ journal
+
+                self._replay_journal()
+
+                self.compact_database(background=False)
+
+                logger.info(f"تم الاستعادة من النسخة الاحتياطية: {backup_files[0]}")
+
+            else:
+
+                raise FileNotFoundError(f"مفيش نسخة احتياطية في {BACKUP_DIR}")
+
+        except Exception as e:
+
+            # ملف القاعدة موجود بس متقراش: قاعدة فاضية فوقه (والنسخ الاحتياطية بعدها) هتضيع الحسابات، فالتشغيل بيقف
+
+            logger.error(
+
+                f"فشل في الاستعادة من النسخة الاحتياطية: {e} - التشغيل وقف من غير ما يكتب فوق "
+
+                f"{self._latest_snapshot_file()} (صلحه أو انقله واعمل restart)"
+
+            )
+
+            raise
+
+    def _load_backup_point(self, point: dict, include_files: bool = False):
+
+        """تحميل snapshot نقطة الاسترجاع وتطبيق الـ journal المحفوظ معاها (ومعاه ملفات الـ journal لو include_files)
+
+        ملفات الـ journal الحالية بتكمل نقط الـ journal بس - نقطة SQLite (.db) مش من نفس السلسلة"""
+
+        self.db = self._decode_backup_base(point["suffix"], self.backups.read(point["base"]))
+
+        delta = self.backups.read(point["delta"]).decode("utf-8", errors="replace")
+
+        include_files = include_files and point["suffix"] in self.JOURNAL_SUFFIXES
+
+        self._replay_journal(delta.splitlines(), include_files=include_files)
+
+
+
+    def _decode_backup_base(self, suffix: str, base: bytes) -> dict:
+
+        """قاعدة البيانات من الـ snapshot الأساسي لنقطة استرجاع حسب نوعه (امتداد النقطة) مش حسب التخزين الحالي"""
+
+        if not base:
+
+            return self._default_db()
+
+        if suffix == ".bin":
+
+            return BinarySnapshot.decode(base).db
+
+        if suffix == ".json":
+
+            self.db = json.loads(base)
+
+        elif suffix == ".db":
+
+            self.db = self._read_sqlite_backup(base)
+
+        else:
+
+            raise ValueError(f"نوع نسخة احتياطية مش معروف: {suffix}")
+
+        self._validate_database()
+
+        return self.db
+
+
+
+    def _read_sqlite_backup(self, data: bytes) -> dict:
+
+        """الحسابات والإعدادات والإحصائيات من نسخة ملف SQLite بشكل JSON المحفوظ"""
+
+        db = self._default_db()
+
+        fd, path = tempfile.mkstemp(suffix=".db")
+
+        try:
+
+            with os.fdopen(fd, 'wb') as f:
+
+                f.write(data)
+
+            conn = sqlite3.connect(path)
+
+            conn.row_factory = sqlite3.Row
+
+            try:
+
+                for row in conn.execute("SELECT * FROM accounts"):
+
+                    account = dict(row)
+
+                    db["accounts"][account.pop("email")] = account
+
+                for table in ("settings", "stats"):
+
+                    for row in conn.execute(f"SELECT key, value FROM {table}"):
+
+                        db[table][row["key"]] = json.loads(row["value"])
+
+            finally:
+
+                conn.close()
+
+        except sqlite3.DatabaseError as e:
+
+            raise ValueError(f"نسخة SQLite احتياطية تالفة: {e}") from e
+
+        finally:
+
+            os.remove(path)
+
+        return db
+
+    def restore_backup(self, at: Optional[datetime] = None) -> Optional[dict]:
+
+        """استرجاع القاعدة زي ما كانت عند الوقت at (آخر نقطة قبله) وحفظها كقاعدة حالية
+
+        العمليات اللي بعد النقطة بتتلغي، ورقم الـ journal بيفضل يزيد عشان سطورها القديمة متتطبقش تاني"""
+
+        point = self.backups.find(at)
+
+        if point is None:
+
+            return None
+
+        with self._lock:
+
+            current_seq = self._journal_seq
+
+            self._load_backup_point(point)
+
+            self._journal_seq = max(self._journal_seq, current_seq)
+
+            self._version += 1
+
+            self._rebuild_indexes()
+
+        self.compact_database(background=False)
+
+        self.publish_snapshot()
+
+        self.add_log("استرجاع نسخة احتياطية", point["timestamp"])
+
+        # نقطة جديدة للحالة المسترجعة عشان الاستعادة بعد أي عطل تبدأ منها مش من نقطة أحدث اتلغت
+
+        self.run_backup()
+
+        return point
+
+    def _open_journal(self):
+
+        """فتح ملف الـ journal للإضافة فقط"""
+
+        self._journal_file = open(JOURNAL_FILE, 'a', encoding='utf-8')
+
+
+
+    @metrics.timed("storage")
+
+    def _write_journal_lines(self, lines: List[str]):
+
+        """كتابة دفعة سطور الـ journal مرة واحدة مع fsync واحد (بتتنادى من خيط الـ flusher)"""
+
+        with self._file_lock:
+
+            if self._journal_file is None:
+
+                self._open_journal()
+
+            self._journal_file.write("".join(lines))
+
+            self._journal_file.flush()
+
+            os.fsync(self._journal_file.fileno())
+
+
+
+    def _replay_journal(self, lines: Iterable[str] = (), include_files: bool = True) -> int:
+
+        """إعادة تطبيق سجل العمليات (journal) على آخر snapshot
+
+        lines: سطور journal قبل ملفات الـ journal (من نسخة احتياطية) - أي عملية اتطبقت قبل كده بتتخطى بالـ seq"""
+
+        self._journal_seq = self.db.get("journal_seq", 0)
+
+        replayed = 0
+
+        for line in chain(lines, self._journal_file_lines() if include_files else ()):
+
+            line = line.strip()
+
+            if not line:
+
+                continue
+
+            try:
+
+                record = json.loads(line)
+
+            except json.JSONDecodeError:
+
+                # سطر مقطوع بسبب انهيار أثناء الكتابة
+
+                logger.warning("تم تجاهل سطر تالف في الـ journal")
+
+                continue
+
+            seq = record.get("seq", 0)
+
+            if seq <= self._journal_seq:
+
+                continue
+
+            self._apply_journal_record(record)
+
+            self._journal_seq = seq
+
+            replayed += 1
+
+        if self._journal_file is None:
+
+            self._open_journal()
+
+        return replayed
+
+
+
+    @staticmethod
+
+    def _journal_file_lines() -> Iterator[str]:
+
+        # الملف .old موجود لو حصل انهيار أثناء ضغط سابق
+
+        for path in (f"{JOURNAL_FILE}.old", JOURNAL_FILE):
+
+            if not os.path.exists(path):
+
+                continue
+
+            with open(path, 'r', encoding='utf-8') as f:
+
+                yield from f
+
+    def _apply_journal_record(self, record: dict):
+
+        """تطبيق عملية واحدة من الـ journal على القاعدة في الذاكرة"""
+
+        op = record.get("op")
+
+        if op == "account":
+
+            self.db["accounts"][record["email"]] = Account.from_dict(record["data"])
+
+        elif op == "accounts":
+
+            self.db["accounts"].update(
+
+                (email, Account.from_dict(data)) for email, data in record["data"].items()
+
+            )
+
+        elif op == "delete":
+
+            self.db["accounts"].pop(record["email"], None)
+
+        elif op == "settings":
+
+            self.db["settings"] = record["data"]
+
+        elif op == "stats":
+
+            self.db["stats"] = record["data"]
+
+        elif op == "log":
+
+            # سجلات journal قديمة - بتتنقل لسجل الأنشطة بعد التحميل
+
+            self.db.setdefault("logs", []).append(record["entry"])
+
+        elif op == "reset":
+
+            self.db = record["db"]
+
+            self._validate_database()
+
+        else:
+
+            logger.warning(f"عملية غير معروفة في الـ journal: {op}")
+
+
+
+    def _journal(self, op: str, **fields):
+
+        """إضافة سجل عملية واحد للـ journal - التكلفة ثابتة مهما كان حجم القاعدة
+
+        الخطأ بيترفع للي نادى بعد تسجيله عشان ميبلغش بنجاح عملية متسجلتش"""
+
+        try:
+
+            with self._lock:
+
+                self._journal_seq += 1
+
+                self._version += 1
+
+                record = {"seq": self._journal_seq, "op": op, **fields}
+
+                # الكتابة الفعلية على القرص بتتم في الخلفية دفعة واحدة
+
+                self._flusher.submit(json.dumps(record, ensure_ascii=False, default=Account.json_default) + "\n")
+
+                self._journal_ops += 1
+
+
+
+                if self._journal_ops >= JOURNAL_COMPACT_OPS:
+
+                    self.compact_database()
+
+        except Exception as e:
+
+            logger.error(f"خطأ في كتابة الـ journal: {e}")
+
+            raise
+
+
+
+    @metrics.timed("storage")
+
+    def _serialize_db(self, db: Optional[dict] = None) -> Union[str, bytes]:
+
+        """تحويل القاعدة (أو نسخة منها من _copy_db) لنص JSON أو snapshot ثنائي حسب SNAPSHOT_FORMAT مع رقم آخر عملية مطبقة"""
+
+        if db is None:
+
+            self.db["journal_seq"] = self._journal_seq
+
+            db = self.db
+
+        if SNAPSHOT_FORMAT == "binary":
+
+            return BinarySnapshot.encode(db, db["journal_seq"])
+
+        return json.dumps(db, ensure_ascii=False, default=Account.json_default)
+
+
+
+    def _copy_db(self) -> dict:
+
+        """نسخة سطحية من القاعدة تتحول بره القفل - السجلات بتتستبدل ومبتتعدلش فمش محتاجة نسخ"""
+
+        self.db["journal_seq"] = self._journal_seq
+
+        return dict(
+
+            self.db,
+
+            accounts=dict(self.db["accounts"]),
+
+            settings=dict(self.db["settings"]),
+
+            stats=dict(self.db["stats"])
+
+        )
+
+
+
+    def _rotate_journal(self):
+
+        """نقل الـ journal الحالي إلى .old لحين كتابة الـ snapshot"""
+
+        old_journal = f"{JOURNAL_FILE}.old"
+
+        if not os.path.exists(JOURNAL_FILE):
+
+            return
+
+
+
+        if os.path.exists(old_journal):
+
+            # ضغط سابق لم يكتمل: نضيف السجلات الجديدة لنفس الملف
+
+            import shutil
+
+            with open(JOURNAL_FILE, 'r', encoding='utf-8') as src, open(old_journal, 'a', encoding='utf-8') as dst:
+
+                shutil.copyfileobj(src, dst)
+
+            os.remove(JOURNAL_FILE)
+
+        else:
+
+            os.replace(JOURNAL_FILE, old_journal)
+
+
+
+    @metrics.timed("storage")
+
+    def compact_database(self, background: bool = True) -> bool:
+
+        """ضغط الـ journal في snapshot جديد لملف قاعدة البيانات"""
+
+        if not background:
+
+            # الانتظار لو فيه ضغط شغال في الخلفية
+
+            running = self._compaction_thread
+
+            if running is not None and running.is_alive():
+
+                running.join()
+
+
+
+        with self._lock:
+
+            if self._compacting:
+
+                return False
+
+            self._compacting = True
+
+            try:
+
+                # التحويل لنص (الجزء التقيل) بيتم على النسخة بره القفل
+
+                db = self._copy_db()
+
+                with self._file_lock:
+
+                    if self._journal_file is not None:
+
+                        self._journal_file.close()
+
+                        self._journal_file = None
+
+                    self._rotate_journal()
+
+                    self._open_journal()
+
+                self._journal_ops = 0
+
+            except Exception as e:
+
+                self._compacting = False
+
+                logger.error(f"خطأ في تجهيز ضغط الـ journal: {e}")
+
+                return False
+
+
+
+        def write_snapshot():
+
+            try:
+
+                if self._write_snapshot(self._serialize_db(db)):
+
+                    try:
+
+                        os.remove(f"{JOURNAL_FILE}.old")
+
+                    except FileNotFoundError:
+
+                        pass
+
+            except Exception as e:
+
+                # الـ journal القديم (.old) لسه موجود فمفيش بيانات ضاعت
+
+                logger.error(f"خطأ في كتابة الـ snapshot: {e}")
+
+            finally:
+
+                self._compacting = False
+
+
+
+        if background:
+
+            self._compaction_thread = threading.Thread(target=write_snapshot, name="db-compaction", daemon=True)
+
+            self._compaction_thread.start()
+
+        else:
+
+            write_snapshot()
+
+        return True
+
+
+
+    @metrics.timed("storage")
+
+    def _write_snapshot(self, payload: Union[str, bytes]) -> bool:
+
+        """كتابة snapshot كامل لملف قاعدة البيانات بشكل آمن"""
+
+        max_retries = 3
+
+        binary = isinstance(payload, bytes)
+
+        for attempt in range(max_retries):
+
+            try:
+
+                temp_file = f"{self.database_file}.tmp"
+
+                with (open(temp_file, 'wb') if binary else open(temp_file, 'w', encoding='utf-8')) as f:
+
+                    f.write(payload)
+
+                    f.flush()
+
+                    os.fsync(f.fileno())
+
+                if os.path.exists(self.database_file):
+
+                    os.replace(temp_file, self.database_file)
+
+                else:
+
+                    os.rename(temp_file, self.database_file)
+
+                return True
+
+            except Exception as e:
+
+                logger.error(f"محاولة {attempt + 1}: خطأ في حفظ قاعدة البيانات: {e}")
+
+                if attempt == max_retries - 1:
+
+                    # في حالة فشل كل المحاولات، نحفظ نسخة احتياطية طارئة
+
+                    emergency_file = f"emergency_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{self.backup_suffix}"
+
+                    try:
+
+                        with (open(emergency_file, 'wb') if binary else open(emergency_file, 'w', encoding='utf-8')) as f:
+
+                            f.write(payload)
+
+                        logger.info(f"تم حفظ نسخة احتياطية طارئة: {emergency_file}")
+
+                    except:
+
+                        pass
+
+                    return False
+
+        return False
+
+
+
+    @metrics.timed("storage")
+
+    def save_database(self):
+
+        """حفظ قاعدة البيانات: العمليات متسجلة في طابور الكتابة، والـ flusher بيثبتها على القرص خلال FLUSH_INTERVAL_MS"""
+
+        return True
+
+
+
+    @metrics.timed("storage")
+
+    def flush_database(self, timeout: Optional[float] = None) -> bool:
+
+        """الانتظار لحد ما كل العمليات المسجلة تتكتب على القرص فعلياً - False لو المهلة خلصت أو الكتابة فاشلة"""
+
+        if not self._flusher.flush(timeout):
+
+            reason = self._flusher.error or "انتهت مهلة الانتظار"
+
+            logger.error(f"خطأ في تثبيت الـ journal على القرص: {reason}")
+
+            return False
+
+        return True
+
+
+
+    async def flush_database_async(self, timeout: Optional[float] = None) -> bool:
+
+        """نسخة async من flush_database عشان متوقفش الـ event loop"""
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(None, self.flush_database, timeout)
+
+
+
+    def add_log(self, action: str, details: str = ""):
+
+        """إضافة سجل للأنشطة (ملف السجل المنفصل - مش جوه قاعدة البيانات)"""
+
+        try:
+
+            self.activity.append(action, details)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إضافة السجل: {e}")
+
+
+
+    def is_valid_email(self, email: str) -> bool:
+
+        """التحقق من صحة الإيميل"""
+
+        if not email or not isinstance(email, str):
+
+            return False
+
+
+
+        email = email.strip().lower()
+
+
+
+        if len(email) < 5 or len(email) > 100:
+
+            return False
+
+
+
+        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+        return re.match(pattern, email) is not None
+
+
+
+    @metrics.timed("parse")
+
+    def extract_credentials(self, text: str) -> List[Tuple[str, str]]:
+
+        """استخراج الإيميل والباسورد مع الحفاظ على الرموز الخاصة"""
+
+        try:
+
+            return credential_extractor.extract(text)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في استخراج البيانات: {e}")
+
+            return []
+
+    @metrics.timed("parse")
+
+    async def extract_credentials_async(self, text: str) -> List[Tuple[str, str]]:
+
+        """استخراج من النصوص الكبيرة بتقسيمها لأجزاء على حدود السطور وتحليلها في مجموعة العمليات
+
+        النص الأصغر من PARALLEL_PARSE_MIN_CHARS بيتحلل inline زي extract_credentials"""
+
+        if len(text) < PARALLEL_PARSE_MIN_CHARS:
+
+            return self.extract_credentials(text)
+
+        try:
+
+            lines = text.strip().split('\n')
+
+            chunk_lines = max(PARALLEL_PARSE_CHUNK_LINES, math.ceil(len(lines) / PARSE_WORKERS))
+
+            lookahead = CredentialExtractor.LOOKAHEAD_LINES
+
+            loop = asyncio.get_running_loop()
+
+            pool = get_parse_pool()
+
+            # كل جزء معاه السطور التالية ليه عشان الباسورد اللي في السطر اللي بعد الإيميل
+
+            chunks = await asyncio.gather(*(
+
+                loop.run_in_executor(pool, extract_chunk, lines[start:start + chunk_lines + lookahead],
+
+                                     min(chunk_lines, len(lines) - start))
+
+                for start in range(0, len(lines), chunk_lines)
+
+            ))
+
+            # الدمج بالترتيب مع إزالة التكرار
+
+            credentials = list(dict.fromkeys(pair for chunk in chunks for pair in chunk))
+
+            if not credentials:
+
+                credentials = await loop.run_in_executor(pool, credential_extractor.extract_blocks, text)
+
+            return credentials
+
+        except Exception as e:
+
+            logger.error(f"خطأ في استخراج البيانات: {e}")
+
+            return []
+
+
+
+    def _is_valid_password(self, password: str) -> bool:
+
+        """التحقق من صحة الباسورد مع السماح بكافة الرموز"""
+
+        return credential_extractor.is_valid_password(password)
+
+
+
+
+
+    def is_likely_password(self, text: str) -> bool:
+
+        """تحديد إذا كان النص باسورد"""
+
+        if not text or not isinstance(text, str):
+
+            return False
+
+
+
+        text = text.strip()
+
+
+
+        if len(text) < 3 or len(text) > 50:
+
+            return False
+
+
+
+        # استبعاد الإيميلات
+
+        if '@' in text and self.is_valid_email(text):
+
+            return False
+
+
+
+        # استبعاد الكلمات الشائعة
+
+        excluded = {
+
+            'email', 'password', 'pass', 'user', 'gmail', 'yahoo', 'hotmail',
+
+            'start', 'help', 'info', 'add', 'delete', 'اضافة', 'حذف', 'ايميل'
+
+        }
+
+
+
+        if text.lower() in excluded:
+
+            return False
+
+
+
+        if text.count(' ') > 2:
+
+            return False
+
+
+
+        if not re.search(r'[a-zA-Z0-9]', text):
+
+            return False
+
+
+
+        return True
+
+
+
+    def detect_input_type(self, text: str) -> str:
+
+        """تحديد نوع المدخل"""
+
+        if not text:
+
+            return "unknown"
+
+
+
+        text = text.strip()
+
+
+
+        if self.is_valid_email(text):
+
+            return "email"
+
+
+
+        if self.is_likely_password(text):
+
+            return "password"
+
+
+
+        if '@' in text and (' ' in text or ':' in text or '|' in text):
+
+            return "mixed"
+
+
+
+        return "unknown"
+
+
+
+    def get_fixed_password(self) -> str:
+
+        """الحصول على الباسورد الثابت"""
+
+        try:
+
+            if "settings" not in self.db:
+
+                self.db["settings"] = {
+
+                    "pending_hours": DEFAULT_PENDING_HOURS,
+
+                    "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+
+                    "fixed_password": DEFAULT_FIXED_PASSWORD
+
+                }
+
+                self._journal("settings", data=self.db["settings"])
+
+            fixed_password = self.db["settings"].get("fixed_password", DEFAULT_FIXED_PASSWORD)
+
+            if not fixed_password:
+
+                fixed_password = DEFAULT_FIXED_PASSWORD
+
+                self.db["settings"]["fixed_password"] = fixed_password
+
+                self._journal("settings", data=self.db["settings"])
+
+
+
+            return fixed_password
+
+
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الحصول على الباسورد الثابت: {e}")
+
+            return DEFAULT_FIXED_PASSWORD
+
+
+
+    def update_fixed_password(self, new_password: str) -> Tuple[bool, str]:
+
+        """تحديث الباسورد الثابت"""
+
+        try:
+
+            new_password = new_password.strip()
+
+
+
+            if not new_password or len(new_password) < 3:
+
+                return False, "الباسورد يجب أن يكون على الأقل 3 أحرف"
+
+
+
+            old_password = self.get_fixed_password()
+
+            self.db["settings"]["fixed_password"] = new_password
+
+            self._journal("settings", data=self.db["settings"])
+
+            self.add_log("تعديل باسورد ثابت", f"من {old_password} إلى {new_password}")
+
+            self.save_database()
+
+            return True, f"تم تحديث الباسورد الثابت من {old_password} إلى {new_password}"
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تحديث الباسورد الثابت: {e}")
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    @staticmethod
+
+    def _check_version(email: str, current: Optional[Account], expected_version: Optional[int]):
+
+        """compare-and-set: VersionConflict لو نسخة الحساب الحالية (0 = مش موجود) مش expected_version - None من غير فحص"""
+
+        if expected_version is not None and (current.version if current is not None else 0) != expected_version:
+
+            raise VersionConflict(email, expected_version, current)
+
+
+
+    @synchronized
+
+    def add_account(self, email: str, password: str, expected_version: Optional[int] = None) -> Tuple[bool, str]:
+
+        """إضافة حساب جديد مع معالجة محسنة
+
+        expected_version: النسخة اللي الأدمن شافها (0 = كان مش موجود) - VersionConflict لو اتغير من ساعتها"""
+
+        previous = {}
+
+        try:
+
+            email = email.lower().strip()
+
+            password = password.strip()
+
+            if not email or not password:
+
+                return False, "الإيميل أو الباسورد فارغ"
+
+            if not self.is_valid_email(email):
+
+                return False, "صيغة الإيميل غير صحيحة"
+
+            self._check_version(email, self.db["accounts"].get(email), expected_version)
+
+            previous[email] = self.db["accounts"].get(email)
+
+            now = datetime.now()
+
+            # التحقق من وجود الحساب
+
+            if email in self.db["accounts"]:
+
+                old_password = self.db["accounts"][email].password
+
+                if old_password != password:
+
+                    self.db["accounts"][email] = self.db["accounts"][email].evolve(password=password)
+
+                    self._availability.push(email, self.db["accounts"][email])
+
+                    self._columns.upsert(email, self.db["accounts"][email])
+
+                    self._journal("account", email=email, data=self.db["accounts"][email])
+
+                    self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+
+                    self.save_database()
+
+                    return True, f"تم تعديل الباسورد من {old_password} إلى {password}"
+
+                else:
+
+                    return False, "الحساب موجود بالفعل بنفس الباسورد"
+
+
+
+            # إضافة الحساب الجديد
+
+            self.db["accounts"][email] = Account(
+
+                password,
+
+                now.timestamp(),
+
+                (now + timedelta(hours=self.db["settings"]["pending_hours"])).timestamp()
+
+            )
+
+            self._availability.push(email, self.db["accounts"][email])
+
+            self._columns.upsert(email, self.db["accounts"][email])
+
+            self._journal("account", email=email, data=self.db["accounts"][email])
+
+            self.add_log("إضافة حساب", f"تم إضافة {email}")
+
+            self.save_database()
+
+            return True, "تم الإضافة بنجاح"
+
+        except VersionConflict:
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إضافة الحساب: {e}")
+
+            self._restore_accounts(previous)
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    @synchronized
+
+    def add_accounts_bulk(self, credentials: List[Tuple[str, str]]) -> List[Tuple[str, bool, str]]:
+
+        """إضافة دفعة حسابات: الدمج في نسخة جانبية ثم تطبيقها كلها مع سجل journal واحد وسجل نشاط واحد
+
+        لو التسجيل فشل الدفعة كلها بترجع من الذاكرة والفهارس"""
+
+        results, changed, previous = [], {}, {}
+
+        try:
+
+            results, changed = self._merge_bulk(credentials, self.db["accounts"])
+
+            if not changed:
+
+                return results
+
+            accounts = self.db["accounts"]
+
+            previous = {email: accounts.get(email) for email in changed}
+
+            accounts.update(changed)
+
+            for email, data in changed.items():
+
+                self._availability.push(email, data)
+
+                self._columns.upsert(email, data)
+
+            self._journal("accounts", data=changed)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الإضافة الجماعية: {e}")
+
+            self._restore_accounts(previous)
+
+            return self._failed_results(results, e)
+
+        self._log_bulk_summary(results)
+
+        self.save_database()
+
+        return results
+
+
+
+    def _restore_accounts(self, previous: dict):
+
+        """إرجاع حسابات في الذاكرة والفهارس لنسختها قبل تعديل فشل تسجيله في الـ journal (None = مكانش موجود)"""
+
+        accounts = self.db["accounts"]
+
+        for email, data in previous.items():
+
+            if data is None:
+
+                accounts.pop(email, None)
+
+                self._availability.remove(email)
+
+                self._columns.remove(email)
+
+            else:
+
+                accounts[email] = data
+
+                self._availability.push(email, data)
+
+                self._columns.upsert(email, data)
+
+
+
+    @staticmethod
+
+    def _failed_results(results: List[Tuple[str, bool, str]], error: Exception) -> List[Tuple[str, bool, str]]:
+
+        """نتايج دفعة الكتابة بتاعتها فشلت: كل اللي كان ناجح بيتسجل فاشل بالخطأ"""
+
+        return [(email, False, f"خطأ: {error}") if success else (email, success, message)
+
+                for email, success, message in results]
+
+
+
+    def _merge_bulk(self, credentials: List[Tuple[str, str]], accounts: dict) -> Tuple[List[Tuple[str, bool, str]], dict]:
+
+        """دمج دفعة حسابات بنفس قواعد add_account (بالترتيب، التكرار بيتعامل كتعديل أو رفض)
+
+        accounts مبيتعدلش - الحسابات الجديدة والمعدلة بترجع في changed والمستدعي بيطبقها"""
+
+        results = []
+
+        changed = {}
+
+        now = datetime.now()
+
+        added_at = now.timestamp()
+
+        available_at = (now + timedelta(hours=self.db["settings"]["pending_hours"])).timestamp()
+
+        for email, password in credentials:
+
+            email = email.lower().strip()
+
+            password = password.strip()
+
+            if not email or not password:
+
+                results.append((email, False, "الإيميل أو الباسورد فارغ"))
+
+                continue
+
+            if not self.is_valid_email(email):
+
+                results.append((email, False, "صيغة الإيميل غير صحيحة"))
+
+                continue
+
+
+
+            existing = changed.get(email) or accounts.get(email)
+
+            if existing:
+
+                old_password = existing.password
+
+                if old_password == password:
+
+                    results.append((email, False, "الحساب موجود بالفعل بنفس الباسورد"))
+
+                    continue
+
+                changed[email] = existing.evolve(password=password)
+
+                results.append((email, True, f"تم تعديل الباسورد من {old_password} إلى {password}"))
+
+            else:
+
+                changed[email] = Account(password, added_at, available_at)
+
+                results.append((email, True, "تم الإضافة بنجاح"))
+
+        return results, changed
+
+
+
+    def _log_bulk_summary(self, results: List[Tuple[str, bool, str]]):
+
+        """سجل واحد يلخص الدفعة كلها"""
+
+        updated = sum(1 for _, success, message in results if success and "تعديل" in message)
+
+        added = sum(1 for _, success, _ in results if success) - updated
+
+        failed = len(results) - added - updated
+
+        self.add_log("إضافة حسابات", f"إضافة {added} وتعديل {updated} وفشل {failed} من دفعة {len(results)} حساب")
+
+
+
+    def add_account_with_fixed_password(self, email: str) -> Tuple[bool, str]:
+
+        """إضافة حساب بالباسورد الثابت"""
+
+        try:
+
+            email = email.lower().strip()
+
+
+
+            if not self.is_valid_email(email):
+
+                return False, "صيغة الإيميل غير صحيحة"
+
+
+
+            fixed_password = self.get_fixed_password()
+
+            success, message = self.add_account(email, fixed_password)
+
+
+
+            if success:
+
+                if "تعديل" in message:
+
+                    return True, f"تم تعديل الحساب ليستخدم الباسورد الثابت"
+
+                else:
+
+                    return True, f"تم إضافة الحساب بالباسورد الثابت بنجاح"
+
+            else:
+
+                return success, message
+
+
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إضافة حساب بالباسورد الثابت: {e}")
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    @synchronized
+
+    def update_password(self, email: str, new_password: str, expected_version: Optional[int] = None) -> Tuple[bool, str]:
+
+        """تعديل باسورد حساب موجود - compare-and-set لو expected_version اتبعت (VersionConflict لو الحساب اتغير)"""
+
+        previous = {}
+
+        try:
+
+            email = email.lower().strip()
+
+            new_password = new_password.strip()
+
+            self._check_version(email, self.db["accounts"].get(email), expected_version)
+
+            if email not in self.db["accounts"]:
+
+                return False, "الحساب غير موجود"
+
+            previous[email] = self.db["accounts"][email]
+
+            old_password = self.db["accounts"][email].password
+
+            self.db["accounts"][email] = self.db["accounts"][email].evolve(password=new_password)
+
+            self._availability.push(email, self.db["accounts"][email])
+
+            self._columns.upsert(email, self.db["accounts"][email])
+
+            self._journal("account", email=email, data=self.db["accounts"][email])
+
+            self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+
+            self.save_database()
+
+            return True, f"تم تعديل الباسورد من {old_password} إلى {new_password}"
+
+        except VersionConflict:
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تعديل الباسورد: {e}")
+
+            self._restore_accounts(previous)
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    @synchronized
+
+    def get_available_account(self) -> Optional[Tuple[str, str]]:
+
+        """الحصول على حساب متاح مع تحديث الإحصائيات
+
+        لو تسجيل الحساب في الـ journal فشل الحساب والعدادات بيرجعوا في الذاكرة زي ما هم على القرص"""
+
+        stats = dict(self.db["stats"])
+
+        previous = {}
+
+        try:
+
+            self.db["stats"]["total_requests"] += 1
+
+            now = datetime.now()
+
+            # الفهرس بيرجع أفضل حساب متاح (الأولوية ثم الأقدم ثم الأقل استخداماً)
+
+            email = self._availability.pop_ready(now.timestamp(), self.db["accounts"])
+
+            if email is None:
+
+                self._journal("stats", data=self.db["stats"])
+
+                return None
+
+            # تحديث حالة الحساب (سجل جديد بدل تعديل القديم)
+
+            data = previous[email] = self.db["accounts"][email]
+
+            data = data.evolve(
+
+                status=AccountStatus.USED,
+
+                last_used=now.timestamp(),
+
+                use_count=data.use_count + 1,
+
+                available_at=(now + timedelta(hours=self.db["settings"]["cooldown_hours"])).timestamp()
+
+            )
+
+            self.db["accounts"][email] = data
+
+            self._availability.push(email, data)
+
+            self._columns.upsert(email, data)
+
+            self.db["stats"]["successful_requests"] += 1
+
+            self._journal("account", email=email, data=data)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الحصول على حساب: {e}")
+
+            self._restore_accounts(previous)
+
+            self.db["stats"].update(stats)
+
+            return None
+
+        self._journal_stats()
+
+        self.add_log("استخدام حساب", f"تم استخدام {email}")
+
+        self.save_database()
+
+        return email, data.password
+
+
+
+    def _journal_stats(self):
+
+        """تسجيل العدادات بعد عملية اتسجلت بالفعل - فشلها بيتسجل في اللوج بس (العدادات مش بتغير حالة أي حساب)"""
+
+        try:
+
+            self._journal("stats", data=self.db["stats"])
+
+        except Exception:
+
+            # _journal سجل الخطأ
+
+            pass
+
+
+
+    @synchronized
+
+    def return_account(self, email: str) -> bool:
+
+        """إرجاع حساب اتسحب ومتسلمش (سحبه متثبتش على القرص) للمتاح فوراً"""
+
+        previous = {}
+
+        try:
+
+            data = self.db["accounts"].get(email)
+
+            if data is None or data.status != AccountStatus.USED:
+
+                return False
+
+            previous[email] = data
+
+            data = data.evolve(status=AccountStatus.AVAILABLE, available_at=datetime.now().timestamp(),
+
+                               use_count=max(0, data.use_count - 1))
+
+            self.db["accounts"][email] = data
+
+            self._availability.push(email, data)
+
+            self._columns.upsert(email, data)
+
+            self._journal("account", email=email, data=data)
+
+            self.add_log("إرجاع حساب", f"تم إرجاع {email} (السحب متثبتش على القرص)")
+
+            return True
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إرجاع الحساب: {e}")
+
+            self._restore_accounts(previous)
+
+            return False
+
+
+
+    def get_statistics(self) -> dict:
+
+        """الحصول على إحصائيات شاملة - O(1) من العدادات بدون فحص أو حفظ"""
+
+        try:
+
+            now = datetime.now()
+
+
+
+            with self._lock:
+
+                # ترقية الحسابات اللي وقتها جه فقط (بدون المرور على الباقي)
+
+                self._availability.promote(now.timestamp(), self.db["accounts"])
+
+                counts = self._availability.counts
+
+                next_entry = self._availability.peek_waiting()
+
+
+
+                stats = {
+
+                    "total": len(self.db["accounts"]),
+
+                    "available": counts["available"],
+
+                    "pending": counts["pending"],
+
+                    "cooldown": counts["cooldown"],
+
+                    "next_available": None,
+
+                    "next_available_email": None,
+
+                    "total_requests": self.db["stats"].get("total_requests", 0),
+
+                    "successful_requests": self.db["stats"].get("successful_requests", 0),
+
+                    "success_rate": 0
+
+                }
+
+
+
+            # أقرب حساب سيصبح متاح
+
+            if next_entry:
+
+                next_available_ts, next_email = next_entry
+
+                seconds_left = max(0, next_available_ts - now.timestamp())
+
+                hours = int(seconds_left // 3600)
+
+                minutes = int((seconds_left % 3600) // 60)
+
+                stats["next_available"] = f"{hours} ساعة و {minutes} دقيقة"
+
+                stats["next_available_email"] = next_email
+
+
+
+            # حساب معدل النجاح
+
+            if stats["total_requests"] > 0:
+
+                stats["success_rate"] = (stats["successful_requests"] / stats["total_requests"]) * 100
+
+
+
+            return stats
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الإحصائيات: {e}")
+
+            return {"total": 0, "available": 0, "pending": 0, "cooldown": 0}
+
+
+
+
+
+    @synchronized
+
+    def checkout(self, count: int, lease_seconds: int = LEASE_SECONDS) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+
+        """حجز عدد حسابات في مرور واحد وكتابة واحدة - لو الاستلام متأكدش قبل ما الـ lease يخلص بترجع للمتاح"""
+
+        stats = dict(self.db["stats"])
+
+        previous = {}
+
+        try:
+
+            now = datetime.now()
+
+            lease_id = uuid.uuid4().hex[:12]
+
+            expires_at = (now + timedelta(seconds=lease_seconds)).timestamp()
+
+            accounts = self.db["accounts"]
+
+            leased = {}
+
+            while len(leased) < count:
+
+                email = self._availability.pop_ready(now.timestamp(), accounts)
+
+                if email is None:
+
+                    break
+
+                previous[email] = accounts[email]
+
+                # الحساب المحجوز بيستنى في الفهرس لحد نهاية الـ lease زي أي حساب في الانتظار
+
+                data = accounts[email].evolve(status=AccountStatus.LEASED, lease_id=lease_id, available_at=expires_at)
+
+                accounts[email] = data
+
+                self._availability.push(email, data)
+
+                self._columns.upsert(email, data)
+
+                leased[email] = data
+
+            self.db["stats"]["total_requests"] += count
+
+            self.db["stats"]["successful_requests"] += len(leased)
+
+            if not leased:
+
+                self._journal("stats", data=self.db["stats"])
+
+                return None, []
+
+            self._journal("accounts", data=leased)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في حجز الحسابات: {e}")
+
+            # الحجز متسجلش فالحسابات بترجع متاحة في الذاكرة زي القرص
+
+            self._restore_accounts(previous)
+
+            self.db["stats"].update(stats)
+
+            return None, []
+
+        self._leases[lease_id] = list(leased)
+
+        self._journal_stats()
+
+        self.add_log("حجز حسابات", f"تم حجز {len(leased)} حساب (lease {lease_id})")
+
+        return lease_id, [(email, data.password) for email, data in leased.items()]
+
+
+
+    @synchronized
+
+    def confirm_lease(self, lease_id: str) -> int:
+
+        """تأكيد استلام دفعة محجوزة: الحسابات بتتسجل كمستخدمة ويبدأ الـ cooldown"""
+
+        lease = []
+
+        try:
+
+            now = datetime.now()
+
+            cooldown_until = (now + timedelta(hours=self.db["settings"]["cooldown_hours"])).timestamp()
+
+            lease = self._open_lease(lease_id, now)
+
+            confirmed = {}
+
+            for email, data in lease:
+
+                data = data.evolve(status=AccountStatus.USED, last_used=now.timestamp(), use_count=data.use_count + 1,
+
+                                   available_at=cooldown_until, lease_id=None)
+
+                self.db["accounts"][email] = data
+
+                self._availability.push(email, data)
+
+                self._columns.upsert(email, data)
+
+                confirmed[email] = data
+
+            if confirmed:
+
+                self._journal("accounts", data=confirmed)
+
+                self.add_log("استخدام حساب", f"تم استخدام {len(confirmed)} حساب من الدفعة {lease_id}")
+
+            return len(confirmed)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تأكيد الحجز: {e}")
+
+            self._reopen_lease(lease_id, lease)
+
+            return 0
+
+
+
+    @synchronized
+
+    def release_lease(self, lease_id: str) -> int:
+
+        """إرجاع دفعة محجوزة للمتاح فوراً"""
+
+        lease = []
+
+        try:
+
+            now = datetime.now()
+
+            lease = self._open_lease(lease_id, now)
+
+            released = {}
+
+            for email, data in lease:
+
+                data = data.evolve(status=AccountStatus.AVAILABLE, available_at=now.timestamp(), lease_id=None)
+
+                self.db["accounts"][email] = data
+
+                self._availability.push(email, data)
+
+                self._columns.upsert(email, data)
+
+                released[email] = data
+
+            if released:
+
+                self._journal("accounts", data=released)
+
+                self.add_log("إرجاع حسابات", f"تم إرجاع {len(released)} حساب من الدفعة {lease_id}")
+
+            return len(released)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إرجاع الحجز: {e}")
+
+            self._reopen_lease(lease_id, lease)
+
+            return 0
+
+
+
+    def _open_lease(self, lease_id: str, now: datetime) -> List[Tuple[str, Account]]:
+
+        """حسابات الـ lease اللي لسه محجوزة (اللي انتهى وقته أو اتحذف بيتشال)"""
+
+        accounts = self.db["accounts"]
+
+        now_ts = now.timestamp()
+
+        still_leased = []
+
+        for email in self._leases.pop(lease_id, []):
+
+            data = accounts.get(email)
+
+            if (data and data.status == AccountStatus.LEASED and data.lease_id == lease_id
+
+                    and data.available_at > now_ts):
+
+                still_leased.append((email, data))
+
+        return still_leased
+
+
+
+    def _reopen_lease(self, lease_id: str, lease: List[Tuple[str, Account]]):
+
+        """الـ lease بيرجع محجوز زي ما كان لو تأكيده أو إرجاعه متسجلش في الـ journal"""
+
+        if lease:
+
+            self._restore_accounts(dict(lease))
+
+            self._leases[lease_id] = [email for email, _ in lease]
+
+
+
+    @synchronized
+
+    def promote_due(self) -> List[str]:
+
+        """تفعيل كل الحسابات اللي وقتها جه وتسجيلها في الـ journal كسجل واحد"""
+
+        try:
+
+            accounts = self.db["accounts"]
+
+            self._availability.promote(datetime.now().timestamp(), accounts)
+
+            # اللي اتفعّل من أي مسار قراءة من آخر مرة، ما عدا اللي اتحذف أو اتسحب بعدها
+
+            changed = {
+
+                email: accounts[email]
+
+                for email in self._availability.drain_promoted()
+
+                if email in accounts and accounts[email].status == AccountStatus.AVAILABLE
+
+            }
+
+            if not changed:
+
+                return []
+
+            for email, data in changed.items():
+
+                self._columns.upsert(email, data)
+
+            self._journal("accounts", data=changed)
+
+            return list(changed)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تفعيل الحسابات: {e}")
+
+            return []
+
+
+
+    def seconds_until_next_promotion(self) -> Optional[float]:
+
+        """الثواني الباقية لأقرب حساب في الانتظار (None لو مفيش)"""
+
+        with self._lock:
+
+            next_entry = self._availability.peek_waiting()
+
+        if next_entry is None:
+
+            return None
+
+        return max(0.0, next_entry[0] - datetime.now().timestamp())
+
+
+
+    def publish_snapshot(self) -> AccountsSnapshot:
+
+        """نشر نسخة قراءة جديدة لو فيه تعديلات من آخر نشر (نسخ سطحي لأن السجلات بتتستبدل ومبتتعدلش)
+
+        النسخ O(عدد الحسابات) بيتم بره القفل زي seqlock: رقم التعديل بيتاخد تحت القفل، والحسابات والأعمدة
+
+        بتتنسخ من غير قفل، وبعدين الرقم بيتقارن تحت القفل تاني - لو اتغير النسخ بيتعاد، وبعد
+
+        SNAPSHOT_COPY_RETRIES محاولات بيتنسخ تحت القفل عشان الكتابة المستمرة متجوعش النشر.
+
+        القفل بيتمسك بس للمقارنة والعدادات، فالكتابة مبتستناش النسخ"""
+
+        for attempt in range(SNAPSHOT_COPY_RETRIES + 1):
+
+            with self._lock:
+
+                now_ts = datetime.now().timestamp()
+
+                promoted = self._availability.promote(now_ts, self.db["accounts"])
+
+                current = self._snapshot
+
+                expired = current is not None and current.expires_at is not None and current.expires_at <= now_ts
+
+                if current is not None and current.version == self._version and not promoted and not expired:
+
+                    return current
+
+                version = self._version
+
+                accounts, columns = self.db["accounts"], self._columns
+
+                if attempt == SNAPSHOT_COPY_RETRIES:
+
+                    return self._store_snapshot(version, dict(accounts), columns.copy())
+
+            try:
+
+                # كل نسخة منهم عملية C واحدة تحت الـ GIL، والتطابق بينهم بيتأكد بالمقارنة تحت
+
+                accounts_copy = dict(accounts)
+
+                columns_copy = columns.copy()
+
+            except (RuntimeError, TypeError):
+
+                # الأعمدة بتتبني من جديد وقت النسخ (_time_index لسه None) - التعديل هيغير الرقم
+
+                continue
+
+            with self._lock:
+
+                if self._version == version and self.db["accounts"] is accounts and self._columns is columns:
+
+                    return self._store_snapshot(version, accounts_copy, columns_copy)
+
+
+
+    def _store_snapshot(self, version: int, accounts: dict, columns: AccountColumns) -> AccountsSnapshot:
+
+        """تحت القفل: تجميع النسخة من الحسابات والأعمدة المنسوخة والعدادات الحالية (صغيرة) ونشرها"""
+
+        snapshot = AccountsSnapshot(
+
+            version,
+
+            MappingProxyType(accounts),
+
+            dict(self._availability.counts, total=len(accounts)),
+
+            self._availability.peek_waiting(),
+
+            self.db["stats"],
+
+            columns
+
+        )
+
+        # نشر متزامن من خيطين ممكن يخلص بالعكس - النسخة الأحدث متتستبدلش بأقدم منها
+
+        if self._snapshot is None or self._snapshot.version <= version:
+
+            self._snapshot = snapshot
+
+        return snapshot
+
+
+
+    def snapshot(self, fresh: bool = False) -> AccountsSnapshot:
+
+        """آخر نسخة منشورة - قراءة بدون قفل إلا لو النسخة قديمة أو طالبين آخر تعديل"""
+
+        current = self._snapshot
+
+        if fresh or current is None or (current.expires_at is not None and current.expires_at <= datetime.now().timestamp()):
+
+            current = self.publish_snapshot()
+
+        return current
+
+
+
+    @synchronized
+
+    def update_setting(self, key: str, value):
+
+        """تعديل إعداد وتسجيله في الـ journal"""
+
+        self.db["settings"][key] = value
+
+        self._journal("settings", data=self.db["settings"])
+
+
+
+    @synchronized
+
+    def record_restart(self):
+
+        """تحديث إحصائية آخر تشغيل (فشل الكتابة بيتسجل بس - إحصائية مش لازم توقف /start)"""
+
+        self.db["stats"]["last_restart"] = datetime.now().isoformat()
+
+        try:
+
+            self._journal("stats", data=self.db["stats"])
+
+        except Exception:
+
+            return
+
+        self.save_database()
+
+
+
+    @synchronized
+
+    def reset_database(self):
+
+        """مسح كل البيانات والرجوع للقاعدة الافتراضية"""
+
+        self.db = self._default_db()
+
+        self._rebuild_indexes()
+
+        self.activity.clear()
+
+        self._journal("reset", db=self.db)
+
+        self.save_database()
+
+        self.compact_database()
+
+
+
+    @synchronized
+
+    def delete_account(self, email: str, expected_version: Optional[int] = None) -> bool:
+
+        """حذف حساب - compare-and-set لو expected_version اتبعت (VersionConflict لو الحساب اتغير)"""
+
+        previous = {}
+
+        try:
+
+            email = email.lower().strip()
+
+            self._check_version(email, self.db["accounts"].get(email), expected_version)
+
+            if email in self.db["accounts"]:
+
+                previous[email] = self.db["accounts"].pop(email)
+
+                self._availability.remove(email)
+
+                self._columns.remove(email)
+
+                self._journal("delete", email=email)
+
+                self.add_log("حذف حساب", f"تم حذف {email}")
+
+                self.save_database()
+
+                return True
+
+            return False
+
+        except VersionConflict:
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f"خطأ في حذف الحساب: {e}")
+
+            self._restore_accounts(previous)
+
+            return False
+
+
+
+    def get_account_info(self, email: str) -> Optional[dict]:
+
+        """الحصول على معلومات حساب معين"""
+
+        try:
+
+            email = email.lower().strip()
+
+            if email not in self.db["accounts"]:
+
+                return None
+
+
+
+            return self._format_account_info(email, self.db["accounts"][email])
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الحصول على معلومات الحساب: {e}")
+
+            return None
+
+
+
+    def _format_account_info(self, email: str, account_data: Account) -> dict:
+
+        """تجهيز بيانات الحساب للعرض مع حساب الوقت المتبقي (بدون أي كتابة)"""
+
+        seconds_left = account_data.available_at - datetime.now().timestamp()
+
+        if seconds_left > 0:
+
+            hours = int(seconds_left // 3600)
+
+            minutes = int((seconds_left % 3600) // 60)
+
+            time_str = f"{hours}س {minutes}د"
+
+            current_status = account_data.status.label
+
+        else:
+
+            time_str = "متاح الآن"
+
+            current_status = "available"
+
+        return {
+
+            "email": email,
+
+            "password": account_data.password,
+
+            "status": current_status,
+
+            "time_left": time_str,
+
+            "use_count": account_data.use_count,
+
+            "added_at": Account.format_time(account_data.added_at),
+
+            "priority": account_data.priority,
+
+            "version": account_data.version
+
+        }
+
+
+
+    def count_accounts(self) -> int:
+
+        """عدد الحسابات الكلي"""
+
+        return len(self.db["accounts"])
+
+
+
+    def count_accounts_with_password(self, password: str) -> int:
+
+        """عدد الحسابات اللي بتستخدم باسورد معين"""
+
+        with self._lock:
+
+            return self._columns.count_password(password)
+
+
+
+    def emails_with_password(self, password: str) -> List[str]:
+
+        """إيميلات الحسابات اللي بتستخدم باسورد معين"""
+
+        with self._lock:
+
+            return self._columns.emails_with_password(password)
+
+
+
+    def browse_accounts(self, tab: str, after: Optional[tuple] = None,
+
+                        limit: int = ACCOUNTS_PAGE_SIZE) -> Tuple[List[dict], Optional[tuple], dict]:
+
+        """صفحة من حسابات تبويب (available / pending / cooldown) بعد المؤشر after من آخر نسخة قراءة
+
+        بترجع (الحسابات، مؤشر الصفحة الجاية أو None، عدد كل تبويب)
+
+        النسخة المنشورة ممكن تكون متأخرة عن آخر تعديل لحد ما الـ flusher يثبته (حوالي FLUSH_INTERVAL_MS)
+
+        أو لحد ما أقرب حساب في الانتظار يتفعّل - snapshot(fresh=True) لو محتاج آخر حالة"""
+
+        columns = self.snapshot().columns
+
+        now_ts = datetime.now().timestamp()
+
+        rows, next_cursor = columns.page(tab, now_ts, after, limit)
+
+        return [columns.entry(row, now_ts) for row in rows], next_cursor, columns.tab_counts(now_ts)
+
+
+
+    def count_available_by(self, at: datetime) -> int:
+
+        """عدد الحسابات اللي هتكون متاحة عند الوقت at من آخر نسخة قراءة (نفس تأخير browse_accounts)"""
+
+        return self.snapshot().columns.available_by(at.timestamp())
+
+
+
+    def forecast(self, hours: int = FORECAST_HOURS) -> dict:
+
+        """توقع الإتاحة للساعات الجاية: المتاح عند كل مدة في FORECAST_HORIZONS وhistogram بالساعة
+
+        كل ساعة فيها عدد الحسابات اللي بتتاح خلالها والمتاح التراكمي في آخرها
+
+        من آخر نسخة قراءة منشورة (نفس تأخير browse_accounts - التعديلات اللي لسه متثبتتش مش محسوبة)"""
+
+        now = datetime.now()
+
+        counts = self._forecast_counts(now, hours)
+
+        hourly = []
+
+        for hour in range(hours):
+
+            hourly.append({
+
+                "start": (now + timedelta(hours=hour)).isoformat(timespec="minutes"),
+
+                "becoming_available": counts[hour + 1] - counts[hour],
+
+                "available": counts[hour + 1]
+
+            })
+
+        return {
+
+            "generated_at": now.isoformat(timespec="seconds"),
+
+            "available_now": counts[0],
+
+            "horizons": {str(horizon): counts[horizon] for horizon in FORECAST_HORIZONS if horizon <= hours},
+
+            "hourly": hourly
+
+        }
+
+
+
+    def _forecast_counts(self, now: datetime, hours: int) -> List[int]:
+
+        """المتاح عند now وعند كل ساعة بعدها لحد hours (hours + 1 رقم) - bisect على الفهرس المترتب لكل حد"""
+
+        columns = self.snapshot().columns
+
+        now_ts = now.timestamp()
+
+        return [columns.available_by(now_ts + hour * 3600) for hour in range(hours + 1)]
+
+
+
+    def iter_accounts(self) -> List[Tuple[str, Account]]:
+
+        """المرور على كل الحسابات (email, Account)"""
+
+        return list(self.db["accounts"].items())
+
+
+
+class SQLiteAccountManager(AccountManager):
+
+    """مدير حسابات بتخزين SQLite - الحسابات مش بتتحمل كلها في الذاكرة"""
+
+    database_file = SQLITE_FILE
+
+    backup_suffix = ".db"
+
+    # أعمدة الحساب بترتيب _account_row في كل INSERT - أي عمود ناقص بيتمسح في INSERT OR REPLACE (زي lease_id)
+
+    ACCOUNT_COLUMNS = (
+
+        "(email, password, added_at, available_at, status, last_used, use_count, priority, version, lease_id) "
+
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    )
+
+
+
+    def __init__(self):
+
+        self._conn = sqlite3.connect(SQLITE_FILE, check_same_thread=False)
+
+        self._conn.row_factory = sqlite3.Row
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        super().__init__()
+
+
+
+    def _init_schema(self):
+
+        """إنشاء الجداول والفهارس"""
+
+        with self._conn:
+
+            self._conn.executescript("""
+
+                CREATE TABLE IF NOT EXISTS accounts (
+
+                    email TEXT PRIMARY KEY,
+
+                    password TEXT NOT NULL,
+
+                    added_at TEXT NOT NULL,
+
+                    available_at TEXT NOT NULL,
+
+                    status TEXT NOT NULL,
+
+                    last_used TEXT,
+
+                    use_count INTEGER NOT NULL DEFAULT 0,
+
+                    priority INTEGER NOT NULL DEFAULT 1
+
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_accounts_status_available
+
+                    ON accounts (status, available_at, priority);
+
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_email ON accounts (email);
+
+                CREATE INDEX IF NOT EXISTS idx_accounts_available_at ON accounts (available_at);
+
+                CREATE INDEX IF NOT EXISTS idx_accounts_browse ON accounts (available_at, email);
+
+                CREATE INDEX IF NOT EXISTS idx_accounts_password ON accounts (password);
+
+                CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+                CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+                CREATE TABLE IF NOT EXISTS logs (
+
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+                    timestamp TEXT NOT NULL,
+
+                    action TEXT NOT NULL,
+
+                    details TEXT
+
+                );
+
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+            """)
+
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(accounts)")}
+
+            if "lease_id" not in columns:
+
+                self._conn.execute("ALTER TABLE accounts ADD COLUMN lease_id TEXT")
+
+            if "version" not in columns:
+
+                self._conn.execute("ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+
+    def load_database(self):
+
+        """تحميل الإعدادات والإحصائيات فقط - الحسابات بتفضل في SQLite"""
+
+        try:
+
+            self._init_schema()
+
+            migrated = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+
+            if not migrated and os.path.exists(DB_FILE):
+
+                self.migrate_from_json()
+
+
+
+            self.db = self._default_db()
+
+            del self.db["accounts"]
+
+            for row in self._conn.execute("SELECT key, value FROM settings"):
+
+                self.db["settings"][row["key"]] = json.loads(row["value"])
+
+            for row in self._conn.execute("SELECT key, value FROM stats"):
+
+                self.db["stats"][row["key"]] = json.loads(row["value"])
+
+            # جدول logs القديم بيتنقل لسجل الأنشطة مرة واحدة
+
+            rows = self._conn.execute("SELECT timestamp, action, details FROM logs ORDER BY id").fetchall()
+
+            if rows:
+
+                self.db["logs"] = [dict(row) for row in rows]
+
+                self._migrate_legacy_logs()
+
+                with self._conn:
+
+                    self._conn.execute("DELETE FROM logs")
+
+
+
+            logger.info(f"تم تحميل قاعدة بيانات SQLite: {self.count_accounts()} حساب")
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تحميل قاعدة بيانات SQLite: {e}")
+
+            raise
+
+
+
+    def migrate_from_json(self) -> int:
+
+        """ترحيل لمرة واحدة من accounts_db.json (مع الـ journal) إلى SQLite"""
+
+        super().load_database()
+
+        accounts = self.db["accounts"]
+
+        with self._conn:
+
+            self._conn.executemany(
+
+                f"INSERT OR REPLACE INTO accounts {self.ACCOUNT_COLUMNS}",
+
+                (self._account_row(email, data) for email, data in accounts.items())
+
+            )
+
+            self._write_settings()
+
+            self._write_stats()
+
+            self._conn.execute(
+
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+
+                (datetime.now().isoformat(),)
+
+            )
+
+        logger.info(f"تم ترحيل {len(accounts)} حساب من {DB_FILE} إلى SQLite")
+
+        return len(accounts)
+
+
+
+    def _create_default_db(self):
+
+        """إنشاء إعدادات افتراضية"""
+
+        self.db = self._default_db()
+
+        with self._conn:
+
+            self._write_settings()
+
+            self._write_stats()
+
+        logger.info("تم إنشاء قاعدة بيانات جديدة")
+
+
+
+    def _rebuild_indexes(self, columns: Optional[AccountColumns] = None):
+
+        """الفهارس موجودة في SQLite نفسها"""
+
+        pass
+
+
+
+    @staticmethod
+
+    def _account_row(email: str, account: Account) -> tuple:
+
+        # الأعمدة بتخزن شكل JSON نفسه (تواريخ ISO وحالة نصية)
+
+        data = account.to_dict()
+
+        return (
+
+            email,
+
+            data["password"],
+
+            data["added_at"],
+
+            data["available_at"],
+
+            data["status"],
+
+            data["last_used"],
+
+            data["use_count"],
+
+            data["priority"],
+
+            account.version,
+
+            account.lease_id
+
+        )
+
+
+
+    @staticmethod
+
+    def _row_account(row: sqlite3.Row) -> Tuple[str, Account]:
+
+        data = dict(row)
+
+        return data.pop("email"), Account.from_dict(data)
+
+
+
+    def _write_settings(self):
+
+        self._conn.executemany(
+
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+
+            ((key, json.dumps(value, ensure_ascii=False)) for key, value in self.db["settings"].items())
+
+        )
+
+
+
+    def _write_stats(self):
+
+        self._conn.executemany(
+
+            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+
+            ((key, json.dumps(value, ensure_ascii=False)) for key, value in self.db["stats"].items())
+
+        )
+
+
+
+    @metrics.timed("storage")
+
+    def _journal(self, op: str, **fields):
+
+        """تسجيل العملية مباشرة في جداول SQLite - الخطأ بيترفع بعد تسجيله (الـ transaction بيترجع)"""
+
+        try:
+
+            with self._lock, self._conn:
+
+                if op == "settings":
+
+                    self._write_settings()
+
+                elif op == "stats":
+
+                    self._write_stats()
+
+                elif op == "accounts":
+
+                    self._conn.executemany(
+
+                        f"INSERT OR REPLACE INTO accounts {self.ACCOUNT_COLUMNS}",
+
+                        (self._account_row(email, data) for email, data in fields["data"].items())
+
+                    )
+
+                elif op == "reset":
+
+                    self._conn.execute("DELETE FROM accounts")
+
+                    self._conn.execute("DELETE FROM logs")
+
+                    self._conn.execute("DELETE FROM settings")
+
+                    self._conn.execute("DELETE FROM stats")
+
+                    self._write_settings()
+
+                    self._write_stats()
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الكتابة في SQLite: {e}")
+
+            raise
+
+
+
+    @metrics.timed("storage")
+
+    def save_database(self):
+
+        """كل عملية بتتثبت في transaction خاصة بيها"""
+
+        return True
+
+
+
+    def flush_database(self, timeout: Optional[float] = None) -> bool:
+
+        """مفيش طابور كتابة في SQLite - كل عملية اتثبتت بالفعل"""
+
+        return True
+
+
+
+    @metrics.timed("storage")
+
+    def compact_database(self, background: bool = True) -> bool:
+
+        """تثبيت الـ WAL في ملف القاعدة"""
+
+        try:
+
+            with self._lock:
+
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            return True
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تثبيت SQLite: {e}")
+
+            return False
+
+
+
+    def _copy_database_file(self, backup_path: str):
+
+        """نسخة احتياطية متسقة باستخدام SQLite backup API"""
+
+        with self._lock:
+
+            target = sqlite3.connect(backup_path)
+
+            try:
+
+                self._conn.backup(target)
+
+            finally:
+
+                target.close()
+
+    def _backup_sources(self) -> Tuple[bytes, bytes]:
+
+        """نسخة متسقة من ملف SQLite كله كـ snapshot أساسي (مفيش journal منفصل)"""
+
+        fd, path = tempfile.mkstemp(suffix=self.backup_suffix)
+
+        os.close(fd)
+
+        try:
+
+            self._copy_database_file(path)
+
+            with open(path, 'rb') as f:
+
+                return f.read(), b""
+
+        finally:
+
+            os.remove(path)
+
+    def restore_backup(self, at: Optional[datetime] = None) -> Optional[dict]:
+
+        """استرجاع ملف SQLite من نقطة استرجاع جوه الاتصال المفتوح بالـ backup API"""
+
+        point = self.backups.find(at)
+
+        if point is None or point["suffix"] != self.backup_suffix:
+
+            return None
+
+        fd, path = tempfile.mkstemp(suffix=self.backup_suffix)
+
+        try:
+
+            with os.fdopen(fd, 'wb') as f:
+
+                f.write(self.backups.read(point["base"]))
+
+            source = sqlite3.connect(path)
+
+            try:
+
+                with self._lock:
+
+                    source.backup(self._conn)
+
+                    self._version += 1
+
+            finally:
+
+                source.close()
+
+        finally:
+
+            os.remove(path)
+
+        self.load_database()
+
+        self.publish_snapshot()
+
+        self.add_log("استرجاع نسخة احتياطية", point["timestamp"])
+
+        # نقطة جديدة للحالة المسترجعة عشان الاستعادة بعد أي عطل تبدأ منها مش من نقطة أحدث اتلغت
+
+        self.run_backup()
+
+        return point
+
+
+
+    def reset_database(self):
+
+        """مسح كل البيانات والرجوع للقاعدة الافتراضية"""
+
+        self.db = self._default_db()
+
+        del self.db["accounts"]
+
+        self.activity.clear()
+
+        self._journal("reset")
+
+
+
+    def _current_account(self, email: str) -> Optional[Account]:
+
+        """السجل الحالي للحساب (للـ compare-and-set) - لازم يتنادى تحت القفل"""
+
+        row = self._conn.execute("SELECT * FROM accounts WHERE email = ?", (email,)).fetchone()
+
+        return self._row_account(row)[1] if row else None
+
+
+
+    def add_account(self, email: str, password: str, expected_version: Optional[int] = None) -> Tuple[bool, str]:
+
+        """إضافة حساب جديد أو تعديل باسورد حساب موجود"""
+
+        try:
+
+            email = email.lower().strip()
+
+            password = password.strip()
+
+            if not email or not password:
+
+                return False, "الإيميل أو الباسورد فارغ"
+
+            if not self.is_valid_email(email):
+
+                return False, "صيغة الإيميل غير صحيحة"
+
+            now = datetime.now()
+
+            with self._lock:
+
+                current = self._current_account(email)
+
+                self._check_version(email, current, expected_version)
+
+                if current:
+
+                    old_password = current.password
+
+                    if old_password == password:
+
+                        return False, "الحساب موجود بالفعل بنفس الباسورد"
+
+                    with self._conn:
+
+                        self._conn.execute(
+
+                            "UPDATE accounts SET password = ?, version = version + 1 WHERE email = ?", (password, email)
+
+                        )
+
+                    self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+
+                    return True, f"تم تعديل الباسورد من {old_password} إلى {password}"
+
+
+
+                data = Account(
+
+                    password,
+
+                    now.timestamp(),
+
+                    (now + timedelta(hours=self.db["settings"]["pending_hours"])).timestamp()
+
+                )
+
+                with self._conn:
+
+                    self._conn.execute(
+
+                        f"INSERT INTO accounts {self.ACCOUNT_COLUMNS}",
+
+                        self._account_row(email, data)
+
+                    )
+
+            self.add_log("إضافة حساب", f"تم إضافة {email}")
+
+            return True, "تم الإضافة بنجاح"
+
+        except VersionConflict:
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إضافة الحساب: {e}")
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    def add_accounts_bulk(self, credentials: List[Tuple[str, str]]) -> List[Tuple[str, bool, str]]:
+
+        """إضافة دفعة حسابات في transaction واحدة"""
+
+        results, changed = [], {}
+
+        try:
+
+            emails = list({email.lower().strip() for email, _ in credentials})
+
+            with self._lock:
+
+                # تحميل الحسابات الموجودة من الدفعة فقط
+
+                existing = {}
+
+                for start in range(0, len(emails), 500):
+
+                    chunk = emails[start:start + 500]
+
+                    rows = self._conn.execute(
+
+                        f"SELECT * FROM accounts WHERE email IN ({','.join('?' * len(chunk))})", chunk
+
+                    ).fetchall()
+
+                    existing.update(map(self._row_account, rows))
+
+
+
+                results, changed = self._merge_bulk(credentials, existing)
+
+                if changed:
+
+                    self._journal("accounts", data=changed)
+
+            if changed:
+
+                self._log_bulk_summary(results)
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الإضافة الجماعية: {e}")
+
+            # الدفعة كلها في transaction واحدة فمفيش حاجة منها اتسجلت
+
+            results = (self._failed_results(results, e) if results
+
+                       else [(email.lower().strip(), False, f"خطأ: {e}") for email, _ in credentials])
+
+        return results
+
+
+
+    def update_password(self, email: str, new_password: str, expected_version: Optional[int] = None) -> Tuple[bool, str]:
+
+        """تعديل باسورد حساب موجود - compare-and-set لو expected_version اتبعت"""
+
+        try:
+
+            email = email.lower().strip()
+
+            new_password = new_password.strip()
+
+            with self._lock:
+
+                current = self._current_account(email)
+
+                self._check_version(email, current, expected_version)
+
+                if not current:
+
+                    return False, "الحساب غير موجود"
+
+                with self._conn:
+
+                    self._conn.execute(
+
+                        "UPDATE accounts SET password = ?, version = version + 1 WHERE email = ?", (new_password, email)
+
+                    )
+
+            self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+
+            return True, f"تم تعديل الباسورد من {current.password} إلى {new_password}"
+
+        except VersionConflict:
+
+            raise
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تعديل الباسورد: {e}")
+
+            return False, f"خطأ: {str(e)}"
+
+
+
+    def get_available_account(self) -> Optional[Tuple[str, str]]:
+
+        """سحب أفضل حساب متاح في transaction واحدة على الفهرس"""
+
+        try:
+
+            now = datetime.now()
+
+            cooldown_until = (now + timedelta(hours=self.db["settings"]["cooldown_hours"])).isoformat()
+
+            pick = (
+
+                "SELECT email FROM accounts WHERE available_at <= ? "
+
+                "ORDER BY priority, available_at, use_count LIMIT 1"
+
+            )
+
+
+
+            with self._lock, self._conn:
+
+                self.db["stats"]["total_requests"] += 1
+
+                if sqlite3.sqlite_version_info >= (3, 35, 0):
+
+                    row = self._conn.execute(
+
+                        "UPDATE accounts SET status = 'used', last_used = ?, use_count = use_count + 1, "
+
+                        f"available_at = ?, version = version + 1 WHERE email = ({pick}) RETURNING email, password",
+
+                        (now.isoformat(), cooldown_until, now.isoformat())
+
+                    ).fetchone()
+
+                else:
+
+                    row = self._conn.execute(
+
+                        f"SELECT email, password FROM accounts WHERE email = ({pick})", (now.isoformat(),)
+
+                    ).fetchone()
+
+                    if row:
+
+                        self._conn.execute(
+
+                            "UPDATE accounts SET status = 'used', last_used = ?, use_count = use_count + 1, "
+
+                            "available_at = ?, version = version + 1 WHERE email = ?",
+
+                            (now.isoformat(), cooldown_until, row["email"])
+
+                        )
+
+                if row:
+
+                    self.db["stats"]["successful_requests"] += 1
+
+                self._write_stats()
+
+
+
+            if not row:
+
+                return None
+
+            self.add_log("استخدام حساب", f"تم استخدام {row['email']}")
+
+            return row["email"], row["password"]
+
+        except Exception as e:
+
+            logger.error(f"خطأ في الحصول على حساب: {e}")
+
+            return None
+
+
+
+    def return_account(self, email: str) -> bool:
+
+        """إرجاع حساب اتسحب ومتسلمش للمتاح فوراً"""
+
+        try:
+
+            with self._lock, self._conn:
+
+                cursor = self._conn.execute(
+
+                    "UPDATE accounts SET status = 'available', available_at = ?, use_count = MAX(0, use_count - 1), "
+
+                    "version = version + 1 WHERE email = ? AND status = 'used'",
+
+                    (datetime.now().isoformat(), email)
+
+                )
+
+            if not cursor.rowcount:
+
+                return False
+
+            self.add_log("إرجاع حساب", f"تم إرجاع {email} (السحب متثبتش على القرص)")
+
+            return True
+
+        except Exception as e:
+
+            logger.error(f"خطأ في إرجاع الحساب: {e}")
+
+            return False
+
+
+
+    def checkout(self, count: int, lease_seconds: int = LEASE_SECONDS) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+
+        """حجز عدد حسابات في transaction واحدة"""
+
+        try:
+
+            now = datetime.now()
+
+            lease_id = uuid.uuid4().hex[:12]
+
+            expires_at = (now + timedelta(seconds=lease_seconds)).isoformat()
+
+            with self._lock, self._conn:
+
+                rows = self._conn.execute(
+
+                    "SELECT email, password FROM accounts WHERE available_at <= ? "
+
+                    "ORDER BY priority, available_at, use_count LIMIT ?",
+
+                    (now.isoformat(), count)
+
+                ).fetchall()
+
+                self._conn.executemany(
+
+                    "UPDATE accounts SET status = 'leased', lease_id = ?, available_at = ?, version = version + 1 "
+
+                    "WHERE email = ?",
+
+                    ((lease_id, expires_at, row["email"]) for row in rows)
+
+                )
+
+                self.db["stats"]["total_requests"] += count
+
+                self.db["stats"]["successful_requests"] += len(rows)
+
+                self._write_stats()
+
+            if not rows:
+
+                return None, []
+
+            self.add_log("حجز حسابات", f"تم حجز {len(rows)} حساب (lease {lease_id})")
+
+            return lease_id, [(row["email"], row["password"]) for row in rows]
+
+        except Exception as e:
+
+            logger.error(f"خطأ في حجز الحسابات: {e}")
+
+            return None, []
+
+
+
+    def confirm_lease(self, lease_id: str) -> int:
 
         try:
 
-            new_password = new_password.strip()
+            now = datetime.now()
+
+            cooldown_until = (now + timedelta(hours=self.db["settings"]["cooldown_hours"])).isoformat()
+
+            with self._lock, self._conn:
+
+                confirmed = self._conn.execute(
+
+                    "UPDATE accounts SET status = 'used', last_used = ?, use_count = use_count + 1, "
+
+                    "available_at = ?, lease_id = NULL, version = version + 1 "
+
+                    "WHERE lease_id = ? AND status = 'leased' AND available_at > ?",
+
+                    (now.isoformat(), cooldown_until, lease_id, now.isoformat())
+
+                ).rowcount
+
+            if confirmed:
+
+                self.add_log("استخدام حساب", f"تم استخدام {confirmed} حساب من الدفعة {lease_id}")
+
+            return confirmed
+
+        except Exception as e:
+
+            logger.error(f"خطأ في تأكيد الحجز: {e}")
 
+            return 0
 
 
-            if not new_password or len(new_password) < 3:
 
-                return False, "الباسورد يجب أن يكون على الأقل 3 أحرف"
+    def release_lease(self, lease_id: str) -> int:
 
+        try:
 
+            now = datetime.now()
 
-            old_password = self.get_fixed_password()
+            with self._lock, self._conn:
 
-            self.db["settings"]["fixed_password"] = new_password
+                released = self._conn.execute(
 
-            self.add_log("تعديل باسورد ثابت", f"من {old_password} إلى {new_password}")
+                    "UPDATE accounts SET status = 'available', available_at = ?, lease_id = NULL, version = version + 1 "
 
-            self.save_database()
+                    "WHERE lease_id = ? AND status = 'leased' AND available_at > ?",
 
-            return True, f"تم تحديث الباسورد الثابت من {old_password} إلى {new_password}"
+                    (now.isoformat(), lease_id, now.isoformat())
+
+                ).rowcount
+
+            if released:
+
+                self.add_log("إرجاع حسابات", f"تم إرجاع {released} حساب من الدفعة {lease_id}")
+
+            return released
 
         except Exception as e:
 
-            logger.error(f"خطأ في تحديث الباسورد الثابت: {e}")
+            logger.error(f"خطأ في إرجاع الحجز: {e}")
 
-            return False, f"خطأ: {str(e)}"
+            return 0
 
 
 
-    def add_account(self, email: str, password: str) -> Tuple[bool, str]:
+    def promote_due(self) -> List[str]:
 
-        """إضافة حساب جديد مع معالجة محسنة"""
+        """تفعيل الحسابات اللي وقتها جه في transaction واحدة"""
 
         try:
 
-            email = email.lower().strip()
+            now_iso = datetime.now().isoformat()
 
-            password = password.strip()
+            with self._lock, self._conn:
 
+                rows = self._conn.execute(
 
+                    "SELECT email FROM accounts WHERE available_at <= ? AND status != 'available'", (now_iso,)
 
-            if not email or not password:
+                ).fetchall()
 
-                return False, "الإيميل أو الباسورد فارغ"
+                if rows:
 
+                    self._conn.execute(
 
+                        "UPDATE accounts SET status = 'available' WHERE available_at <= ? AND status != 'available'",
 
-            if not self.is_valid_email(email):
+                        (now_iso,)
 
-                return False, "صيغة الإيميل غير صحيحة"
+                    )
 
+            return [row["email"] for row in rows]
 
+        except Exception as e:
 
-            now = datetime.now()
+            logger.error(f"خطأ في تفعيل الحسابات: {e}")
 
+            return []
 
 
-            # التحقق من وجود الحساب
 
-            if email in self.db["accounts"]:
+    def seconds_until_next_promotion(self) -> Optional[float]:
 
-                old_password = self.db["accounts"][email]["password"]
+        now = datetime.now()
 
-                if old_password != password:
+        with self._lock:
 
-                    self.db["accounts"][email]["password"] = password
+            row = self._conn.execute(
 
-                    self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+                "SELECT MIN(available_at) FROM accounts WHERE available_at > ?", (now.isoformat(),)
 
-                    self.save_database()
+            ).fetchone()
 
-                    return True, f"تم تعديل الباسورد من {old_password} إلى {password}"
+        if row[0] is None:
 
-                else:
+            return None
 
-                    return False, "الحساب موجود بالفعل بنفس الباسورد"
+        return max(0.0, (datetime.fromisoformat(row[0]) - now).total_seconds())
 
 
 
-            # إضافة الحساب الجديد
+    def publish_snapshot(self) -> AccountsSnapshot:
 
-            self.db["accounts"][email] = {
+        """نسخة قراءة للإحصائيات من SQLite (الحسابات نفسها بتتقري بالصفحات من iter_accounts)"""
 
-                "password": password,
+        now_iso = datetime.now().isoformat()
 
-                "added_at": now.isoformat(),
+        with self._lock:
 
-                "available_at": (now + timedelta(hours=self.db["settings"]["pending_hours"])).isoformat(),
+            total = self._conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
 
-                "status": "pending",
+            available = self._conn.execute(
 
-                "last_used": None,
+                "SELECT COUNT(*) FROM accounts WHERE available_at <= ?", (now_iso,)
 
-                "use_count": 0,
+            ).fetchone()[0]
 
-                "priority": 1
+            pending = self._conn.execute(
 
-            }
+                "SELECT COUNT(*) FROM accounts WHERE status = 'pending' AND available_at > ?", (now_iso,)
 
+            ).fetchone()[0]
 
+            next_row = self._conn.execute(
 
-            self.add_log("إضافة حساب", f"تم إضافة {email}")
+                "SELECT email, available_at FROM accounts WHERE available_at > ? ORDER BY available_at LIMIT 1",
 
-            self.save_database()
+                (now_iso,)
 
-            return True, "تم الإضافة بنجاح"
+            ).fetchone()
 
+            stats = dict(self.db["stats"])
 
+        next_available = None
 
-        except Exception as e:
+        if next_row:
 
-            logger.error(f"خطأ في إضافة الحساب: {e}")
+            next_available = (datetime.fromisoformat(next_row["available_at"]).timestamp(), next_row["email"])
 
-            return False, f"خطأ: {str(e)}"
+        counts = {
 
+            "total": total,
 
+            "available": available,
 
-    def add_account_with_fixed_password(self, email: str) -> Tuple[bool, str]:
+            "pending": pending,
 
-        """إضافة حساب بالباسورد الثابت"""
+            "cooldown": total - available - pending
+
+        }
+
+        self._snapshot = AccountsSnapshot(self._version, None, counts, next_available, stats)
+
+        return self._snapshot
+
+
+
+    def snapshot(self, fresh: bool = False) -> AccountsSnapshot:
+
+        """SQLite بيدي قراءة متسقة في كل استعلام، فالنسخة بتتبني عند الطلب"""
+
+        return self.publish_snapshot()
+
+
+
+    def get_statistics(self) -> dict:
+
+        """الإحصائيات من فهارس SQLite بدون أي كتابة"""
 
         try:
 
-            email = email.lower().strip()
+            return self.publish_snapshot().statistics()
 
+        except Exception as e:
 
+            logger.error(f"خطأ في الإحصائيات: {e}")
 
-            if not self.is_valid_email(email):
+            return {"total": 0, "available": 0, "pending": 0, "cooldown": 0}
 
-                return False, "صيغة الإيميل غير صحيحة"
 
 
+    def delete_account(self, email: str, expected_version: Optional[int] = None) -> bool:
 
-            fixed_password = self.get_fixed_password()
+        """حذف حساب - compare-and-set لو expected_version اتبعت"""
 
-            success, message = self.add_account(email, fixed_password)
+        try:
 
+            email = email.lower().strip()
 
+            with self._lock, self._conn:
 
-            if success:
+                if expected_version is not None:
 
-                if "تعديل" in message:
+                    self._check_version(email, self._current_account(email), expected_version)
 
-                    return True, f"تم تعديل الحساب ليستخدم الباسورد الثابت"
+                deleted = self._conn.execute("DELETE FROM accounts WHERE email = ?", (email,)).rowcount
 
-                else:
+            if deleted:
 
-                    return True, f"تم إضافة الحساب بالباسورد الثابت بنجاح"
+                self.add_log("حذف حساب", f"تم حذف {email}")
 
-            else:
+                return True
 
-                return success, message
+            return False
 
+        except VersionConflict:
 
+            raise
 
         except Exception as e:
 
-            logger.error(f"خطأ في إضافة حساب بالباسورد الثابت: {e}")
+            logger.error(f"خطأ في حذف الحساب: {e}")
 
-            return False, f"خطأ: {str(e)}"
+            return False
 
 
 
-    def update_password(self, email: str, new_password: str) -> Tuple[bool, str]:
+    def get_account_info(self, email: str) -> Optional[dict]:
 
-        """تعديل باسورد حساب موجود"""
+        """معلومات حساب معين بقراءة نقطية من الفهرس"""
 
         try:
 
             email = email.lower().strip()
 
-            new_password = new_password.strip()
+            with self._lock:
 
+                row = self._conn.execute("SELECT * FROM accounts WHERE email = ?", (email,)).fetchone()
 
+            if not row:
 
-            if email not in self.db["accounts"]:
+                return None
 
-                return False, "الحساب غير موجود"
+            return self._format_account_info(*self._row_account(row))
 
+        except Exception as e:
 
+            logger.error(f"خطأ في الحصول على معلومات الحساب: {e}")
 
-            old_password = self.db["accounts"][email]["password"]
+            return None
 
-            self.db["accounts"][email]["password"] = new_password
 
 
+    def count_accounts(self) -> int:
 
-            self.add_log("تعديل باسورد", f"تم تعديل باسورد {email}")
+        with self._lock:
 
-            self.save_database()
+            return self._conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
 
-            return True, f"تم تعديل الباسورد من {old_password} إلى {new_password}"
 
 
+    def count_accounts_with_password(self, password: str) -> int:
 
-        except Exception as e:
+        with self._lock:
 
-            logger.error(f"خطأ في تعديل الباسورد: {e}")
+            return self._conn.execute("SELECT COUNT(*) FROM accounts WHERE password = ?", (password,)).fetchone()[0]
 
-            return False, f"خطأ: {str(e)}"
 
 
+    def emails_with_password(self, password: str) -> List[str]:
 
-    def get_available_account(self) -> Optional[Tuple[str, str]]:
+        with self._lock:
 
-        """الحصول على حساب متاح مع تحديث الإحصائيات"""
+            rows = self._conn.execute("SELECT email FROM accounts WHERE password = ?", (password,)).fetchall()
 
-        try:
+        return [row["email"] for row in rows]
 
-            self.db["stats"]["total_requests"] += 1
 
 
+    def browse_accounts(self, tab: str, after: Optional[tuple] = None,
 
-            now = datetime.now()
+                        limit: int = ACCOUNTS_PAGE_SIZE) -> Tuple[List[dict], Optional[tuple], dict]:
 
-            available_accounts = []
+        """صفحة من تبويب بمؤشر (available_at, email) على الفهرس بدل OFFSET"""
 
+        now_iso = datetime.now().isoformat()
 
+        conditions = {
 
-            for email, data in self.db["accounts"].items():
+            "available": "available_at <= ?",
 
-                available_at = datetime.fromisoformat(data["available_at"])
+            "pending": "status = 'pending' AND available_at > ?",
 
+            "cooldown": "status != 'pending' AND available_at > ?"
 
+        }
 
-                if available_at <= now and data["status"] in ["pending", "available"]:
+        query = f"SELECT * FROM accounts WHERE {conditions[tab]}"
 
-                    available_accounts.append((email, data, available_at))
+        params = [now_iso]
 
+        if after:
 
+            query += " AND (available_at, email) > (?, ?)"
 
-            if not available_accounts:
+            params.extend(after)
 
-                return None
+        query += " ORDER BY available_at, email LIMIT ?"
 
+        params.append(limit + 1)
 
+        with self._lock:
 
-            # ترتيب حسب الأولوية ثم الأقدم ثم الأقل استخداماً
+            rows = self._conn.execute(query, params).fetchall()
 
-            available_accounts.sort(key=lambda x: (
+        next_cursor = (rows[limit - 1]["available_at"], rows[limit - 1]["email"]) if len(rows) > limit else None
 
-                x[1].get("priority", 1),
+        entries = [self._format_account_info(*self._row_account(row)) for row in rows[:limit]]
 
-                x[2],
+        counts = self.publish_snapshot().counts
 
-                x[1].get("use_count", 0)
+        return entries, next_cursor, {tab_name: counts[tab_name] for tab_name in ("available", "pending", "cooldown")}
 
-            ))
 
 
+    def count_available_by(self, at: datetime) -> int:
 
-            # تحديث حالة الحساب
+        with self._lock:
 
-            email, data, _ = available_accounts[0]
+            return self._conn.execute(
 
-            data["status"] = "used"
+                "SELECT COUNT(*) FROM accounts WHERE available_at <= ?", (at.isoformat(),)
 
-            data["last_used"] = now.isoformat()
+            ).fetchone()[0]
 
-            data["use_count"] += 1
 
-            data["available_at"] = (now + timedelta(hours=self.db["settings"]["cooldown_hours"])).isoformat()
 
+    def _forecast_counts(self, now: datetime, hours: int) -> List[int]:
 
+        """المتاح دلوقتي وعدد اللي بيتاح في كل ساعة في query واحد على فهرس available_at"""
 
-            self.db["stats"]["successful_requests"] += 1
+        with self._lock:
 
-            self.add_log("استخدام حساب", f"تم استخدام {email}")
+            available_now = self._conn.execute(
 
-            self.save_database()
+                "SELECT COUNT(*) FROM accounts WHERE available_at <= ?", (now.isoformat(),)
 
+            ).fetchone()[0]
 
+            rows = self._conn.execute(
 
-            return email, data["password"]
+                "SELECT CAST((julianday(available_at) - julianday(?)) * 24 AS INTEGER) AS hour, COUNT(*) AS count "
 
+                "FROM accounts WHERE available_at > ? AND available_at <= ? GROUP BY hour",
 
+                (now.isoformat(), now.isoformat(), (now + timedelta(hours=hours)).isoformat())
 
-        except Exception as e:
+            ).fetchall()
 
-            logger.error(f"خطأ في الحصول على حساب: {e}")
+        per_hour = [0] * hours
 
-            return None
+        for row in rows:
 
+            per_hour[min(row["hour"], hours - 1)] += row["count"]
 
+        return list(accumulate(per_hour, initial=available_now))
 
-    def get_statistics(self) -> dict:
 
-        """الحصول على إحصائيات شاملة"""
 
-        try:
+    def iter_accounts(self) -> Iterator[Tuple[str, Account]]:
 
-            now = datetime.now()
+        """المرور على الحسابات من SQLite على دفعات بدل تحميلها كلها"""
 
-            stats = {
+        last_email = ""
 
-                "total": len(self.db["accounts"]),
+        while True:
 
-                "available": 0,
+            with self._lock:
 
-                "pending": 0,
+                rows = self._conn.execute(
 
-                "cooldown": 0,
+                    "SELECT * FROM accounts WHERE email > ? ORDER BY email LIMIT 500", (last_email,)
 
-                "next_available": None,
+                ).fetchall()
 
-                "next_available_email": None,
+            if not rows:
 
-                "total_requests": self.db["stats"].get("total_requests", 0),
+                return
 
-                "successful_requests": self.db["stats"].get("successful_requests", 0),
+            yield from map(self._row_account, rows)
 
-                "success_rate": 0
+            last_email = rows[-1]["email"]
 
-            }
 
 
+# إنشاء مدير الحسابات العالمي حسب نوع التخزين
+
+if STORAGE_BACKEND == "sqlite":
+
+    account_manager = SQLiteAccountManager()
+
+else:
+
+    account_manager = AccountManager()
+
+# دوال الكيبورد
 
-            next_available_time = None
+def get_main_keyboard():
 
-            next_email = None
+    """الكيبورد الرئيسي"""
 
+    keyboard = [
 
+        ["📥 طلب حساب", "📦 طلب دفعة", "📊 الإحصائيات"],
 
-            for email, data in self.db["accounts"].items():
+        ["➕ إضافة حساب", "📋 عرض الكل"],
 
-                available_at = datetime.fromisoformat(data["available_at"])
+        ["🔐 باسورد ثابت", "🔑 تعديل باسورد"],
 
+        ["🗑️ حذف حساب", "👁️ عرض حساب"],
 
+        ["⚙️ الإعدادات", "📜 السجل"]
 
-                if data["status"] == "pending" and available_at > now:
+    ]
 
-                    stats["pending"] += 1
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
-                elif data["status"] == "used" and available_at > now:
+def get_fixed_password_keyboard():
 
-                    stats["cooldown"] += 1
+    """كيبورد الباسورد الثابت"""
 
-                elif available_at <= now:
+    keyboard = [
 
-                    stats["available"] += 1
+        [InlineKeyboardButton("🔄 تغيير الباسورد الثابت", callback_data="change_fixed_password")],
 
-                    if data["status"] != "available":
+        [InlineKeyboardButton("📋 الحسابات بالباسورد الثابت", callback_data="show_fixed_accounts")]
 
-                        data["status"] = "available"
+    ]
 
+    return InlineKeyboardMarkup(keyboard)
 
+def get_settings_keyboard():
 
-                # إيجاد أقرب حساب سيصبح متاح
+    """كيبورد الإعدادات"""
 
-                if available_at > now:
+    settings = account_manager.db["settings"]
 
-                    if next_available_time is None or available_at < next_available_time:
+    keyboard = [
 
-                        next_available_time = available_at
+        [InlineKeyboardButton(f"⏰ مدة الانتظار: {settings['pending_hours']}س", callback_data="edit_pending")],
 
-                        next_email = email
+        [InlineKeyboardButton(f"🔄 مدة Cooldown: {settings['cooldown_hours']}س", callback_data="edit_cooldown")],
 
+        [InlineKeyboardButton("💾 نسخة احتياطية", callback_data="backup")],
 
+        [InlineKeyboardButton("🗑️ مسح كل البيانات", callback_data="clear_all")]
 
-            if next_available_time:
+    ]
 
-                time_diff = next_available_time - now
+    return InlineKeyboardMarkup(keyboard)
 
-                hours = int(time_diff.total_seconds() // 3600)
+def get_activity_log_keyboard(page: int, filter_index: int, has_more: bool):
 
-                minutes = int((time_diff.total_seconds() % 3600) // 60)
+    """كيبورد سجل الأنشطة: فلترة بنوع العملية والتنقل بين الصفحات"""
 
-                stats["next_available"] = f"{hours} ساعة و {minutes} دقيقة"
+    filters_row = [InlineKeyboardButton(("✅ " if filter_index == -1 else "") + "الكل", callback_data="logs:0:-1")]
 
-                stats["next_available_email"] = next_email
+    keyboard = [filters_row]
 
+    for index, action in enumerate(ACTIVITY_LOG_FILTERS):
 
+        if len(keyboard[-1]) == 3:
 
-            # حساب معدل النجاح
+            keyboard.append([])
 
-            if stats["total_requests"] > 0:
+        label = ("✅ " if filter_index == index else "") + action
 
-                stats["success_rate"] = (stats["successful_requests"] / stats["total_requests"]) * 100
+        keyboard[-1].append(InlineKeyboardButton(label, callback_data=f"logs:0:{index}"))
 
+    navigation = []
 
+    if page > 0:
 
-            self.save_database()
+        navigation.append(InlineKeyboardButton("⬅️ الأحدث", callback_data=f"logs:{page - 1}:{filter_index}"))
 
-            return stats
+    if has_more:
 
+        navigation.append(InlineKeyboardButton("الأقدم ➡️", callback_data=f"logs:{page + 1}:{filter_index}"))
 
+    if navigation:
 
-        except Exception as e:
+        keyboard.append(navigation)
 
-            logger.error(f"خطأ في الإحصائيات: {e}")
+    return InlineKeyboardMarkup(keyboard)
 
-            return {"total": 0, "available": 0, "pending": 0, "cooldown": 0}
+def get_accounts_browser_keyboard(tab: str, page: int, counts: dict, has_next: bool):
 
+    """كيبورد عرض الحسابات: تبويب لكل حالة بعدده والتنقل بين الصفحات"""
 
+    tabs_row = []
 
-    def delete_account(self, email: str) -> bool:
+    for name, title in ACCOUNTS_BROWSER_TABS.items():
 
-        """حذف حساب"""
+        label = ("✅ " if name == tab else "") + f"{title.split(' ', 1)[0]} {counts[name]}"
 
-        try:
+        tabs_row.append(InlineKeyboardButton(label, callback_data=f"browse:{name}:0"))
 
-            email = email.lower().strip()
+    keyboard = [tabs_row]
 
-            if email in self.db["accounts"]:
+    navigation = []
 
-                del self.db["accounts"][email]
+    if page > 0:
 
-                self.add_log("حذف حساب", f"تم حذف {email}")
+        navigation.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"browse:{tab}:{page - 1}"))
 
-                self.save_database()
+    if has_next:
 
-                return True
+        navigation.append(InlineKeyboardButton("التالي ➡️", callback_data=f"browse:{tab}:{page + 1}"))
 
-            return False
+    if navigation:
 
-        except Exception as e:
+        keyboard.append(navigation)
 
-            logger.error(f"خطأ في حذف الحساب: {e}")
+    return InlineKeyboardMarkup(keyboard)
 
-            return False
+def get_lease_keyboard(lease_id: str):
 
+    """كيبورد تأكيد أو إرجاع دفعة محجوزة"""
 
+    keyboard = [[
 
-    def get_account_info(self, email: str) -> Optional[dict]:
+        InlineKeyboardButton("✅ تأكيد الاستلام", callback_data=f"lease_confirm:{lease_id}"),
 
-        """الحصول على معلومات حساب معين"""
+        InlineKeyboardButton("↩️ إرجاع الدفعة", callback_data=f"lease_release:{lease_id}")
 
-        try:
+    ]]
 
-            email = email.lower().strip()
+    return InlineKeyboardMarkup(keyboard)
 
-            if email not in self.db["accounts"]:
+def version_conflict_message(conflict: VersionConflict) -> str:
 
-                return None
+    """رسالة للأدمن لما تعديله يتعارض مع تعديل أدمن تاني على نفس الحساب (compare-and-set فشل)"""
 
+    if conflict.current is None:
 
+        return (
 
-            account_data = self.db["accounts"][email]
+            f"⚠️ **تعارض:** الحساب `{conflict.email}` اتحذف من أدمن تاني بعد ما فتحته.\n\n"
 
-            now = datetime.now()
+            f"❌ **التعديل متعملش.**"
 
-            available_at = datetime.fromisoformat(account_data["available_at"])
+        )
 
-            time_diff = available_at - now
+    changed = "اتضاف" if conflict.expected_version == 0 else "اتعدل"
 
+    return (
 
+        f"⚠️ **تعارض:** الحساب `{conflict.email}` {changed} من أدمن تاني بعد ما فتحته "
 
-            if time_diff.total_seconds() > 0:
+        f"(نسخة {conflict.expected_version} ← {conflict.current_version}).\n\n"
 
-                hours = int(time_diff.total_seconds() // 3600)
+        f"🔑 **الباسورد الحالي:** `{conflict.current.password}`\n"
 
-                minutes = int((time_diff.total_seconds() % 3600) // 60)
+        f"📊 **الحالة:** {conflict.current.status.label}\n\n"
 
-                time_str = f"{hours}س {minutes}د"
+        f"❌ **التعديل متعملش** - ابدأ العملية من جديد لو لسه عايز تعدله."
 
-                current_status = account_data["status"]
+    )
 
-            else:
+def get_stats_keyboard():
 
-                time_str = "متاح الآن"
+    """كيبورد رسالة الإحصائيات"""
 
-                current_status = "available"
+    keyboard = [[InlineKeyboardButton(f"📈 توقع الإتاحة ({FORECAST_HOURS} ساعة)", callback_data="forecast")]]
 
-                account_data["status"] = "available"
+    return InlineKeyboardMarkup(keyboard)
 
-                self.save_database()
+# معالجات الأوامر والرسائل
 
+@error_handler
 
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
-            return {
+    """الأمر /start"""
 
-                "email": email,
+    if update.effective_user.id not in ADMIN_IDS:
 
-                "password": account_data["password"],
+        await update.message.reply_text("عذراً، هذا البوت خاص بمالكه فقط. 🔒")
 
-                "status": current_status,
+        return
 
-                "time_left": time_str,
 
-                "use_count": account_data["use_count"],
 
-                "added_at": account_data["added_at"],
+    # تحديث إحصائية آخر تشغيل
 
-                "priority": account_data.get("priority", 1)
+    account_manager.record_restart()
 
-            }
 
 
+    fixed_password = account_manager.get_fixed_password()
 
-        except Exception as e:
 
-            logger.error(f"خطأ في الحصول على معلومات الحساب: {e}")
 
-            return None
+    welcome_message = (
 
-# إنشاء مدير الحسابات العالمي
+        "🎯 **أهلاً بيك في بوت إدارة الحسابات الاحترافي!**\n\n"
 
-account_manager = AccountManager()
+        "🚀 **الميزات الجديدة:**\n"
 
-# دوال الكيبورد
+        "• **إعادة تشغيل تلقائي** عند حدوث أخطاء\n"
 
-def get_main_keyboard():
+        "• **استكمال العمل** من آخر نقطة توقف\n"
 
-    """الكيبورد الرئيسي"""
+        "• **رسائل منفصلة** للإيميل والباسورد\n"
 
-    keyboard = [
+        "• **إدخال منفصل:** إيميل في رسالة وباسورد في أخرى\n"
 
-        ["📥 طلب حساب", "📊 الإحصائيات"],
+        "• **نسخ احتياطي تلقائي** كل فترة\n"
 
-        ["➕ إضافة حساب", "📋 عرض الكل"],
+        "• **معالجة أخطاء متقدمة** مع استعادة البيانات\n"
 
-        ["🔐 باسورد ثابت", "🔑 تعديل باسورد"],
+        "• **إحصائيات شاملة** ومعدل النجاح\n"
 
-        ["🗑️ حذف حساب", "👁️ عرض حساب"],
+        "• **دعم صيغ متعددة** للحسابات\n"
 
-        ["⚙️ الإعدادات"]
+        "• **استخراج ذكي محسن** للبيانات\n"
 
-    ]
+        "• **🔐 باسورد ثابت:** ابعت إيميل بس ويستخدم الباسورد الثابت\n\n"
 
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        f"📊 **الوضع الحالي:**\n"
 
-def get_fixed_password_keyboard():
+        f"• إجمالي الحسابات: {account_manager.count_accounts()}\n"
 
-    """كيبورد الباسورد الثابت"""
+        f"• طلبات ناجحة: {account_manager.db['stats'].get('successful_requests', 0)}\n"
 
-    keyboard = [
+        f"• الباسورد الثابت: `{fixed_password}`\n"
 
-        [InlineKeyboardButton("🔄 تغيير الباسورد الثابت", callback_data="change_fixed_password")],
+        f"• آخر إعادة تشغيل: {account_manager.db['stats']['last_restart'][:16].replace('T', ' ')}\n\n"
 
-        [InlineKeyboardButton("📋 الحسابات بالباسورد الثابت", callback_data="show_fixed_accounts")]
+        "**🚀 طريقة الاستخدام:**\n"
 
-    ]
+        "**1️⃣ ابعت إيميل:** `user@gmail.com` (هيستخدم الباسورد الثابت)\n"
 
-    return InlineKeyboardMarkup(keyboard)
+        "**2️⃣ ابعت إيميل وباسورد:** `user@gmail.com password123`\n"
 
-def get_settings_keyboard():
+        "**3️⃣ أو في سطرين منفصلين**\n"
 
-    """كيبورد الإعدادات"""
+        "**4️⃣ أو ابعت ملف** `.txt` / `.csv` فيه الحسابات\n\n"
 
-    settings = account_manager.db["settings"]
+        "استخدم الأزرار بالأسفل للبدء! 👇"
 
-    keyboard = [
+    )
 
-        [InlineKeyboardButton(f"⏰ مدة الانتظار: {settings['pending_hours']}س", callback_data="edit_pending")],
 
-        [InlineKeyboardButton(f"🔄 مدة Cooldown: {settings['cooldown_hours']}س", callback_data="edit_cooldown")],
 
-        [InlineKeyboardButton("💾 نسخة احتياطية", callback_data="backup")],
+    await update.message.reply_text(
 
-        [InlineKeyboardButton("🗑️ مسح كل البيانات", callback_data="clear_all")]
+        welcome_message,
 
-    ]
+        parse_mode='Markdown',
 
-    return InlineKeyboardMarkup(keyboard)
+        reply_markup=get_main_keyboard()
 
-# معالجات الأوامر والرسائل
+    )
 
 @error_handler
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
-    """الأمر /start"""
+    """الأمر /restore [الوقت] - عرض نقاط الاسترجاع أو استرجاع القاعدة لآخر نقطة قبل الوقت"""
 
     if update.effective_user.id not in ADMIN_IDS:
 
-        await update.message.reply_text("عذراً، هذا البوت خاص بمالكه فقط. 🔒")
-
         return
 
+    if not context.args:
 
+        points = account_manager.backups.points()
 
-    # تحديث إحصائية آخر تشغيل
+        if not points:
+
+            await update.message.reply_text("📭 مفيش نقاط استرجاع لسه")
 
-    account_manager.db["stats"]["last_restart"] = datetime.now().isoformat()
+            return
 
-    account_manager.save_database()
+        message = "🕒 **آخر نقاط الاسترجاع:**\n\n"
 
+        message += "\n".join(f"• `{point['timestamp'].replace('T', ' ')}`" for point in points[-10:])
 
+        message += "\n\n💡 **للاسترجاع:** `/restore 2024-01-31 18:30`"
 
-    fixed_password = account_manager.get_fixed_password()
+        await update.message.reply_text(message, parse_mode='Markdown')
 
+        return
 
+    try:
 
-    welcome_message = (
+        at = datetime.fromisoformat(" ".join(context.args))
 
-        "🎯 **أهلاً بيك في بوت إدارة الحسابات الاحترافي!**\n\n"
+    except ValueError:
 
-        "🚀 **الميزات الجديدة:**\n"
+        await update.message.reply_text("❌ صيغة الوقت غلط - مثال: `/restore 2024-01-31 18:30`", parse_mode='Markdown')
 
-        "• **إعادة تشغيل تلقائي** عند حدوث أخطاء\n"
+        return
 
-        "• **استكمال العمل** من آخر نقطة توقف\n"
+    # فك الضغط وإعادة التحميل في thread عشان البوت ميقفش
 
-        "• **رسائل منفصلة** للإيميل والباسورد\n"
+    loop = asyncio.get_running_loop()
 
-        "• **إدخال منفصل:** إيميل في رسالة وباسورد في أخرى\n"
+    point = await loop.run_in_executor(None, account_manager.restore_backup, at)
 
-        "• **نسخ احتياطي تلقائي** كل فترة\n"
+    if point is None:
 
-        "• **معالجة أخطاء متقدمة** مع استعادة البيانات\n"
+        await update.message.reply_text("❌ مفيش نقطة استرجاع قبل الوقت ده")
 
-        "• **إحصائيات شاملة** ومعدل النجاح\n"
+        return
 
-        "• **دعم صيغ متعددة** للحسابات\n"
+    await update.message.reply_text(
 
-        "• **استخراج ذكي محسن** للبيانات\n"
+        f"✅ **تم الاسترجاع لنقطة** `{point['timestamp'].replace('T', ' ')}`\n\n"
 
-        "• **🔐 باسورد ثابت:** ابعت إيميل بس ويستخدم الباسورد الثابت\n\n"
+        f"📈 **إجمالي الحسابات:** {account_manager.count_accounts()}",
 
-        f"📊 **الوضع الحالي:**\n"
+        parse_mode='Markdown'
 
-        f"• إجمالي الحسابات: {len(account_manager.db['accounts'])}\n"
+    )
 
-        f"• طلبات ناجحة: {account_manager.db['stats'].get('successful_requests', 0)}\n"
+@error_handler
 
-        f"• الباسورد الثابت: `{fixed_password}`\n"
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
-        f"• آخر إعادة تشغيل: {account_manager.db['stats']['last_restart'][:16].replace('T', ' ')}\n\n"
+    """الأمر /perf - أبطأ العمليات بالزمن الكلي: العدد والأخطاء والمتوسط وp95 بالملي ثانية"""
 
-        "**🚀 طريقة الاستخدام:**\n"
+    if update.effective_user.id not in ADMIN_IDS:
 
-        "**1️⃣ ابعت إيميل:** `user@gmail.com` (هيستخدم الباسورد الثابت)\n"
+        return
 
-        "**2️⃣ ابعت إيميل وباسورد:** `user@gmail.com password123`\n"
+    rows = metrics.summary()
 
-        "**3️⃣ أو في سطرين منفصلين**\n\n"
+    if not rows:
 
-        "استخدم الأزرار بالأسفل للبدء! 👇"
+        await update.message.reply_text("📭 مفيش قياسات لسه")
 
-    )
+        return
 
+    lines = [f"{'operation':<28} {'n':>6} {'err':>4} {'avg':>7} {'p95':>7}"]
 
+    for row in rows[:PERF_TOP]:
 
-    await update.message.reply_text(
+        name = f"{row['kind'][0]}:{row['name']}"[:28]
 
-        welcome_message,
+        lines.append(f"{name:<28} {row['count']:>6} {row['errors']:>4} {row['avg_ms']:>7.1f} {row['p95_ms']:>7.1f}")
 
-        parse_mode='Markdown',
+    message = f"⏱ **الأداء (أعلى {min(len(rows), PERF_TOP)} بالزمن الكلي، ms):**\n"
 
-        reply_markup=get_main_keyboard()
+    message += "```\n" + "\n".join(lines) + "\n```"
 
-    )
+    await update.message.reply_text(message, parse_mode='Markdown')
 
 @error_handler
 
@@ -1763,6 +8152,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         return
 
+    elif context.user_data.get('waiting_for_batch_count'):
+
+        await checkout_batch_handler(update, context)
+
+        context.user_data['waiting_for_batch_count'] = False
+
+        return
+
 
 
     # ثانياً: معالجة الأزرار الرئيسية
@@ -1771,6 +8168,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         await get_account_handler(update, context)
 
+    elif text == "📦 طلب دفعة":
+
+        await update.message.reply_text(
+
+            f"📦 **طلب دفعة حسابات:**\n\n"
+
+            f"ابعت عدد الحسابات اللي محتاجها (1-{BATCH_CHECKOUT_MAX}):",
+
+            parse_mode='Markdown'
+
+        )
+
+        context.user_data['waiting_for_batch_count'] = True
+
     elif text == "📊 الإحصائيات":
 
         await show_stats_handler(update, context)
@@ -1815,6 +8226,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         await show_settings_handler(update, context)
 
+    elif text == "📜 السجل":
+
+        await show_activity_log_handler(update, context)
+
     elif text == "🔄 إعادة تشغيل البوت":
 
         await restart_bot(update, context)
@@ -1959,12 +8374,12 @@ async def handle_single_email_input(update: Update, context: ContextTypes.DEFAUL
 
     context.user_data['waiting_for_password_only'] = True
 
-
-
-    # التحقق إذا كان الحساب موجود
+    # التحقق إذا كان الحساب موجود (والنسخة اللي الأدمن شافها - 0 لو مش موجود)
 
     account_info = account_manager.get_account_info(email)
 
+    context.user_data['pending_version'] = account_info['version'] if account_info else 0
+
 
 
     if account_info:
@@ -2037,6 +8452,8 @@ async def handle_password_input(update: Update, context: ContextTypes.DEFAULT_TY
 
     del context.user_data['pending_email']
 
+    expected_version = context.user_data.pop('pending_version', None)
+
     context.user_data['waiting_for_password_only'] = False
 
 
@@ -2065,53 +8482,63 @@ async def handle_password_input(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-    # محاولة إضافة الحساب
+    async with account_locks.hold(email.lower()):
 
-    success, message = account_manager.add_account(email, password)
+        # محاولة إضافة الحساب - لو حد عدله من ساعة ما الإيميل اتبعت بيترفض
 
+        try:
 
+            success, message = account_manager.add_account(email, password, expected_version)
 
-    if success:
+        except VersionConflict as conflict:
 
-        await update.message.reply_text(
+            await update.message.reply_text(version_conflict_message(conflict), parse_mode='Markdown')
 
-            f"🎉 **تم إضافة الحساب بنجاح!**\n\n"
+            return
 
-            f"📧 **الإيميل:** `{email}`\n"
 
-            f"🔑 **الباسورد:** `{password}`\n\n"
 
-            f"💡 **التفاصيل:** {message}\n"
+        if success:
 
-            f"⏰ **سيكون متاح بعد {account_manager.db['settings']['pending_hours']} ساعة**\n\n"
+            await update.message.reply_text(
 
-            f"📊 **الإحصائيات المحدثة:**\n"
+                f"🎉 **تم إضافة الحساب بنجاح!**\n\n"
 
-            f"• إجمالي الحسابات: **{len(account_manager.db['accounts'])}**"
+                f"📧 **الإيميل:** `{email}`\n"
 
-        )
+                f"🔑 **الباسورد:** `{password}`\n\n"
 
+                f"💡 **التفاصيل:** {message}\n"
 
+                f"⏰ **سيكون متاح بعد {account_manager.db['settings']['pending_hours']} ساعة**\n\n"
 
-        # حفظ فوري للبيانات
+                f"📊 **الإحصائيات المحدثة:**\n"
 
-        account_manager.save_database()
+                f"• إجمالي الحسابات: **{account_manager.count_accounts()}**"
 
+            )
 
 
-    else:
 
-        await update.message.reply_text(
+            # حفظ فوري للبيانات
 
-            f"❌ **فشل في إضافة الحساب:**\n{message}\n\n"
+            account_manager.save_database()
 
-            f"📧 **الإيميل:** `{email}`\n"
 
-            f"🔑 **الباسورد:** `{password}`\n\n"
 
-            "🔄 **جرب مرة تانية أو استخدم طريقة مختلفة.**"
+        else:
 
-        )
+            await update.message.reply_text(
+
+                f"❌ **فشل في إضافة الحساب:**\n{message}\n\n"
+
+                f"📧 **الإيميل:** `{email}`\n"
+
+                f"🔑 **الباسورد:** `{password}`\n\n"
+
+                "🔄 **جرب مرة تانية أو استخدم طريقة مختلفة.**"
+
+            )
 
 @error_handler
 
@@ -2131,27 +8558,21 @@ async def add_accounts_multiple(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-    # إرسال رسالة معالجة
-
-    processing_msg = await update.message.reply_text("🔄 **جاري المعالجة بالذكاء الاصطناعي...**", parse_mode='Markdown')
-
+    # إرسال رسالة معالجة (التعديلات المتتالية عليها بتتدمج في طابور الإرسال)
 
+    processing_msg = send_queue.reply(update.message, "🔄 **جاري المعالجة بالذكاء الاصطناعي...**", parse_mode='Markdown')
 
     try:
 
         # تحديث رسالة المعالجة
 
-        await processing_msg.edit_text("🧠 **تحليل النص واستخراج البيانات...**", parse_mode='Markdown')
-
-
-
-        credentials = account_manager.extract_credentials(text)
-
+        processing_msg.edit_text("🧠 **تحليل النص واستخراج البيانات...**", parse_mode='Markdown')
 
+        credentials = await account_manager.extract_credentials_async(text)
 
         if not credentials:
 
-            await processing_msg.edit_text(
+            processing_msg.edit_text(
 
                 "❌ **فشل في استخراج الحسابات من النص.**\n\n"
 
@@ -2191,7 +8612,7 @@ async def add_accounts_multiple(update: Update, context: ContextTypes.DEFAULT_TY
 
         # تحديث رسالة المعالجة
 
-        await processing_msg.edit_text(f"✅ **تم استخراج {len(credentials)} حساب!**\n🔄 **جاري الإضافة...**", parse_mode='Markdown')
+        processing_msg.edit_text(f"✅ **تم استخراج {len(credentials)} حساب!**\n🔄 **جاري الإضافة...**", parse_mode='Markdown')
 
 
 
@@ -2205,9 +8626,7 @@ async def add_accounts_multiple(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-        for email, password in credentials:
-
-            success, message = account_manager.add_account(email, password)
+        for email, success, message in account_manager.add_accounts_bulk(credentials):
 
             if success:
 
@@ -2283,19 +8702,15 @@ async def add_accounts_multiple(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-        await processing_msg.edit_text(result_message, parse_mode='Markdown')
-
-
+        processing_msg.edit_text(result_message, parse_mode='Markdown')
 
         # حفظ فوري للبيانات
 
         account_manager.save_database()
 
-
-
     except Exception as e:
 
-        await processing_msg.edit_text(f"❌ **حدث خطأ في المعالجة:** {str(e)}")
+        processing_msg.edit_text(f"❌ **حدث خطأ في المعالجة:** {str(e)}")
 
         logger.error(f"خطأ في إضافة الحسابات: {e}")
 
@@ -2307,9 +8722,9 @@ async def smart_account_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-    # رسالة تحليل
+    # رسالة تحليل (PendingMessage من طابور الإرسال - المعالجات بتعدلها من غير ما تستنى)
 
-    analysis_msg = await update.message.reply_text("🧠 **جاري التحليل...**", parse_mode='Markdown')
+    analysis_msg = send_queue.reply(update.message, "🧠 **جاري التحليل...**", parse_mode='Markdown')
 
 
 
@@ -2347,7 +8762,7 @@ async def smart_account_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
         # غير معروف
 
-        await analysis_msg.edit_text(
+        analysis_msg.edit_text(
 
             f"❓ **مش قادر أحلل النص ده:**\n`{text}`\n\n"
 
@@ -2377,7 +8792,7 @@ async def handle_email_only(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         if not account_manager.is_valid_email(email):
 
-            await analysis_msg.edit_text(
+            analysis_msg.edit_text(
 
                 f"❌ **الإيميل غير صحيح:** `{email}`\n\n"
 
@@ -2401,7 +8816,7 @@ async def handle_email_only(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         if success:
 
-            await analysis_msg.edit_text(
+            analysis_msg.edit_text(
 
                 f"✅ **تم إضافة الحساب بالباسورد الثابت!**\n\n"
 
@@ -2413,7 +8828,7 @@ async def handle_email_only(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
                 f"⏰ **سيكون متاح بعد {account_manager.db['settings']['pending_hours']} ساعة**\n\n"
 
-                f"📊 **إجمالي الحسابات:** {len(account_manager.db['accounts'])}\n\n"
+                f"📊 **إجمالي الحسابات:** {account_manager.count_accounts()}\n\n"
 
                 f"🚀 **ابعت إيميل آخر لإضافة المزيد!**",
 
@@ -2423,7 +8838,7 @@ async def handle_email_only(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         else:
 
-            await analysis_msg.edit_text(
+            analysis_msg.edit_text(
 
                 f"❌ **فشل في الإضافة:** {message}\n\n"
 
@@ -2441,7 +8856,7 @@ async def handle_email_only(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         logger.error(f"خطأ في معالجة إيميل فقط: {e}")
 
-        await analysis_msg.edit_text(f"❌ **خطأ:** `{str(e)}`", parse_mode='Markdown')
+        analysis_msg.edit_text(f"❌ **خطأ:** `{str(e)}`", parse_mode='Markdown')
 
 @error_handler
 
@@ -2453,9 +8868,7 @@ async def handle_password_only(update: Update, context: ContextTypes.DEFAULT_TYP
 
     context.user_data['pending_password'] = password
 
-
-
-    await analysis_msg.edit_text(
+    analysis_msg.edit_text(
 
         f"✅ **تم حفظ الباسورد:** `{password}`\n\n"
 
@@ -2473,19 +8886,19 @@ async def handle_mixed_input(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
     """معالجة نص مختلط"""
 
-    credentials = account_manager.extract_credentials(text)
+    credentials = await account_manager.extract_credentials_async(text)
 
 
 
     if credentials:
 
-        await analysis_msg.edit_text(f"🎯 **تم اكتشاف {len(credentials)} حساب - جاري الإضافة...**")
+        analysis_msg.edit_text(f"🎯 **تم اكتشاف {len(credentials)} حساب - جاري الإضافة...**")
 
         await add_multiple_accounts(update, context, credentials, analysis_msg)
 
     else:
 
-        await analysis_msg.edit_text(
+        analysis_msg.edit_text(
 
             f"❓ **مش قادر أستخرج حسابات من النص ده:**\n`{text}`\n\n"
 
@@ -2515,9 +8928,9 @@ async def add_multiple_accounts(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-    for email, password in credentials:
+    # دفعة واحدة: حفظ واحد وسجل واحد بدل حفظ لكل حساب
 
-        success, message = account_manager.add_account(email, password)
+    for email, success, message in account_manager.add_accounts_bulk(credentials):
 
         if success:
 
@@ -2563,7 +8976,7 @@ async def add_multiple_accounts(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 
-    result_message += f"\n📈 **إجمالي الحسابات:** {len(account_manager.db['accounts'])}\n\n"
+    result_message += f"\n📈 **إجمالي الحسابات:** {account_manager.count_accounts()}\n\n"
 
 
 
@@ -2575,9 +8988,157 @@ async def add_multiple_accounts(update: Update, context: ContextTypes.DEFAULT_TY
 
         result_message += f"\n... **و {len(details) - 5} آخرين**"
 
+    analysis_msg.edit_text(result_message, parse_mode='Markdown')
+
+@error_handler
+
+async def import_document_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+    """استيراد ملف حسابات (.txt / .csv) بالقراءة على دفعات وإضافة كل دفعة مرة واحدة مع رسالة تقدم"""
+
+    if update.effective_user.id not in ADMIN_IDS:
+
+        return
+
+    document = update.message.document
+
+    file_name = document.file_name or ""
+
+    if not file_name.lower().endswith(IMPORT_EXTENSIONS):
+
+        await update.message.reply_text(f"❌ **الملفات المقبولة:** {' / '.join(IMPORT_EXTENSIONS)}", parse_mode='Markdown')
+
+        return
+
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+
+        await update.message.reply_text(f"❌ **الملف أكبر من {IMPORT_MAX_BYTES // 1024 // 1024} ميجا**", parse_mode='Markdown')
+
+        return
+
+    # رسالة التقدم بتتعدل من طابور الإرسال: الاستيراد مبيستناش تيليجرام والتعديلات المتراكمة بتتدمج في آخر نسبة
+
+    progress_msg = send_queue.reply(update.message, "📥 **جاري تحميل الملف...**", parse_mode='Markdown')
+
+    # الملف بيتحمل على القرص ويتقري منه سطر سطر بدل ما يتحمل كله في الذاكرة
+
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(file_name)[1])
+
+    os.close(fd)
+
+    try:
+
+        telegram_file = await document.get_file()
 
+        await telegram_file.download_to_drive(path)
 
-    await analysis_msg.edit_text(result_message, parse_mode='Markdown')
+        size = os.path.getsize(path) or 1
+
+        added_count = updated_count = failed_count = 0
+
+        lines_read = 0
+
+        last_progress = 0.0
+
+        loop = asyncio.get_running_loop()
+
+        pool = get_parse_pool()
+
+        with open(path, "rb") as raw:
+
+            lines = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace")
+
+            batches = credential_extractor.iter_batches(lines, IMPORT_BATCH_LINES)
+
+            # القراءة في thread والاستخراج في مجموعة العمليات بحد PARSE_WORKERS دفعات في نفس الوقت
+
+            # والإضافة بترتيب الملف عشان البوت يفضل بيرد أثناء الاستيراد
+
+            in_flight = deque()
+
+            while True:
+
+                batch = await loop.run_in_executor(None, next, batches, None)
+
+                if batch is not None:
+
+                    batch_lines_read, batch_lines, stop = batch
+
+                    in_flight.append((batch_lines_read, loop.run_in_executor(pool, extract_chunk, batch_lines, stop)))
+
+                    if len(in_flight) < PARSE_WORKERS:
+
+                        continue
+
+                elif not in_flight:
+
+                    break
+
+                lines_read, parsing = in_flight.popleft()
+
+                credentials = await parsing
+
+                if credentials:
+
+                    results = await loop.run_in_executor(None, account_manager.add_accounts_bulk, credentials)
+
+                    for _, success, message in results:
+
+                        if not success:
+
+                            failed_count += 1
+
+                        elif "تعديل" in message:
+
+                            updated_count += 1
+
+                        else:
+
+                            added_count += 1
+
+                now = loop.time()
+
+                if now - last_progress >= IMPORT_PROGRESS_SECONDS:
+
+                    last_progress = now
+
+                    progress_msg.edit_text(
+
+                        f"⏳ **جاري الاستيراد... {min(100, raw.tell() * 100 // size)}%**\n\n"
+
+                        f"📄 السطور: {lines_read}\n"
+
+                        f"✅ جديد: {added_count} | 🔄 تعديل: {updated_count} | ❌ فشل: {failed_count}",
+
+                        parse_mode='Markdown'
+
+                    )
+
+        saved = await account_manager.flush_database_async(DELIVERY_FLUSH_SECONDS)
+
+        progress_msg.edit_text(
+
+            f"📊 **نتائج استيراد `{file_name}`:**\n\n"
+
+            f"📄 **السطور:** {lines_read}\n"
+
+            f"✅ **أُضيف {added_count} حساب جديد**\n"
+
+            f"🔄 **تم تعديل {updated_count} حساب**\n"
+
+            f"❌ **فشل في {failed_count} حساب**\n\n"
+
+            f"📈 **إجمالي الحسابات:** {account_manager.count_accounts()}"
+
+            + ("" if saved else "\n\n⚠️ **لسه متثبتش على القرص** - راجع اللوج قبل ما تعتمد على النتيجة."),
+
+            parse_mode='Markdown'
+
+        )
+
+    finally:
+
+        os.remove(path)
 
 @error_handler
 
@@ -2587,9 +9148,9 @@ async def get_account_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     try:
 
-        # رسالة انتظار
+        # رسالة انتظار (كل الرسايل بتتبعت من طابور الإرسال والـ handler بيرجع فوراً)
 
-        wait_msg = await update.message.reply_text("🔍 **جاري البحث عن حساب متاح...**", parse_mode='Markdown')
+        wait_msg = send_queue.reply(update.message, "🔍 **جاري البحث عن حساب متاح...**", parse_mode='Markdown')
 
 
 
@@ -2625,9 +9186,7 @@ async def get_account_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
             message += f"• 📈 معدل النجاح: **{stats.get('success_rate', 0):.1f}%**"
 
-
-
-            await wait_msg.edit_text(message, parse_mode='Markdown')
+            wait_msg.edit_text(message, parse_mode='Markdown')
 
             return
 
@@ -2635,83 +9194,183 @@ async def get_account_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         email, password = result
 
+        async with account_locks.hold(email.lower()):
+
+            # التأكد إن تسجيل الاستخدام اتثبت على القرص قبل تسليم البيانات - لو متثبتش البيانات مبتتبعتش والحساب بيرجع
 
+            if not await account_manager.flush_database_async(DELIVERY_FLUSH_SECONDS):
 
-        # حذف رسالة الانتظار
+                account_manager.return_account(email)
 
-        await wait_msg.delete()
+                wait_msg.edit_text(
 
+                    "❌ **مقدرتش أثبت سحب الحساب على القرص، فالبيانات متبعتتش.**\n\n"
 
+                    "🔄 الحساب رجع للمتاح - جرب تاني بعد شوية.",
 
-        # رسالة تأكيد إيجاد الحساب
+                    parse_mode='Markdown'
 
-        confirm_msg = await update.message.reply_text(
+                )
 
-            "✅ **تم إيجاد حساب متاح!**\n🔄 **جاري إرسال البيانات في رسائل منفصلة...**",
+                return
 
-            parse_mode='Markdown'
+            # حذف رسالة الانتظار
 
-        )
+            wait_msg.delete()
 
+            # رسالة تأكيد إيجاد الحساب
 
+            confirm_msg = send_queue.reply(
 
-        # انتظار ثانيتين
+                update.message,
 
-        await asyncio.sleep(0)
+                "✅ **تم إيجاد حساب متاح!**\n🔄 **جاري إرسال البيانات في رسائل منفصلة...**",
 
+                parse_mode='Markdown'
 
+            )
 
-        # حذف رسالة التأكيد
+            # حذف رسالة التأكيد
 
-        await confirm_msg.delete()
+            confirm_msg.delete()
 
 
 
-        # **الرسالة الأولى: الإيميل فقط**
+            # **الرسالة الأولى: الإيميل فقط**
 
-        email_message = (
+            email_message = (
 
-            f"✅✅✅✅✅✅✅ ****\n\n"
+                f"✅✅✅✅✅✅✅ ****\n\n"
 
-            f"`{email}`\n\n"
+                f"`{email}`\n\n"
 
-            f"✅✅✅✅✅✅✅ ****"
+                f"✅✅✅✅✅✅✅ ****"
 
-        )
+            )
+
+
+
+            send_queue.reply(update.message, email_message, parse_mode='Markdown')
+
+
+
+            # **الرسالة الثانية: الباسورد فقط**
+
+            password_message = (
+
+                f"🚀🚀🚀🚀🚀🚀 **:**\n\n"
+
+                f"`{password}`\n\n"
+
+                f"🚀🚀🚀🚀🚀🚀 **  **"
+
+            )
+
+            # انتظار 4 ثوان بعد رسالة الإيميل للفصل التام (في الطابور - الـ handler مش بيستنى)
+
+            send_queue.reply(update.message, password_message, delay=4, parse_mode='Markdown')
+
+    except Exception as e:
+
+        logger.error(f"خطأ في طلب الحساب: {e}")
+
+        send_queue.reply(update.message, f"❌ **حدث خطأ:** {str(e)}")
+
+@error_handler
+
+async def checkout_batch_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+    """حجز دفعة حسابات مرة واحدة وإرسالها في رسالة واحدة أو ملف"""
+
+    try:
+
+        count = int(update.message.text.strip())
+
+    except ValueError:
 
+        await update.message.reply_text("❌ من فضلك ادخل رقم صحيح.")
+
+        return
+
+    if count < 1 or count > BATCH_CHECKOUT_MAX:
+
+        await update.message.reply_text(f"❌ العدد يجب أن يكون بين 1 و {BATCH_CHECKOUT_MAX}.")
+
+        return
+
+    lease_id, accounts = account_manager.checkout(count)
 
+    if not accounts:
 
-        await update.message.reply_text(email_message, parse_mode='Markdown')
+        await update.message.reply_text("❌ **مفيش حسابات متاحة دلوقتي.**", parse_mode='Markdown')
 
+        return
+
+    async with account_locks.hold_many(email.lower() for email, _ in accounts):
+
+        # التأكد إن الحجز اتثبت على القرص قبل تسليم البيانات - لو متثبتش الدفعة مبتتبعتش وبترجع للمتاح
+
+        if not await account_manager.flush_database_async(DELIVERY_FLUSH_SECONDS):
 
+            # لو الإرجاع نفسه فشل الـ lease بيخلص لوحده بعد LEASE_SECONDS
 
-        # انتظار 3 ثوان للفصل التام
+            account_manager.release_lease(lease_id)
 
-        await asyncio.sleep(4)
+            send_queue.reply(
 
+                update.message,
+
+                "❌ **مقدرتش أثبت الحجز على القرص، فالبيانات متبعتتش.**\n\n"
+
+                "🔄 الحسابات رجعت للمتاح - جرب تاني بعد شوية.",
+
+                parse_mode='Markdown'
 
+            )
 
-        # **الرسالة الثانية: الباسورد فقط**
+            return
 
-        password_message = (
+        lease_minutes = LEASE_SECONDS // 60
 
-            f"🚀🚀🚀🚀🚀🚀 **:**\n\n"
+        caption = (
 
-            f"`{password}`\n\n"
+            f"📦 **تم حجز {len(accounts)} حساب** (من {count} مطلوب)\n\n"
 
-            f"🚀🚀🚀🚀🚀🚀 **  **"
+            f"⏰ **أكد الاستلام خلال {lease_minutes} دقيقة** وإلا الحسابات هترجع للمتاح تلقائياً."
 
         )
 
+        if len(accounts) <= BATCH_MESSAGE_LIMIT:
 
+            message = caption + "\n\n"
 
-        await update.message.reply_text(password_message, parse_mode='Markdown')
+            for i, (email, password) in enumerate(accounts, 1):
 
-    except Exception as e:
+                message += f"{i}. `{email}`\n🔑 `{password}`\n\n"
 
-        logger.error(f"خطأ في طلب الحساب: {e}")
+            send_queue.reply(update.message, message, parse_mode='Markdown', reply_markup=get_lease_keyboard(lease_id))
+
+        else:
+
+            # الدفعات الكبيرة بتتبعت كملف email:password عشان حد طول الرسالة
+
+            content = "".join(f"{email}:{password}\n" for email, password in accounts)
+
+            send_queue.reply_document(
+
+                update.message,
+
+                content.encode("utf-8"),
+
+                filename=f"accounts_{lease_id}.txt",
+
+                caption=caption,
+
+                parse_mode='Markdown',
+
+                reply_markup=get_lease_keyboard(lease_id)
 
-        await update.message.reply_text(f"❌ **حدث خطأ:** {str(e)}")
+            )
 
 @error_handler
 
@@ -2729,9 +9388,7 @@ async def show_stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         # حساب الحسابات بالباسورد الثابت
 
-        fixed_count = sum(1 for email, data in account_manager.db["accounts"].items()
-
-                         if data["password"] == fixed_password)
+        fixed_count = account_manager.count_accounts_with_password(fixed_password)
 
 
 
@@ -2837,11 +9494,7 @@ async def show_stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
             message += f"• 🔄 آخر إعادة تشغيل: **{restart_time}**"
 
-
-
-        await update.message.reply_text(message, parse_mode='Markdown')
-
-
+        await update.message.reply_text(message, parse_mode='Markdown', reply_markup=get_stats_keyboard())
 
     except Exception as e:
 
@@ -2851,153 +9504,147 @@ async def show_stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 @error_handler
 
-async def show_all_accounts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def show_forecast_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
-    """عرض كل الحسابات مع تجميع ذكي"""
+    """توقع عدد الحسابات المتاحة خلال الساعات الجاية مع histogram بالساعة"""
 
     try:
 
-        accounts = []
-
-        now = datetime.now()
-
-
-
-        for email, data in account_manager.db["accounts"].items():
-
-            available_at = datetime.fromisoformat(data["available_at"])
-
-            time_diff = available_at - now
-
-
+        forecast = account_manager.forecast()
 
-            if time_diff.total_seconds() > 0:
+        hourly = forecast["hourly"]
 
-                hours = int(time_diff.total_seconds() // 3600)
+        message = f"📈 **توقع الإتاحة:**\n\n"
 
-                minutes = int((time_diff.total_seconds() % 3600) // 60)
+        message += f"✅ **متاح الآن:** {forecast['available_now']}\n"
 
-                time_str = f"{hours}س {minutes}د"
+        for horizon, count in forecast["horizons"].items():
 
-                current_status = data["status"]
+            message += f"⏰ **خلال {horizon} ساعة:** {count}\n"
 
-            else:
-
-                time_str = "متاح الآن"
+        message += f"\n📊 **اللي هيتاح في كل ساعة ({len(hourly)} ساعة):**\n"
 
-                current_status = "available"
+        # histogram نصي: سطر لكل ساعة وطول الشريط نسبة لأكبر ساعة
 
-                data["status"] = "available"
+        peak = max((hour["becoming_available"] for hour in hourly), default=0)
 
+        bar_length = 12
 
+        lines = []
 
-            accounts.append({
+        for hour in hourly:
 
-                "email": email,
+            count = hour["becoming_available"]
 
-                "password": data["password"],
+            bars = max(1, round(count / peak * bar_length)) if count else 0
 
-                "status": current_status,
+            lines.append(f"{hour['start'][11:16]} {'█' * bars:<{bar_length}} {count}")
 
-                "time_left": time_str,
+        message += "```\n" + "\n".join(lines) + "\n```"
 
-                "use_count": data["use_count"]
-
-            })
+        await update.effective_message.reply_text(message, parse_mode='Markdown')
 
+    except Exception as e:
 
+        logger.error(f"خطأ في عرض توقع الإتاحة: {e}")
 
-        if not accounts:
+        await update.effective_message.reply_text("❌ حدث خطأ في عرض توقع الإتاحة")
 
-            await update.message.reply_text(
+@error_handler
 
-                "❌ **مفيش حسابات مضافة**\n\n"
+async def show_all_accounts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, tab: Optional[str] = None, page: int = 0):
 
-                "💡 **ابعت إيميل جديد لإضافة حساب!**",
+    """عرض الحسابات بتبويبات وصفحات - كل صفحة بتتقري من الفهرس المترتب بمؤشر من غير مرور على الكل"""
 
-                parse_mode='Markdown'
+    try:
 
-            )
+        # مؤشرات بداية كل صفحة لكل تبويب في user_data لأن callback_data محدودة بـ 64 بايت
 
-            return
+        cursors = context.user_data.setdefault("browse_cursors", {})
 
+        if tab is None:
 
+            cursors.clear()
 
-        # تقسيم الحسابات حسب الحالة
+            tab = "available"
 
-        available_accounts = [acc for acc in accounts if acc['time_left'] == "متاح الآن"]
+        tab_cursors = cursors.setdefault(tab, [None])
 
-        pending_accounts = [acc for acc in accounts if acc['status'] == "pending"]
+        if page >= len(tab_cursors):
 
-        cooldown_accounts = [acc for acc in accounts if acc['status'] == "used"]
+            page = 0
 
+        entries, next_cursor, counts = account_manager.browse_accounts(tab, tab_cursors[page], ACCOUNTS_PAGE_SIZE)
 
+        total = sum(counts.values())
 
-        message = f"📋 **كل الحسابات ({len(accounts)}):**\n\n"
+        if not total:
 
+            await update.effective_message.reply_text(
 
+                "❌ **مفيش حسابات مضافة**\n\n"
 
-        if available_accounts:
+                "💡 **ابعت إيميل جديد لإضافة حساب!**",
 
-            message += f"✅ **المتاحة ({len(available_accounts)}):**\n"
+                parse_mode='Markdown'
 
-            for i, acc in enumerate(available_accounts[:5], 1):
+            )
 
-                message += f"{i}. `{acc['email']}` (استُخدم {acc['use_count']} مرة)\n"
+            return
 
-            if len(available_accounts) > 5:
+        if not counts[tab] and update.callback_query is None:
 
-                message += f"... و {len(available_accounts) - 5} حساب آخر\n"
+            # أول فتح: أول تبويب فيه حسابات
 
-            message += "\n"
+            tab = next(name for name in ACCOUNTS_BROWSER_TABS if counts[name])
 
+            tab_cursors = cursors.setdefault(tab, [None])
 
+            entries, next_cursor, counts = account_manager.browse_accounts(tab, None, ACCOUNTS_PAGE_SIZE)
 
-        if pending_accounts:
+        del tab_cursors[page + 1:]
 
-            message += f"⏳ **في الانتظار ({len(pending_accounts)}):**\n"
+        if next_cursor is not None:
 
-            for i, acc in enumerate(pending_accounts[:3], 1):
+            tab_cursors.append(next_cursor)
 
-                message += f"{i}. `{acc['email']}` - متبقي: {acc['time_left']}\n"
+        pages = max(1, math.ceil(counts[tab] / ACCOUNTS_PAGE_SIZE))
 
-            if len(pending_accounts) > 3:
+        message = f"📋 **كل الحسابات ({total}):**\n\n"
 
-                message += f"... و {len(pending_accounts) - 3} حساب آخر\n"
+        message += f"{ACCOUNTS_BROWSER_TABS[tab]} ({counts[tab]}) - صفحة {page + 1}/{pages}\n\n"
 
-            message += "\n"
+        if not entries:
 
+            message += "📭 مفيش حسابات هنا\n"
 
+        for i, acc in enumerate(entries, page * ACCOUNTS_PAGE_SIZE + 1):
 
-        if cooldown_accounts:
+            if tab == "available":
 
-            message += f"🔄 **في Cooldown ({len(cooldown_accounts)}):**\n"
+                message += f"{i}. `{acc['email']}` (استُخدم {acc['use_count']} مرة)\n"
 
-            for i, acc in enumerate(cooldown_accounts[:3], 1):
+            else:
 
                 message += f"{i}. `{acc['email']}` - متبقي: {acc['time_left']}\n"
 
-            if len(cooldown_accounts) > 3:
-
-                message += f"... و {len(cooldown_accounts) - 3} حساب آخر\n"
-
-
-
         message += f"\n🚀 **ابعت إيميل جديد لإضافة المزيد!**"
 
+        reply_markup = get_accounts_browser_keyboard(tab, page, counts, next_cursor is not None)
 
+        if update.callback_query:
 
-        await update.message.reply_text(message, parse_mode='Markdown')
-
-        account_manager.save_database()
+            await update.callback_query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
 
+        else:
 
+            await update.message.reply_text(message, reply_markup=reply_markup, parse_mode='Markdown')
 
     except Exception as e:
 
         logger.error(f"خطأ في عرض الحسابات: {e}")
 
-        await update.message.reply_text("❌ حدث خطأ في عرض الحسابات")
+        await update.effective_message.reply_text("❌ حدث خطأ في عرض الحسابات")
 
 @error_handler
 
@@ -3011,9 +9658,7 @@ async def show_fixed_password_handler(update: Update, context: ContextTypes.DEFA
 
     # حساب الحسابات بالباسورد الثابت
 
-    fixed_count = sum(1 for email, data in account_manager.db["accounts"].items()
-
-                     if data["password"] == fixed_password)
+    fixed_count = account_manager.count_accounts_with_password(fixed_password)
 
 
 
@@ -3069,11 +9714,11 @@ async def show_settings_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
         f"📊 **معلومات قاعدة البيانات:**\n"
 
-        f"• إجمالي الحسابات: {len(account_manager.db['accounts'])}\n"
+        f"• إجمالي الحسابات: {account_manager.count_accounts()}\n"
 
-        f"• سجلات الأنشطة: {len(account_manager.db['logs'])}\n"
+        f"• سجلات الأنشطة: {len(account_manager.activity)}\n"
 
-        f"• حجم الملف: {os.path.getsize(DB_FILE) if os.path.exists(DB_FILE) else 0} بايت\n\n"
+        f"• حجم الملف: {os.path.getsize(account_manager.database_file) if os.path.exists(account_manager.database_file) else 0} بايت\n\n"
 
         f"🔧 **اختر إعداد للتعديل:**"
 
@@ -3133,9 +9778,11 @@ async def start_edit_password(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     )
 
+    context.user_data['edit_email'] = email
 
+    # النسخة اللي اتعرضت - التعديل بيترفض لو أدمن تاني غيّر الحساب قبل الباسورد الجديد ما يوصل
 
-    context.user_data['edit_email'] = email
+    context.user_data['edit_version'] = account_info['version']
 
     context.user_data['waiting_for_new_password'] = True
 
@@ -3161,31 +9808,41 @@ async def complete_edit_password(update: Update, context: ContextTypes.DEFAULT_T
 
     del context.user_data['edit_email']
 
+    expected_version = context.user_data.pop('edit_version', None)
 
+    async with account_locks.hold(email.lower()):
 
-    success, message = account_manager.update_password(email, new_password)
+        try:
 
+            success, message = account_manager.update_password(email, new_password, expected_version)
 
+        except VersionConflict as conflict:
 
-    if success:
+            await update.message.reply_text(version_conflict_message(conflict), parse_mode='Markdown')
 
-        await update.message.reply_text(
+            return
 
-            f"✅ **تم تعديل الباسورد بنجاح!**\n\n"
 
-            f"📧 **الإيميل:** `{email}`\n"
 
-            f"🔑 **الباسورد الجديد:** `{new_password}`\n\n"
+        if success:
 
-            f"💡 **التفاصيل:** {message}",
+            await update.message.reply_text(
 
-            parse_mode='Markdown'
+                f"✅ **تم تعديل الباسورد بنجاح!**\n\n"
 
-        )
+                f"📧 **الإيميل:** `{email}`\n"
 
-    else:
+                f"🔑 **الباسورد الجديد:** `{new_password}`\n\n"
+
+                f"💡 **التفاصيل:** {message}",
+
+                parse_mode='Markdown'
+
+            )
 
-        await update.message.reply_text(f"❌ **فشل في تعديل الباسورد:** {message}")
+        else:
+
+            await update.message.reply_text(f"❌ **فشل في تعديل الباسورد:** {message}")
 
 @error_handler
 
@@ -3195,39 +9852,47 @@ async def delete_account_handler(update: Update, context: ContextTypes.DEFAULT_T
 
     email = update.message.text.strip()
 
+    async with account_locks.hold(email.lower()):
 
+        # التحقق من وجود الحساب أولاً - والحذف بنفس النسخة اللي اتقرت
 
-    # التحقق من وجود الحساب أولاً
+        account_info = account_manager.get_account_info(email)
 
-    account_info = account_manager.get_account_info(email)
+        if not account_info:
 
-    if not account_info:
+            await update.message.reply_text(f"❌ **الحساب غير موجود:**\n`{email}`", parse_mode='Markdown')
 
-        await update.message.reply_text(f"❌ **الحساب غير موجود:**\n`{email}`", parse_mode='Markdown')
+            return
 
-        return
+        try:
 
+            deleted = account_manager.delete_account(email, account_info['version'])
 
+        except VersionConflict as conflict:
 
-    if account_manager.delete_account(email):
+            await update.message.reply_text(version_conflict_message(conflict), parse_mode='Markdown')
 
-        await update.message.reply_text(
+            return
 
-            f"✅ **تم حذف الحساب بنجاح!**\n\n"
+        if deleted:
 
-            f"📧 **الإيميل المحذوف:** `{email}`\n"
+            await update.message.reply_text(
 
-            f"📊 **كان مستخدم:** {account_info['use_count']} مرة\n"
+                f"✅ **تم حذف الحساب بنجاح!**\n\n"
 
-            f"🗑️ **تم الحذف نهائياً من قاعدة البيانات**",
+                f"📧 **الإيميل المحذوف:** `{email}`\n"
 
-            parse_mode='Markdown'
+                f"📊 **كان مستخدم:** {account_info['use_count']} مرة\n"
 
-        )
+                f"🗑️ **تم الحذف نهائياً من قاعدة البيانات**",
 
-    else:
+                parse_mode='Markdown'
+
+            )
+
+        else:
 
-        await update.message.reply_text(f"❌ **فشل في حذف الحساب:** {email}")
+            await update.message.reply_text(f"❌ **فشل في حذف الحساب:** {email}")
 
 @error_handler
 
@@ -3355,7 +10020,7 @@ async def update_pending_hours(update: Update, context: ContextTypes.DEFAULT_TYP
 
         old_hours = account_manager.db["settings"]["pending_hours"]
 
-        account_manager.db["settings"]["pending_hours"] = hours
+        account_manager.update_setting("pending_hours", hours)
 
         account_manager.add_log("تعديل الإعدادات", f"تم تغيير مدة الانتظار من {old_hours} إلى {hours} ساعة")
 
@@ -3401,7 +10066,7 @@ async def update_cooldown_hours(update: Update, context: ContextTypes.DEFAULT_TY
 
         old_hours = account_manager.db["settings"]["cooldown_hours"]
 
-        account_manager.db["settings"]["cooldown_hours"] = hours
+        account_manager.update_setting("cooldown_hours", hours)
 
         account_manager.add_log("تعديل الإعدادات", f"تم تغيير مدة Cooldown من {old_hours} إلى {hours} ساعة")
 
@@ -3449,13 +10114,23 @@ async def restart_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-    # حفظ البيانات قبل إعادة التشغيل
+    # حفظ البيانات قبل إعادة التشغيل - لو متثبتتش إعادة التشغيل بتتلغي عشان اللي في الطابور ميضيعش
 
     account_manager.add_log("إعادة تشغيل يدوي", "تم طلب إعادة التشغيل من المستخدم")
 
-    account_manager.save_database()
+    if not await account_manager.flush_database_async(DELIVERY_FLUSH_SECONDS):
+
+        await update.message.reply_text(
+
+            "❌ **مقدرتش أثبت البيانات على القرص، فإعادة التشغيل اتلغت.**\n\n"
+
+            "📜 راجع اللوج وجرب تاني.",
+
+            parse_mode='Markdown'
 
+        )
 
+        return
 
     should_restart = True
 
@@ -3463,6 +10138,68 @@ async def restart_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @error_handler
 
+async def show_activity_log_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0, filter_index: int = -1):
+
+    """عرض سجل الأنشطة من ملف السجل مع صفحات وفلترة بنوع العملية"""
+
+    action = ACTIVITY_LOG_FILTERS[filter_index] if 0 <= filter_index < len(ACTIVITY_LOG_FILTERS) else None
+
+    # البحث في الملفات بيتم في thread عشان ميوقفش البوت
+
+    loop = asyncio.get_running_loop()
+
+    entries, has_more = await loop.run_in_executor(
+
+        None,
+
+        lambda: account_manager.activity.query(
+
+            action=action,
+
+            offset=page * ACTIVITY_LOG_PAGE_SIZE,
+
+            limit=ACTIVITY_LOG_PAGE_SIZE
+
+        )
+
+    )
+
+    message = f"📜 **سجل الأنشطة** (صفحة {page + 1})\n"
+
+    if action:
+
+        message += f"🔎 **الفلتر:** {action}\n"
+
+    message += "\n"
+
+    if not entries:
+
+        message += "📭 مفيش سجلات هنا"
+
+    for entry in entries:
+
+        timestamp = datetime.fromisoformat(entry["timestamp"]).strftime('%Y/%m/%d %H:%M')
+
+        message += f"🕒 {timestamp} - **{entry['action']}**\n"
+
+        if entry.get("details"):
+
+            message += f"`{entry['details']}`\n"
+
+        message += "\n"
+
+    reply_markup = get_activity_log_keyboard(page, filter_index if action else -1, has_more)
+
+    if update.callback_query:
+
+        await update.callback_query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+
+    else:
+
+        await update.message.reply_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+
+@error_handler
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     """معالجة أزرار Inline المتقدمة"""
@@ -3501,17 +10238,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             fixed_accounts = []
 
+            for email in account_manager.emails_with_password(fixed_password):
 
+                account_info = account_manager.get_account_info(email)
 
-            for email, data in account_manager.db["accounts"].items():
-
-                if data["password"] == fixed_password:
-
-                    account_info = account_manager.get_account_info(email)
+                if account_info:
 
-                    if account_info:
-
-                        fixed_accounts.append(account_info)
+                    fixed_accounts.append(account_info)
 
 
 
@@ -3561,6 +10294,54 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+        elif query.data.startswith("lease_confirm:"):
+
+            lease_id = query.data.split(":", 1)[1]
+
+            confirmed = account_manager.confirm_lease(lease_id)
+
+            if confirmed:
+
+                await query.message.reply_text(f"✅ **تم تأكيد استلام {confirmed} حساب** وبدأ الـ Cooldown.", parse_mode='Markdown')
+
+            else:
+
+                await query.message.reply_text("⚠️ الدفعة دي اتأكدت أو رجعت للمتاح بالفعل.")
+
+            await query.edit_message_reply_markup(reply_markup=None)
+
+        elif query.data.startswith("lease_release:"):
+
+            lease_id = query.data.split(":", 1)[1]
+
+            released = account_manager.release_lease(lease_id)
+
+            if released:
+
+                await query.message.reply_text(f"↩️ **تم إرجاع {released} حساب** للمتاح.", parse_mode='Markdown')
+
+            else:
+
+                await query.message.reply_text("⚠️ الدفعة دي اتأكدت أو رجعت للمتاح بالفعل.")
+
+            await query.edit_message_reply_markup(reply_markup=None)
+
+        elif query.data == "forecast":
+
+            await show_forecast_handler(update, context)
+
+        elif query.data.startswith("browse:"):
+
+            _, tab, page = query.data.split(":")
+
+            await show_all_accounts_handler(update, context, tab=tab, page=int(page))
+
+        elif query.data.startswith("logs:"):
+
+            _, page, filter_index = query.data.split(":")
+
+            await show_activity_log_handler(update, context, page=int(page), filter_index=int(filter_index))
+
         elif query.data == "edit_pending":
 
             await query.message.reply_text("⏰ ادخل مدة الانتظار الجديدة بالساعات (0-168):")
@@ -3583,17 +10364,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-            backup_filename = f"manual_backup_{timestamp}.json"
-
+            backup_filename = f"manual_backup_{timestamp}{account_manager.backup_suffix}"
 
-
-            # نسخ الملف الأساسي
-
-            import shutil
+            # نسخ الملف الأساسي بعد ضغط الـ journal فيه
 
             backup_path = os.path.join(BACKUP_DIR, backup_filename)
 
-            shutil.copy2(DB_FILE, backup_path)
+            account_manager.write_backup(backup_path)
 
 
 
@@ -3613,9 +10390,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                         f"📅 التاريخ: {datetime.now().strftime('%Y/%m/%d %H:%M')}\n"
 
-                        f"📊 الحسابات: {len(account_manager.db['accounts'])}\n"
+                        f"📊 الحسابات: {account_manager.count_accounts()}\n"
 
-                        f"📜 السجلات: {len(account_manager.db['logs'])}\n"
+                        f"📜 السجلات: {len(account_manager.activity)}\n"
 
                         f"💾 الحجم: {os.path.getsize(backup_path)} بايت"
 
@@ -3653,7 +10430,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
                 f"• {stats['total']} حساب\n"
 
-                f"• {len(account_manager.db['logs'])} سجل نشاط\n"
+                f"• {len(account_manager.activity)} سجل نشاط\n"
 
                 f"• جميع الإعدادات المخصصة\n\n"
 
@@ -3673,79 +10450,107 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             # إنشاء نسخة احتياطية طارئة قبل الحذف
 
-            emergency_backup = f"emergency_before_clear_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            emergency_backup = f"emergency_before_clear_{datetime.now().strftime('%Y%m%d_%H%M%S')}{account_manager.backup_suffix}"
 
             try:
 
-                import shutil
-
-                shutil.copy2(DB_FILE, emergency_backup)
+                account_manager.write_backup(emergency_backup)
 
             except:
 
                 pass
 
+            # حذف كل البيانات
 
+            account_manager.reset_database()
 
-            # حذف كل البيانات
 
-            account_manager.db = {
 
-                "accounts": {},
+            await query.message.reply_text(
 
-                "settings": {
+                f"✅ **تم حذف جميع البيانات بنجاح!**\n\n"
 
-                    "pending_hours": DEFAULT_PENDING_HOURS,
+                f"💾 تم إنشاء نسخة احتياطية طارئة: `{emergency_backup}`\n"
 
-                    "cooldown_hours": DEFAULT_COOLDOWN_HOURS,
+                f"🔄 البوت جاهز للاستخدام من جديد.",
 
-                    "fixed_password": DEFAULT_FIXED_PASSWORD
+                parse_mode='Markdown'
 
-                },
+            )
 
-                "logs": [],
 
-                "stats": {
 
-                    "total_requests": 0,
+        elif query.data == "cancel_clear":
 
-                    "successful_requests": 0,
+            await query.message.reply_text("❌ **تم إلغاء عملية الحذف.**", parse_mode='Markdown')
 
-                    "last_restart": datetime.now().isoformat()
 
-                }
 
-            }
+    except Exception as e:
 
-            account_manager.save_database()
+        logger.error(f"خطأ في معالجة الأزرار: {e}")
 
+        await query.answer("❌ حدث خطأ", show_alert=True)
 
+async def notify_promotions(application: Application, promoted: List[str]):
 
-            await query.message.reply_text(
+    """إشعار الأدمن بالحسابات اللي بقت متاحة"""
 
-                f"✅ **تم حذف جميع البيانات بنجاح!**\n\n"
+    message = f"🔔 **{len(promoted)} حساب بقوا متاحين دلوقتي!**\n\n"
 
-                f"💾 تم إنشاء نسخة احتياطية طارئة: `{emergency_backup}`\n"
+    for i, email in enumerate(promoted[:5], 1):
 
-                f"🔄 البوت جاهز للاستخدام من جديد.",
+        message += f"{i}. `{email}`\n"
 
-                parse_mode='Markdown'
+    if len(promoted) > 5:
 
-            )
+        message += f"... و {len(promoted) - 5} حساب آخر\n"
 
+    for admin_id in ADMIN_IDS:
 
+        # الأخطاء بتتسجل من طابور الإرسال
 
-        elif query.data == "cancel_clear":
+        send_queue.send(application.bot, admin_id, message, parse_mode='Markdown')
 
-            await query.message.reply_text("❌ **تم إلغاء عملية الحذف.**", parse_mode='Markdown')
 
 
+async def promotion_scheduler(application: Application):
 
-    except Exception as e:
+    """تفعيل الحسابات في وقتها: النوم لحد أقرب حساب في الانتظار ثم تفعيل كل اللي وقته جه في كتابة واحدة"""
+
+    while True:
+
+        try:
+
+            promoted = account_manager.promote_due()
+
+            if promoted:
+
+                logger.info(f"⏰ تم تفعيل {len(promoted)} حساب")
+
+                if NOTIFY_PROMOTIONS:
+
+                    await notify_promotions(application, promoted)
+
+            delay = account_manager.seconds_until_next_promotion()
+
+        except Exception as e:
+
+            logger.error(f"خطأ في جدولة تفعيل الحسابات: {e}")
+
+            delay = None
+
+        if delay is None:
+
+            delay = PROMOTION_MAX_SLEEP_SECONDS
+
+        # التقريب لأقرب tick عشان الحسابات اللي وقتها قريب من بعض تتفعل مع بعض
+
+        delay = math.ceil(delay / PROMOTION_TICK_SECONDS) * PROMOTION_TICK_SECONDS
+
+        await asyncio.sleep(min(max(delay, PROMOTION_TICK_SECONDS), PROMOTION_MAX_SLEEP_SECONDS))
 
-        logger.error(f"خطأ في معالجة الأزرار: {e}")
 
-        await query.answer("❌ حدث خطأ", show_alert=True)
 
 def handle_signals():
 
@@ -3763,7 +10568,7 @@ def handle_signals():
 
         account_manager.add_log("إيقاف النظام", f"تم استلام إشارة {signum}")
 
-        account_manager.save_database()
+        account_manager.flush_database(timeout=10)
 
 
 
@@ -3794,10 +10599,9 @@ def handle_signals():
 # إنشاء Flask App
 app = Flask(__name__)
 
-@app.route('/')
-def home():
-    """الصفحة الرئيسية"""
-    stats = account_manager.get_statistics()
+def status_page() -> str:
+    """صفحة الحالة HTML (مشتركة بين Flask والخادم المدمج)"""
+    stats = account_manager.snapshot().statistics()
     return f"""
     <html>
     <head><title>Telegram Bot Status</title></head>
@@ -3812,44 +10616,253 @@ def home():
         </div>
     </body>
     </html>
-    """, 200
+    """
 
-@app.route('/health')
-def health():
-    """فحص صحة البوت"""
-    stats = account_manager.get_statistics()
+def health_status() -> dict:
+    """نتيجة فحص الصحة (مشتركة بين Flask والخادم المدمج)"""
+    stats = account_manager.snapshot().statistics()
     return {
         "status": "running",
         "total_accounts": stats['total'],
         "available": stats['available'],
         "pending": stats['pending'],
         "cooldown": stats['cooldown']
-    }, 200
+    }
+
+def forecast_hours(value) -> int:
+    """طول الـ histogram من ?hours= (الافتراضي FORECAST_HOURS ومحصور بين 1 و168)"""
+    try:
+        hours = FORECAST_HOURS if value is None else int(value)
+    except ValueError:
+        hours = FORECAST_HOURS
+    return min(max(hours, 1), 168)
+
+# التطبيق والـ event loop اللي بيستقبلوا تحديثات الـ webhook (run_bot بيحددهم وبيفضيهم وقت إعادة التشغيل)
+webhook_target = None
+
+async def receive_update(application: Optional[Application], payload: bytes, secret: Optional[str]) -> int:
+    """webhook: التحقق من الـ secret وإضافة التحديث لطابور الـ Application، والرد 200 بعد ما يدخل الطابور بس
+    أي رد تاني بيخلي تيليجرام يعيد الإرسال، فالتحديثات اللي بتوصل وقت إعادة التشغيل مبتضيعش"""
+    if WEBHOOK_SECRET and not hmac.compare_digest((secret or "").encode(), WEBHOOK_SECRET.encode()):
+        return 403
+    if application is None or not application.running:
+        return 503
+    try:
+        update = Update.de_json(json.loads(payload), application.bot)
+    except Exception as e:
+        logger.error(f"خطأ في قراءة تحديث الـ webhook: {e}")
+        return 400
+    await application.update_queue.put(update)
+    return 200
+
+@app.route('/')
+def home():
+    """الصفحة الرئيسية"""
+    return status_page(), 200
+
+@app.route('/health')
+def health():
+    """فحص صحة البوت"""
+    return health_status(), 200
 
 @app.route('/stats')
 def stats_json():
     """إحصائيات JSON"""
-    return account_manager.get_statistics(), 200
+    return account_manager.snapshot().statistics(), 200
+
+@app.route('/forecast')
+def forecast_json():
+    """توقع الإتاحة JSON - ?hours=N لطول الـ histogram (1-168)"""
+    return account_manager.forecast(forecast_hours(request.args.get('hours'))), 200
+
+@app.route('/metrics')
+def metrics_text():
+    """قياسات الأداء بصيغة Prometheus text"""
+    return metrics.prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    """webhook تيليجرام في وضع flask: التحديث بيتحط في طابور الـ Application على event loop البوت"""
+    if (request.content_length or 0) > WEBHOOK_MAX_BYTES:
+        return "Payload Too Large", 413
+    target = webhook_target
+    if target is None:
+        return "Service Unavailable", 503
+    application, loop = target
+    status = asyncio.run_coroutine_threadsafe(
+        receive_update(application, request.get_data(), request.headers.get("X-Telegram-Bot-Api-Secret-Token")), loop
+    ).result(timeout=10)
+    return "", status
+
+class StatusServer:
+    """خادم HTTP/1.1 صغير على asyncio بنفس endpoints الـ Flask (SERVE_MODE=integrated)
+    بيشتغل على نفس الـ event loop بتاع البوت، فالقراءة من المدير بتحصل في نفس الخيط اللي بيعدل ومفيش خيط تاني"""
+
+    HTML_TYPE = "text/html; charset=utf-8"
+    JSON_TYPE = "application/json"
+    METRICS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    TEXT_TYPE = "text/plain; charset=utf-8"
+    REASONS = {
+        200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+        413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"
+    }
 
-def run_bot():
-    """تشغيل البوت في خيط منفصل مع event loop جديد"""
-    global should_restart
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._connections = set()
+        # الـ Application اللي بيستقبل تحديثات WEBHOOK_PATH (run_bot بيحدده في وضع webhook)
+        self.webhook = None
+        # المسار -> دالة بتاخد الـ query وترجع (الكود، نوع المحتوى، النص)
+        self.routes = {
+            "/": lambda query: (200, self.HTML_TYPE, status_page()),
+            "/health": lambda query: (200, self.JSON_TYPE, self._json(health_status())),
+            "/stats": lambda query: (200, self.JSON_TYPE, self._json(account_manager.snapshot().statistics())),
+            "/forecast": lambda query: (
+                200, self.JSON_TYPE, self._json(account_manager.forecast(forecast_hours(query.get("hours", [None])[0])))
+            ),
+            "/metrics": lambda query: (200, self.METRICS_TYPE, metrics.prometheus())
+        }
+
+    @staticmethod
+    def _json(payload) -> str:
+        return json.dumps(payload, ensure_ascii=False)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🌐 الخادم المدمج يعمل على المنفذ {self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # اتصالات keep-alive المفتوحة (زي اللي تيليجرام بيعيد عليها) بتتقفل عشان wait_closed بيستناها
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _dispatch(self, method: str, target: str, headers: dict, body: bytes) -> Tuple[int, str, str]:
+        parts = urlsplit(target)
+        if parts.path == WEBHOOK_PATH and method == "POST":
+            status = await receive_update(self.webhook, body, headers.get("x-telegram-bot-api-secret-token"))
+            return status, self.TEXT_TYPE, self.REASONS[status]
+        if method not in ("GET", "HEAD"):
+            return 405, self.TEXT_TYPE, self.REASONS[405]
+        route = self.routes.get(parts.path)
+        if route is None:
+            return 404, self.TEXT_TYPE, self.REASONS[404]
+        try:
+            return route(parse_qs(parts.query))
+        except Exception as e:
+            logger.error(f"خطأ في طلب {parts.path}: {e}")
+            return 500, self.TEXT_TYPE, self.REASONS[500]
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """طلب ورا طلب على نفس الاتصال (keep-alive) لحد ما العميل يقفل أو يسكت STATUS_KEEPALIVE_SECONDS"""
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), STATUS_KEEPALIVE_SECONDS)
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    method, target, version, length = None, "/", "HTTP/1.0", 0
+                if method is None:
+                    status, content_type, body = 400, self.TEXT_TYPE, self.REASONS[400]
+                elif length > WEBHOOK_MAX_BYTES:
+                    # الـ body مش هيتقري فالاتصال لازم يتقفل بعد الرد
+                    method = None
+                    status, content_type, body = 413, self.TEXT_TYPE, self.REASONS[413]
+                else:
+                    # الـ body لازم يتقري حتى لو مش مستخدم عشان الطلب اللي بعده على نفس الاتصال
+                    payload = await reader.readexactly(length) if length else b""
+                    status, content_type, body = await self._dispatch(method, target, headers, payload)
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                keep_alive = keep_alive and method is not None
+                payload = body.encode("utf-8")
+                head = (
+                    f"HTTP/1.1 {status} {self.REASONS[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                ).encode("latin-1")
+                writer.write(head if method == "HEAD" else head + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"خطأ في اتصال الخادم المدمج: {e}")
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+def stop_on_signals(loop: asyncio.AbstractEventLoop):
+    """الوضع المدمج: الإشارات بتوقف الـ event loop نفسه فالبوت والخادم بيقفلوا بالترتيب (SIGUSR1 بيعيد التشغيل)"""
+    def on_signal(signum):
+        global should_restart
+        logger.info(f"تم استلام إشارة {signum}")
+        account_manager.add_log("إيقاف النظام", f"تم استلام إشارة {signum}")
+        account_manager.flush_database(timeout=10)
+        if signum == getattr(signal, 'SIGUSR1', None):
+            should_restart = True
+        loop.stop()
+
+    for signum in (signal.SIGINT, signal.SIGTERM, getattr(signal, 'SIGUSR1', None)):
+        if signum is not None:
+            loop.add_signal_handler(signum, on_signal, signum)
+
+def build_application(builder=None) -> Application:
+    """الـ Application بكل الـ handlers - builder لـ Bot API تاني (زي benchmarks/bench_load.py) وإلا BOT_TOKEN وBOT_API_URL"""
+    if builder is None:
+        builder = (
+            Application.builder().token(BOT_TOKEN)
+            .base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+        )
+    # تحديثات الأدمنز المختلفين بالتوازي بدل ما كل تحديث يستنى اللي قبله
+    # نفس حدود طابور الإرسال على كل طلبات الـ Bot API حتى اللي بتتبعت مباشرة من الـ handlers
+    application = builder.concurrent_updates(PerUserUpdateProcessor()).rate_limiter(SendRateLimiter(send_queue)).build()
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("restore", restore_command))
+    application.add_handler(CommandHandler("perf", perf_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.Document.ALL, import_document_handler))
+    application.add_handler(CallbackQueryHandler(button_callback))
+    return application
+
+def run_bot(status_server: Optional[StatusServer] = None):
+    """تشغيل البوت مع event loop جديد - في خيط منفصل جنب Flask، أو في الخيط الرئيسي مع status_server على نفس الـ loop"""
+    global should_restart, webhook_target
 
     # إنشاء event loop جديد للـ thread
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    if status_server is not None:
+        stop_on_signals(loop)
 
     while True:
         should_restart = False
+        promotion_task = None
 
         try:
             logger.info("🚀 بدء تشغيل البوت...")
 
             # تعطيل signal handlers في الـ thread
-            application = Application.builder().token(BOT_TOKEN).build()
-            application.add_handler(CommandHandler("start", start))
-            application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-            application.add_handler(CallbackQueryHandler(button_callback))
+            application = build_application()
 
             logger.info("✅ البوت يعمل بنجاح!")
             
@@ -3860,9 +10873,23 @@ def run_bot():
             loop.run_until_complete(
                 application.start()
             )
-            loop.run_until_complete(
-                application.updater.start_polling(drop_pending_updates=True)
-            )
+            if UPDATE_MODE == "webhook" and WEBHOOK_URL:
+                # تيليجرام بيحتفظ بالتحديثات ويعيد إرسالها لحد ما الـ webhook يرد 200، فمفيش drop_pending_updates
+                loop.run_until_complete(application.bot.set_webhook(
+                    f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None, allowed_updates=Update.ALL_TYPES
+                ))
+                webhook_target = (application, loop)
+                if status_server is not None:
+                    status_server.webhook = application
+            else:
+                loop.run_until_complete(
+                    application.updater.start_polling(drop_pending_updates=True)
+                )
+            # تفعيل الحسابات في وقتها على نفس الـ event loop
+            promotion_task = loop.create_task(promotion_scheduler(application))
+            # الـ endpoints على نفس الـ event loop (SERVE_MODE=integrated)
+            if status_server is not None:
+                loop.run_until_complete(status_server.start())
             
             # Keep running
             loop.run_forever()
@@ -3882,8 +10909,18 @@ def run_bot():
             should_restart = True
 
         finally:
+            if promotion_task is not None:
+                promotion_task.cancel()
+            # التحديثات اللي بتوصل من هنا بترجع 503 وتيليجرام بيعيد إرسالها بعد إعادة التشغيل
+            webhook_target = None
             try:
-                loop.run_until_complete(application.updater.stop())
+                if status_server is not None:
+                    status_server.webhook = None
+                    loop.run_until_complete(status_server.stop())
+                # الرسايل اللي لسه في طابور الإرسال بتتبعت قبل إيقاف الـ bot
+                loop.run_until_complete(send_queue.flush(SEND_DRAIN_SECONDS))
+                if application.updater.running:
+                    loop.run_until_complete(application.updater.stop())
                 loop.run_until_complete(application.stop())
                 loop.run_until_complete(application.shutdown())
             except:
@@ -3902,14 +10939,27 @@ def run_bot():
 def main():
     """الدالة الرئيسية - Web Service مع Flask"""
     logger.info("🌐 بدء تشغيل Web Service...")
+    # مجموعة عمليات الاستخراج (fork) قبل أي thread، وبعدها النسخ الاحتياطي في الخلفية
+    start_parse_pool()
+    account_manager.setup_auto_backup()
+    port = int(os.environ.get("PORT", 5000))
+    if UPDATE_MODE == "webhook" and not WEBHOOK_URL:
+        logger.error("❌ UPDATE_MODE=webhook محتاج WEBHOOK_URL - هيتم استخدام polling")
+
+    if SERVE_MODE == "integrated":
+        # عملية واحدة: البوت والـ endpoints على نفس الـ event loop في الخيط الرئيسي
+        run_bot(StatusServer('0.0.0.0', port))
+        return
 
     # تشغيل البوت في خيط منفصل
     bot_thread = threading.Thread(target=run_bot, daemon=True)
     bot_thread.start()
     logger.info("🤖 البوت يعمل في الخلفية")
 
+    # تثبيت طابور الكتابة عند الإيقاف
+    handle_signals()
+
     # تشغيل Flask (Web Service)
-    port = int(os.environ.get("PORT", 5000))
     logger.info(f"🌐 Flask يعمل على المنفذ {port}")
     app.run(host='0.0.0.0', port=port, debug=False)
 
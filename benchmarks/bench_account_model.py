@@ -0,0 +1,136 @@
+"""قياس الذاكرة وسرعة الوصول: سجل الحساب كـ dict (شكل JSON) مقابل Account (dataclass بـ __slots__)
+
+الذاكرة بتتقاس بـ tracemalloc لكل الحسابات (الإيميلات مشتركة فمتتحسبش)،
+والسرعة لعمليات البوت المعتادة على كل سجل: قراءة وقت الإتاحة والحالة، تحديث copy-on-write
+زي get_available_account، والتحويل من وإلى JSON (تحميل الـ snapshot وكتابته).
+
+التشغيل:
+    python benchmarks/bench_account_model.py
+"""
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_account_model_"))
+
+from app import Account, AccountStatus  # noqa: E402
+
+COUNT = 100_000
+COOLDOWN_HOURS = 36
+REPEATS = 3
+
+
+def make_accounts(count: int, now: datetime) -> dict:
+    """حسابات عشوائية بنفس شكل accounts_db.json"""
+    rng = random.Random(count)
+    accounts = {}
+    for i in range(count):
+        status = rng.choice(["pending", "available", "used"])
+        accounts[f"user{i}@example.com"] = {
+            "password": f"pass{rng.randint(0, 99_999)}",
+            "added_at": (now - timedelta(seconds=rng.randint(0, 10_000_000), microseconds=rng.randint(0, 999_999))).isoformat(),
+            "available_at": (now + timedelta(seconds=rng.randint(-200_000, 200_000), microseconds=rng.randint(0, 999_999))).isoformat(),
+            "status": status,
+            "last_used": None if status == "pending" else (now - timedelta(seconds=rng.randint(0, 100_000))).isoformat(),
+            "use_count": rng.randint(0, 20),
+            "priority": rng.randint(1, 3)
+        }
+    return accounts
+
+
+def allocated_mb(build) -> float:
+    """الذاكرة اللي فضلت محجوزة بعد build (النتيجة بتفضل عايشة لحد نهاية القياس)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / 1024 / 1024
+
+
+def timed(func, *args) -> float:
+    """أفضل زمن بالملي ثانية من REPEATS مرات"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def due_dicts(accounts: dict, now_ts: float) -> int:
+    return sum(
+        1 for data in accounts.values()
+        if datetime.fromisoformat(data["available_at"]).timestamp() <= now_ts and data["status"] != "pending"
+    )
+
+
+def due_records(accounts: dict, now_ts: float) -> int:
+    return sum(
+        1 for data in accounts.values()
+        if data.available_at <= now_ts and data.status != AccountStatus.PENDING
+    )
+
+
+def use_dicts(accounts: dict, now: datetime):
+    """نفس تحديث get_available_account: سجل جديد لكل حساب"""
+    for email, data in accounts.items():
+        data = dict(data)
+        data["status"] = "used"
+        data["last_used"] = now.isoformat()
+        data["use_count"] += 1
+        data["available_at"] = (now + timedelta(hours=COOLDOWN_HOURS)).isoformat()
+        accounts[email] = data
+
+
+def use_records(accounts: dict, now: datetime):
+    for email, data in accounts.items():
+        accounts[email] = data.evolve(
+            status=AccountStatus.USED,
+            last_used=now.timestamp(),
+            use_count=data.use_count + 1,
+            available_at=(now + timedelta(hours=COOLDOWN_HOURS)).timestamp()
+        )
+
+
+def main():
+    now = datetime.now()
+    accounts = make_accounts(COUNT, now)
+    payload = json.dumps(accounts, ensure_ascii=False)
+    records = {email: Account.from_dict(data) for email, data in accounts.items()}
+
+    # التحويل لازم يرجع نفس شكل JSON بالظبط
+    assert {email: record.to_dict() for email, record in records.items()} == accounts
+    assert due_dicts(accounts, now.timestamp()) == due_records(records, now.timestamp())
+
+    dict_mb = allocated_mb(lambda: json.loads(payload))
+    record_mb = allocated_mb(lambda: {email: Account.from_dict(data) for email, data in json.loads(payload).items()})
+    # الإيميلات موجودة في الحالتين فبتتشال من الاتنين
+    email_mb = allocated_mb(lambda: list(json.loads(payload)))
+    print(f"{COUNT} accounts")
+    print(f"{'':>26} {'dicts':>10} {'Account':>10}")
+    print(f"{'memory MB':>26} {dict_mb - email_mb:>10.1f} {record_mb - email_mb:>10.1f}")
+
+    rows = [
+        ("due scan ms", timed(due_dicts, accounts, now.timestamp()), timed(due_records, records, now.timestamp())),
+        ("copy-on-write use ms", timed(use_dicts, dict(accounts), now), timed(use_records, dict(records), now)),
+        ("load from JSON ms", timed(json.loads, payload),
+         timed(lambda: {email: Account.from_dict(data) for email, data in json.loads(payload).items()})),
+        ("dump to JSON ms", timed(lambda: json.dumps(accounts, ensure_ascii=False)),
+         timed(lambda: json.dumps(records, ensure_ascii=False, default=Account.json_default))),
+    ]
+    for name, legacy, record in rows:
+        print(f"{name:>26} {legacy:>10.1f} {record:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
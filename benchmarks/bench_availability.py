@@ -0,0 +1,100 @@
+"""قياس سرعة اختيار الحساب المتاح: الفحص الكامل القديم مقابل فهرس الـ heap
+
+التشغيل:
+    python benchmarks/bench_availability.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_availability_"))
+
+from app import Account, AccountStatus, AvailabilityIndex  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+COOLDOWN_HOURS = 36
+
+
+def make_accounts(count: int, now: datetime) -> dict:
+    """حسابات عشوائية: نصها متاح ونصها في الانتظار أو cooldown"""
+    rng = random.Random(count)
+    accounts = {}
+    for i in range(count):
+        offset = timedelta(minutes=rng.randint(-72 * 60, 72 * 60))
+        accounts[f"user{i}@example.com"] = {
+            "password": "pass123",
+            "added_at": now.isoformat(),
+            "available_at": (now + offset).isoformat(),
+            "status": rng.choice(["pending", "available", "used"]),
+            "last_used": None,
+            "use_count": rng.randint(0, 20),
+            "priority": rng.randint(1, 3)
+        }
+    return accounts
+
+
+def legacy_pick(accounts: dict, now: datetime):
+    """نفس خوارزمية get_available_account القديمة (فحص وترتيب كل الحسابات)"""
+    available_accounts = []
+    for email, data in accounts.items():
+        available_at = datetime.fromisoformat(data["available_at"])
+        if available_at <= now and data["status"] in ["pending", "available", "used"]:
+            available_accounts.append((email, data, available_at))
+    if not available_accounts:
+        return None
+    available_accounts.sort(key=lambda x: (x[1].get("priority", 1), x[2], x[1].get("use_count", 0)))
+    return available_accounts[0][0]
+
+
+def checkout(accounts: dict, email: str, now: datetime):
+    data = accounts[email]
+    data["status"] = "used"
+    data["use_count"] += 1
+    data["available_at"] = (now + timedelta(hours=COOLDOWN_HOURS)).isoformat()
+
+
+def checkout_record(accounts: dict, email: str, now: datetime):
+    data = accounts[email]
+    accounts[email] = data.evolve(status=AccountStatus.USED, use_count=data.use_count + 1,
+                                  available_at=(now + timedelta(hours=COOLDOWN_HOURS)).timestamp())
+
+
+def bench_legacy(count: int, picks: int) -> float:
+    now = datetime.now()
+    accounts = make_accounts(count, now)
+    start = time.perf_counter()
+    for _ in range(picks):
+        email = legacy_pick(accounts, now)
+        checkout(accounts, email, now)
+    return (time.perf_counter() - start) / picks
+
+
+def bench_index(count: int, picks: int) -> float:
+    now = datetime.now()
+    accounts = {email: Account.from_dict(data) for email, data in make_accounts(count, now).items()}
+    index = AvailabilityIndex()
+    index.build(accounts)
+    start = time.perf_counter()
+    for _ in range(picks):
+        email = index.pop_ready(now.timestamp(), accounts)
+        checkout_record(accounts, email, now)
+        index.push(email, accounts[email])
+    return (time.perf_counter() - start) / picks
+
+
+def main():
+    print(f"{'accounts':>10} {'scan ms/pick':>14} {'heap ms/pick':>14} {'speed-up':>10}")
+    for count in SIZES:
+        legacy = bench_legacy(count, picks=max(5, 20_000 // count))
+        # أول سحب بيشمل نقل الحسابات المتاحة للـ heap، فنقيس عدد كبير من السحبات
+        indexed = bench_index(count, picks=min(count // 4, 5_000))
+        print(f"{count:>10} {legacy * 1000:>14.3f} {indexed * 1000:>14.4f} {legacy / indexed:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""قياس الذاكرة وسرعة الفحص: قاموس الحسابات المتداخل مقابل الأعمدة (AccountColumns)
+
+التشغيل:
+    python benchmarks/bench_columns.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_columns_"))
+
+from app import Account, AccountColumns  # noqa: E402
+
+COUNT = 100_000
+FIXED_PASSWORD = "PsPcXbox999"
+REPEATS = 5
+
+
+def make_accounts(count: int, now: datetime) -> dict:
+    """حسابات عشوائية: ربعها بالباسورد الثابت والباقي باسوردات مختلفة"""
+    rng = random.Random(count)
+    accounts = {}
+    for i in range(count):
+        offset = timedelta(minutes=rng.randint(-72 * 60, 72 * 60))
+        password = FIXED_PASSWORD if rng.random() < 0.25 else f"pass{rng.randint(0, 5_000)}"
+        accounts[f"user{i}@example.com"] = {
+            "password": password,
+            "added_at": now.isoformat(),
+            "available_at": (now + offset).isoformat(),
+            "status": rng.choice(["pending", "available", "used"]),
+            "last_used": None,
+            "use_count": rng.randint(0, 20),
+            "priority": rng.randint(1, 3)
+        }
+    return accounts
+
+
+def deep_size(obj, seen=None) -> int:
+    """حجم الكائن وكل اللي جواه (كل كائن بيتحسب مرة واحدة)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+def columns_size(columns: AccountColumns) -> int:
+    """حجم الأعمدة والفهارس (الإيميلات نفسها مشتركة مع القاموس فمتتحسبش)"""
+    size = sys.getsizeof(columns.emails) + sys.getsizeof(columns._rows) + deep_size(columns._groups)
+    for column in (columns.available_at, columns.status, columns.use_count, columns.priority, columns.password_group):
+        size += sys.getsizeof(column)
+    return size
+
+
+def legacy_scan(accounts: dict, now: datetime) -> tuple:
+    """نفس تقسيم show_all_accounts القديم: قراءة كل تاريخ نصي (أي حالة غير الانتظار في الـ cooldown زي المحجوز)"""
+    available, pending, cooldown = [], [], []
+    for email, data in accounts.items():
+        available_at = datetime.fromisoformat(data["available_at"])
+        if available_at <= now:
+            available.append(email)
+        elif data["status"] == "pending":
+            pending.append(email)
+        else:
+            cooldown.append(email)
+    return available, pending, cooldown
+
+
+def columns_scan(columns: AccountColumns, now_ts: float) -> tuple:
+    available, pending, cooldown = columns.partition(now_ts)
+    return [columns.emails[row] for row in available], pending, cooldown
+
+
+def timed(func, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    now = datetime.now()
+    accounts = make_accounts(COUNT, now)
+    columns = AccountColumns()
+    columns.build({email: Account.from_dict(data) for email, data in accounts.items()})
+
+    legacy_groups = legacy_scan(accounts, now)
+    columns_groups = columns_scan(columns, now.timestamp())
+    assert legacy_groups[0] == columns_groups[0]
+    assert [len(group) for group in legacy_groups] == [len(group) for group in columns_groups]
+    assert columns.count_password(FIXED_PASSWORD) == sum(
+        1 for data in accounts.values() if data["password"] == FIXED_PASSWORD
+    )
+
+    # الإيميلات مشتركة بين الطريقتين فبتتشال من حجم القاموس
+    email_bytes = sum(sys.getsizeof(email) for email in accounts)
+    dict_mb = (deep_size(accounts) - email_bytes) / 1024 / 1024
+    columns_mb = columns_size(columns) / 1024 / 1024
+
+    print(f"{COUNT} accounts")
+    print(f"{'':>28} {'dicts':>10} {'columns':>10}")
+    print(f"{'memory MB':>28} {dict_mb:>10.1f} {columns_mb:>10.1f}")
+    rows = [
+        ("status partition ms", timed(legacy_scan, accounts, now), timed(columns_scan, columns, now.timestamp())),
+        ("fixed-password count ms",
+         timed(lambda: sum(1 for data in accounts.values() if data["password"] == FIXED_PASSWORD)),
+         timed(columns.count_password, FIXED_PASSWORD)),
+        ("fixed-password list ms",
+         timed(lambda: [email for email, data in accounts.items() if data["password"] == FIXED_PASSWORD]),
+         timed(columns.emails_with_password, FIXED_PASSWORD)),
+    ]
+    for name, legacy, columnar in rows:
+        print(f"{name:>28} {legacy:>10.2f} {columnar:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""فحص تعديل الحسابات من أكتر من أدمن في نفس الوقت على الـ Application الحقيقي (build_application)
+
+الـ handlers بتقرا الحساب ونسخته، والتعديل بيرجع بالنسخة دي (compare-and-set تحت قفل المدير)،
+ومن أول القراءة لحد الرد على الأدمن ماسكين قفل الإيميل في app.account_locks.
+كل طلب للـ Bot API الوهمي بياخد RTT_SECONDS، فالوقت كله في الـ await على تيليجرام مش في قفل المدير.
+السيناريوهات:
+- أدمن واحد بيعدل باسورد إيميلين ورا بعض (المرجع)
+- أدمنين كل واحد بيعدل إيميل مختلف في نفس الوقت: لازم ياخدوا تقريباً نفس وقت التعديل الواحد وينجحوا الاتنين
+- أدمنين فاتحين نفس الإيميل: التاني يعدل الأول، والأول لما يبعت الباسورد ياخد رسالة التعارض وباسورد التاني يفضل
+- أدمن فاتح إيميل للتعديل وأدمن تاني حذفه: التعديل يترفض برسالة التعارض
+- تعديل وحذف نفس الإيميل في نفس اللحظة: بيتنفذوا ورا بعض (التعديل نجح والحذف بعده، أو الحذف والتعديل ياخد التعارض)
+  ومفيش أقفال فاضلة بعدها
+- أدمن باعت رسايل أكتر من UPDATE_CONCURRENCY ورا بعض: رسالة أدمن تاني بتترد في وقت رسالة واحدة مش بعد الطابور
+
+التشغيل:
+    python benchmarks/bench_concurrent_edits.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="bench_concurrent_edits_"))
+
+import logging  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+import app  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, TypeHandler  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+RTT_SECONDS = 0.05
+ADMIN_A = 7_100_001
+ADMIN_B = 7_100_002
+EDIT_MENU = "🔑 تعديل باسورد"
+DELETE_MENU = "🗑️ حذف حساب"
+CONFLICT_MARK = "تعارض"
+STATS_MENU = "📊 الإحصائيات"
+
+
+class SlowBotRequest(BaseRequest):
+    """Bot API جوه العملية بتأخير RTT_SECONDS لكل طلب"""
+
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        params = request_data.parameters if request_data is not None else {}
+        await asyncio.sleep(RTT_SECONDS)
+        result = await self.api.call(url.rsplit("/", 1)[-1], params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class Admins:
+    """بيبعت رسايل نصية كأدمن وبيستنى الـ handler يخلص"""
+
+    def __init__(self, application: Application, api: FakeBotAPI):
+        self.application = application
+        self.api = api
+        self.update_id = 0
+        self.done = {}
+        application.add_handler(TypeHandler(Update, self._handled), group=1)
+
+    async def _handled(self, update: Update, context):
+        event = self.done.pop(update.update_id, None)
+        if event is not None:
+            event.set()
+
+    async def say(self, admin_id: int, text: str) -> list:
+        """رسالة من الأدمن - بيرجع نصوص ردود البوت عليها"""
+        self.update_id += 1
+        data = {
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.update_id,
+                "date": int(time.time()),
+                "chat": {"id": admin_id, "type": "private"},
+                "from": {"id": admin_id, "is_bot": False, "first_name": f"Admin {admin_id}"},
+                "text": text
+            }
+        }
+        update = Update.de_json(data, self.application.bot)
+        event = self.done[update.update_id] = asyncio.Event()
+        first_call = len(self.api.calls)
+        await self.application.update_queue.put(update)
+        await event.wait()
+        return [params.get("text", "") for _, method, params in self.api.calls[first_call:]
+                if method == "sendMessage" and int(params.get("chat_id", 0)) == admin_id]
+
+    async def edit(self, admin_id: int, email: str, password: str) -> list:
+        await self.say(admin_id, EDIT_MENU)
+        await self.say(admin_id, email)
+        return await self.say(admin_id, password)
+
+
+def password_of(email: str) -> str:
+    info = app.account_manager.get_account_info(email)
+    return info["password"] if info else None
+
+
+async def run() -> bool:
+    for index in range(7):
+        app.account_manager.add_account(f"shared{index}@example.com", f"old{index}")
+    app.ADMIN_IDS.extend([ADMIN_A, ADMIN_B])
+    # الفحص على التوازي مش على حدود الإرسال
+    app.send_queue = app.SendQueue(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+
+    api = FakeBotAPI([])
+    application = app.build_application(
+        Application.builder().token("123456:EDITS").request(SlowBotRequest(api))
+        .get_updates_request(SlowBotRequest(api)).updater(None)
+    )
+    admins = Admins(application, api)
+    await application.initialize()
+    await application.start()
+    checks = []
+
+    start = time.perf_counter()
+    await admins.edit(ADMIN_A, "shared0@example.com", "a-first")
+    await admins.edit(ADMIN_A, "shared1@example.com", "a-second")
+    sequential = time.perf_counter() - start
+    checks.append(("one admin, two emails one after the other", sequential,
+                   password_of("shared0@example.com") == "a-first" and password_of("shared1@example.com") == "a-second"))
+
+    start = time.perf_counter()
+    await asyncio.gather(admins.edit(ADMIN_A, "shared2@example.com", "a-new"),
+                         admins.edit(ADMIN_B, "shared3@example.com", "b-new"))
+    parallel = time.perf_counter() - start
+    checks.append(("two admins, different emails at once", parallel,
+                   password_of("shared2@example.com") == "a-new" and password_of("shared3@example.com") == "b-new"
+                   and parallel < sequential * 0.75))
+
+    start = time.perf_counter()
+    await admins.say(ADMIN_A, EDIT_MENU)
+    await admins.say(ADMIN_A, "shared4@example.com")
+    b_replies = await admins.edit(ADMIN_B, "shared4@example.com", "b-wins")
+    a_replies = await admins.say(ADMIN_A, "a-stale")
+    checks.append(("two admins, same email (stale edit rejected)", time.perf_counter() - start,
+                   password_of("shared4@example.com") == "b-wins"
+                   and not any(CONFLICT_MARK in text for text in b_replies)
+                   and any(CONFLICT_MARK in text for text in a_replies)))
+
+    start = time.perf_counter()
+    await admins.say(ADMIN_A, EDIT_MENU)
+    await admins.say(ADMIN_A, "shared5@example.com")
+    await admins.say(ADMIN_B, DELETE_MENU)
+    await admins.say(ADMIN_B, "shared5@example.com")
+    a_replies = await admins.say(ADMIN_A, "a-after-delete")
+    checks.append(("edit of an account deleted meanwhile", time.perf_counter() - start,
+                   password_of("shared5@example.com") is None and any(CONFLICT_MARK in text for text in a_replies)))
+
+    start = time.perf_counter()
+    await admins.say(ADMIN_A, EDIT_MENU)
+    await admins.say(ADMIN_A, "shared6@example.com")
+    await admins.say(ADMIN_B, DELETE_MENU)
+    a_replies, b_replies = await asyncio.gather(admins.say(ADMIN_A, "a-racing"),
+                                                admins.say(ADMIN_B, "shared6@example.com"))
+    edited = any("تم تعديل الباسورد" in text for text in a_replies)
+    conflicted = any(CONFLICT_MARK in text for text in a_replies)
+    checks.append(("edit and delete of one email at once", time.perf_counter() - start,
+                   password_of("shared6@example.com") is None and edited != conflicted
+                   and any("تم حذف الحساب" in text for text in b_replies) and not len(app.account_locks)))
+
+    burst = [asyncio.create_task(admins.say(ADMIN_A, STATS_MENU)) for _ in range(app.UPDATE_CONCURRENCY + 8)]
+    await asyncio.sleep(RTT_SECONDS)
+    start = time.perf_counter()
+    b_replies = await admins.say(ADMIN_B, STATS_MENU)
+    other = time.perf_counter() - start
+    await asyncio.gather(*burst)
+    checks.append((f"other admin during a {len(burst)}-update burst", other, bool(b_replies) and other < RTT_SECONDS * 4))
+
+    await app.send_queue.flush(10)
+    await application.stop()
+    await application.shutdown()
+
+    print(f"RTT {RTT_SECONDS * 1000:.0f} ms per Bot API call, backend {os.environ.get('STORAGE_BACKEND', 'json')}")
+    print(f"{'scenario':<46} {'seconds':>8} {'result':>7}")
+    for name, seconds, ok in checks:
+        print(f"{name:<46} {seconds:>8.2f} {'ok' if ok else 'FAIL':>7}")
+    return all(ok for _, _, ok in checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
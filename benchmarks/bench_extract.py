@@ -0,0 +1,70 @@
+"""التحقق من مخرجات استخراج الحسابات مقابل الـ golden corpus وقياس السرعة بالسطر/ثانية
+
+التشغيل:
+    python benchmarks/bench_extract.py
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_FILE = os.path.join(BENCH_DIR, "data", "credentials_golden.json")
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+os.chdir(tempfile.mkdtemp(prefix="bench_extract_"))
+
+from app import account_manager  # noqa: E402
+
+PASTE_SIZES = [500, 5_000, 50_000]
+SEPARATORS = [" ", ":", "|", " | ", "\n", ";", ",", "\t", "="]
+
+
+def check_golden() -> bool:
+    """مقارنة المخرجات بالـ golden corpus"""
+    with open(GOLDEN_FILE, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    failures = 0
+    for number, case in enumerate(cases, 1):
+        result = [list(pair) for pair in account_manager.extract_credentials(case["input"])]
+        if result != case["expected"]:
+            failures += 1
+            print(f"✗ case {number}: {case['input'][:60]!r}")
+            print(f"    expected {case['expected']}")
+            print(f"    got      {result}")
+
+    print(f"golden corpus: {len(cases) - failures}/{len(cases)} cases match")
+    return failures == 0
+
+
+def make_paste(count: int) -> str:
+    rng = random.Random(count)
+    lines = []
+    for i in range(count):
+        email = f"user{i}@{rng.choice(['gmail.com', 'yahoo.com', 'outlook.com'])}"
+        password = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789!#$") for _ in range(rng.randint(6, 14)))
+        lines.append(f"{email}{rng.choice(SEPARATORS)}{password}")
+    return "\n".join(lines)
+
+
+def main():
+    ok = check_golden()
+
+    print(f"{'combos':>8} {'lines':>8} {'seconds':>9} {'lines/s':>12} {'found':>8}")
+    for count in PASTE_SIZES:
+        text = make_paste(count)
+        line_count = text.count("\n") + 1
+        start = time.perf_counter()
+        credentials = account_manager.extract_credentials(text)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>8} {line_count:>8} {elapsed:>9.3f} {line_count / elapsed:>12,.0f} {len(credentials):>8}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
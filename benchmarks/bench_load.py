@@ -0,0 +1,265 @@
+"""اختبار حمل من أول لآخر: الـ Application الحقيقي (build_application) بتحديثات تيليجرام مصطنعة
+
+الـ Bot API وهمي جوه نفس العملية (FakeBotRequest بيرد من FakeBotAPI من غير شبكة)، والتحديثات بتدخل
+update_queue زي ما الـ webhook بيعمل. ADMINS أدمن وهمي كل واحد بيبعت التحديث اللي بعده لما اللي قبله يخلص
+(closed loop)، بخليط من "📥 طلب حساب" والإحصائيات ولصق حسابات كتير وأزرار inline.
+
+الزمن من دخول التحديث الطابور لحد ما الـ handler يخلص (الإرسال نفسه في طابور الإرسال بعد كده)،
+وحجم الكتابة من wchar في /proc/self/io (كل الكتابة للملفات - اللوج مقفول) وعدد الكتابات للقاعدة من app.metrics
+(دفعات الـ journal والـ snapshots في json، والـ transactions في sqlite).
+كل حجم قاعدة بيشتغل في عملية جديدة ومجلد جديد.
+
+التشغيل:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --accounts 1000,100000 --updates 5000 --mix get=50,stats=20,bulk=5,callback=25
+    STORAGE_BACKEND=sqlite python benchmarks/bench_load.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ACCOUNTS = "1000,10000,100000"
+DEFAULT_MIX = "get=40,stats=25,bulk=5,callback=30"
+FIRST_ADMIN_ID = 7_000_000
+# عمليات التخزين اللي بتكتب فعلاً على القرص (أسماء metrics بنوع storage)
+WRITE_OPERATIONS = ("_write_journal_lines", "_write_snapshot", "_journal")
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("get", "stats", "bulk", "callback"):
+            raise SystemExit(f"unknown update type: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def write_bytes() -> int:
+    """كل اللي العملية كتبته (write syscalls) - لينكس بس"""
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("wchar:"))
+    except (OSError, StopIteration):
+        return 0
+
+
+class UpdateFactory:
+    """تحديثات بشكل تيليجرام لكل نوع في الخليط"""
+
+    CALLBACKS = ["browse:available:0", "browse:available:3", "browse:pending:0", "browse:cooldown:0", "forecast", "logs:0:-1"]
+
+    def __init__(self, bulk_lines: int, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.bulk_lines = bulk_lines
+        self.update_id = 0
+        self.pasted = 0
+
+    def _user(self, admin_id: int) -> dict:
+        return {"id": admin_id, "is_bot": False, "first_name": f"Admin {admin_id}"}
+
+    def _message(self, admin_id: int, text: str) -> dict:
+        return {
+            "message_id": self.update_id,
+            "date": int(time.time()),
+            "chat": {"id": admin_id, "type": "private"},
+            "from": self._user(admin_id),
+            "text": text
+        }
+
+    def make(self, kind: str, admin_id: int) -> dict:
+        self.update_id += 1
+        if kind == "get":
+            return {"update_id": self.update_id, "message": self._message(admin_id, "📥 طلب حساب")}
+        if kind == "stats":
+            return {"update_id": self.update_id, "message": self._message(admin_id, "📊 الإحصائيات")}
+        if kind == "bulk":
+            lines = []
+            for _ in range(self.bulk_lines):
+                self.pasted += 1
+                lines.append(f"paste{self.pasted}@example.com:pw{self.rng.randint(0, 99_999)}")
+            return {"update_id": self.update_id, "message": self._message(admin_id, "\n".join(lines))}
+        message = self._message(admin_id, "…")
+        message["from"] = {"id": 1, "is_bot": True, "first_name": "Fake"}
+        return {
+            "update_id": self.update_id,
+            "callback_query": {
+                "id": str(self.update_id),
+                "from": self._user(admin_id),
+                "chat_instance": str(admin_id),
+                "message": message,
+                "data": self.rng.choice(self.CALLBACKS)
+            }
+        }
+
+
+async def run_load(accounts: int, updates: int, admins: int, mix: dict, bulk_lines: int) -> dict:
+    import logging
+    logging.disable(logging.CRITICAL)
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    from fake_bot_api import FakeBotAPI
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+    from telegram.request import BaseRequest
+
+    class FakeBotRequest(BaseRequest):
+        """Bot API جوه العملية: الطلب بيروح لـ FakeBotAPI.call مباشرة"""
+
+        def __init__(self, api: FakeBotAPI):
+            self.api = api
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                             connect_timeout=None, pool_timeout=None):
+            params = request_data.parameters if request_data is not None else {}
+            result = await self.api.call(url.rsplit("/", 1)[-1], params)
+            return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    # قاعدة فيها accounts حساب متاح
+    manager = app.account_manager
+    manager.db["settings"]["pending_hours"] = 0
+    manager.add_accounts_bulk([(f"user{i}@example.com", f"pass{i}") for i in range(accounts)])
+    manager.flush_database(timeout=60)
+    manager.compact_database(background=False)
+    manager.db["settings"]["pending_hours"] = 36
+    admin_ids = list(range(FIRST_ADMIN_ID, FIRST_ADMIN_ID + admins))
+    app.ADMIN_IDS.extend(admin_ids)
+    # الخادم الوهمي مش بيطبق حدود فطابور الإرسال مش محتاجها
+    app.send_queue = app.SendQueue(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+
+    api = FakeBotAPI([])
+    request = FakeBotRequest(api)
+    application = app.build_application(
+        Application.builder().token("123456:LOAD").request(request).get_updates_request(FakeBotRequest(api)).updater(None)
+    )
+    done = {}
+
+    async def handled(update: Update, context):
+        event = done.pop(update.update_id, None)
+        if event is not None:
+            event.set()
+
+    # group بعد الـ handlers الحقيقية فبيشتغل بعد ما الـ handler يخلص
+    application.add_handler(TypeHandler(Update, handled), group=1)
+    await application.initialize()
+    await application.start()
+
+    factory = UpdateFactory(bulk_lines)
+    kinds, weights = zip(*mix.items())
+    rng = random.Random(accounts)
+    plan = rng.choices(kinds, weights, k=updates)
+    latencies = {kind: [] for kind in kinds}
+    next_index = 0
+
+    async def admin(admin_id: int):
+        nonlocal next_index
+        while next_index < len(plan):
+            kind = plan[next_index]
+            next_index += 1
+            update = Update.de_json(factory.make(kind, admin_id), application.bot)
+            event = done[update.update_id] = asyncio.Event()
+            start = time.perf_counter()
+            await application.update_queue.put(update)
+            await event.wait()
+            latencies[kind].append(time.perf_counter() - start)
+
+    def storage_writes() -> int:
+        return sum(row["count"] for row in app.metrics.summary()
+                   if row["kind"] == "storage" and row["name"] in WRITE_OPERATIONS)
+
+    writes_before = storage_writes()
+    bytes_before = write_bytes()
+    start = time.perf_counter()
+    await asyncio.gather(*(admin(admin_id) for admin_id in admin_ids))
+    elapsed = time.perf_counter() - start
+    manager.flush_database(timeout=60)
+    written = write_bytes() - bytes_before
+    db_writes = storage_writes() - writes_before
+
+    await app.send_queue.flush(30)
+    await application.stop()
+    await application.shutdown()
+
+    def percentiles(values: list) -> dict:
+        values = sorted(values)
+        if not values:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "p50": values[len(values) // 2] * 1000,
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+            "p99": values[min(len(values) - 1, int(len(values) * 0.99))] * 1000
+        }
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "accounts": accounts,
+        "throughput": len(everything) / elapsed,
+        "all": percentiles(everything),
+        "kinds": {kind: percentiles(values) for kind, values in latencies.items()},
+        "written_mb": written / 1024 / 1024,
+        "db_writes": db_writes,
+        "api_calls": len(api.calls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", default=DEFAULT_ACCOUNTS, help="أحجام القاعدة مفصولة بفاصلة")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--admins", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="النوع=الوزن: get, stats, bulk, callback")
+    parser.add_argument("--bulk-lines", type=int, default=50, help="عدد الحسابات في كل لصق")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.child is not None:
+        # app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+        os.chdir(tempfile.mkdtemp(prefix="bench_load_"))
+        result = asyncio.run(run_load(args.child, args.updates, args.admins, mix, args.bulk_lines))
+        print(json.dumps(result))
+        return
+
+    print(f"{args.updates} updates from {args.admins} admins, mix {args.mix}, {args.bulk_lines} lines per paste, "
+          f"backend {os.environ.get('STORAGE_BACKEND', 'json')}")
+    print(f"{'accounts':>9} {'type':>9} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    summary = []
+    for accounts in (int(value) for value in args.accounts.split(",")):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(accounts), "--updates", str(args.updates),
+             "--admins", str(args.admins), "--mix", args.mix, "--bulk-lines", str(args.bulk_lines)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for kind, stats in list(result["kinds"].items()) + [("all", result["all"])]:
+            if stats["count"]:
+                print(f"{accounts:>9} {kind:>9} {stats['count']:>6} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f}")
+        summary.append(result)
+    print()
+    print(f"{'accounts':>9} {'updates/s':>10} {'written MB':>11} {'KB/update':>10} {'db writes':>10} {'api calls':>10}")
+    for result in summary:
+        print(f"{result['accounts']:>9} {result['throughput']:>10.1f} {result['written_mb']:>11.2f} "
+              f"{result['written_mb'] * 1024 / args.updates:>10.2f} {result['db_writes']:>10} {result['api_calls']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""قياس الاستخراج المتوازي (extract_credentials_async) مقابل الاستخراج inline على الـ event loop
+
+بيقيس الوقت الكلي وأطول توقف للـ event loop أثناء الاستخراج لكل عدد عمليات.
+الفرق في السرعة بيظهر على الأجهزة متعددة الأنوية بس، لكن الـ loop مبيتوقفش في الحالتين.
+
+التشغيل:
+    python benchmarks/bench_parse_pool.py
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_parse_pool_"))
+
+import app  # noqa: E402
+
+LINE_COUNT = 200_000
+WORKER_COUNTS = sorted({1, 2, 4, os.cpu_count() or 1})
+SEPARATORS = [" ", ":", "|", " | ", "\n", ";", ",", "\t", "="]
+TICK_SECONDS = 0.005
+
+
+def make_paste(count: int) -> str:
+    rng = random.Random(count)
+    lines = []
+    for i in range(count):
+        email = f"user{i}@{rng.choice(['gmail.com', 'yahoo.com', 'outlook.com'])}"
+        password = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789!#$") for _ in range(rng.randint(6, 14)))
+        lines.append(f"{email}{rng.choice(SEPARATORS)}{password}")
+    return "\n".join(lines)
+
+
+async def measure(parse) -> tuple:
+    """(الثواني، أطول توقف للـ loop بالملي ثانية، النتيجة) لدالة استخراج async"""
+    longest_stall = 0.0
+
+    async def ticker():
+        nonlocal longest_stall
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            now = time.perf_counter()
+            longest_stall = max(longest_stall, now - last - TICK_SECONDS)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    credentials = await parse()
+    elapsed = time.perf_counter() - start
+    # فرصة للـ ticker يلاحظ التوقف لو الاستخراج كان شغال على الـ loop نفسه
+    await asyncio.sleep(TICK_SECONDS * 2)
+    task.cancel()
+    return elapsed, longest_stall * 1000, credentials
+
+
+async def inline_parse(text: str):
+    return app.account_manager.extract_credentials(text)
+
+
+def main():
+    text = make_paste(LINE_COUNT)
+    print(f"{LINE_COUNT} combos, {len(text) / 1024 / 1024:.1f} MB, {os.cpu_count()} cpus")
+    print(f"{'mode':>12} {'seconds':>9} {'speed-up':>9} {'max stall ms':>13} {'found':>8}")
+
+    baseline, stall, expected = asyncio.run(measure(lambda: inline_parse(text)))
+    expected = list(dict.fromkeys(expected))
+    print(f"{'inline':>12} {baseline:>9.3f} {1:>9.2f} {stall:>13.1f} {len(expected):>8}")
+
+    for workers in WORKER_COUNTS:
+        app.PARSE_WORKERS = workers
+        # العمليات بتتعمل (fork) وتسخن هنا زي main() - الاستيراد مبيشغلش threads فالـ fork آمن
+        if app.start_parse_pool() is None:
+            raise SystemExit("parse pool needs fork and no running threads")
+        elapsed, stall, credentials = asyncio.run(measure(lambda: app.account_manager.extract_credentials_async(text)))
+        assert credentials == expected, "parallel result differs from inline"
+        print(f"{f'{workers} workers':>12} {elapsed:>9.3f} {baseline / elapsed:>9.2f} {stall:>13.1f} {len(credentials):>8}")
+        app._parse_pool.shutdown()
+        app._parse_pool = None
+
+
+if __name__ == "__main__":
+    main()
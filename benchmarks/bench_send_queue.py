@@ -0,0 +1,158 @@
+"""قياس طابور الإرسال (SendQueue) مقابل الإرسال المباشر من الـ handler تحت حدود تيليجرام
+
+بوت وهمي بيطبق حدود شبه تيليجرام (token bucket لكل chat وواحد عام) وبيرمي RetryAfter لما تتعدى،
+وكل طلب بياخد RTT_SECONDS. السيناريو: CHATS chat كل واحد بيطلب حساب (رسالة انتظار وحذفها ورسالتين بيانات)
+ومعاهم استيراد في chat لوحده بيعدل رسالة التقدم PROGRESS_EDITS مرة.
+المباشر بيستنى كل طلب وبينام مدة RetryAfter ويعيد (زي الـ handler لما بيقف)، والطابور بيرجع فوراً.
+
+التشغيل:
+    python benchmarks/bench_send_queue.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_send_queue_"))
+
+import logging  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+import app  # noqa: E402
+from telegram.error import RetryAfter  # noqa: E402
+
+CHATS = 20
+PROGRESS_EDITS = 100
+PROGRESS_INTERVAL = 0.05
+RTT_SECONDS = 0.03
+# حدود الخادم الوهمي (أوسع شوية من حدود الطابور) ومدة العقوبة لما تتعدى
+SERVER_CHAT_RATE = 1
+SERVER_CHAT_BURST = 4
+SERVER_GLOBAL_RATE = 30
+RETRY_AFTER = 3
+
+
+class FakeTelegram:
+    """بيعد الطلبات وبيرمي RetryAfter لما chat أو البوت كله يعدي الحد"""
+
+    def __init__(self):
+        self.global_bucket = app.TokenBucket(SERVER_GLOBAL_RATE, SERVER_GLOBAL_RATE)
+        self.buckets = {}
+        self.calls = 0
+        self.flood_errors = 0
+        self.delivered = {}
+        self.message_id = 0
+
+    async def request(self, chat_id: int, kind: str, text: str = ""):
+        await asyncio.sleep(RTT_SECONDS)
+        self.calls += 1
+        if kind != "delete":
+            now = time.monotonic()
+            bucket = self.buckets.setdefault(chat_id, app.TokenBucket(SERVER_CHAT_RATE, SERVER_CHAT_BURST))
+            if bucket.wait_time(now) > 0 or self.global_bucket.wait_time(now) > 0:
+                self.flood_errors += 1
+                raise RetryAfter(RETRY_AFTER)
+            bucket.take(now)
+            self.global_bucket.take(now)
+        self.delivered[chat_id] = time.monotonic()
+        self.message_id += 1
+        return FakeMessage(self, chat_id, self.message_id)
+
+
+class FakeMessage:
+    def __init__(self, telegram: FakeTelegram, chat_id: int, message_id: int = 0):
+        self.telegram = telegram
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def reply_text(self, text: str, **kwargs):
+        return await self.telegram.request(self.chat_id, "send", text)
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self.telegram.request(self.chat_id, "edit", text)
+
+    async def delete(self):
+        return await self.telegram.request(self.chat_id, "delete")
+
+
+async def direct(call):
+    """الإرسال المباشر: الـ handler بيستنى ولو جاله RetryAfter بينام ويعيد"""
+    while True:
+        try:
+            return await call()
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def get_account_direct(message: FakeMessage):
+    wait_msg = await direct(lambda: message.reply_text("wait"))
+    await direct(wait_msg.delete)
+    await direct(lambda: message.reply_text("email"))
+    await direct(lambda: message.reply_text("password"))
+
+
+async def get_account_queued(message: FakeMessage):
+    wait_msg = app.send_queue.reply(message, "wait")
+    wait_msg.delete()
+    app.send_queue.reply(message, "email")
+    app.send_queue.reply(message, "password")
+
+
+async def import_direct(message: FakeMessage):
+    progress = await direct(lambda: message.reply_text("0%"))
+    for i in range(PROGRESS_EDITS):
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        await direct(lambda: progress.edit_text(f"{i}%"))
+
+
+async def import_queued(message: FakeMessage):
+    progress = app.send_queue.reply(message, "0%")
+    for i in range(PROGRESS_EDITS):
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        progress.edit_text(f"{i}%")
+
+
+async def scenario(queued: bool) -> dict:
+    telegram = FakeTelegram()
+    get_account = get_account_queued if queued else get_account_direct
+    import_file = import_queued if queued else import_direct
+    handler_times = []
+
+    async def timed(handler, message):
+        start = time.monotonic()
+        await handler(message)
+        handler_times.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(
+        timed(import_file, FakeMessage(telegram, 0)),
+        *(timed(get_account, FakeMessage(telegram, chat_id)) for chat_id in range(1, CHATS + 1))
+    )
+    if queued:
+        await app.send_queue.flush()
+    handler_times.sort()
+    return {
+        "handler_p50": handler_times[len(handler_times) // 2] * 1000,
+        "handler_max": handler_times[-1] * 1000,
+        "delivered_s": max(telegram.delivered.values()) - start,
+        "calls": telegram.calls,
+        "flood": telegram.flood_errors
+    }
+
+
+def main():
+    print(f"{CHATS} chats requesting an account + 1 import with {PROGRESS_EDITS} progress edits, "
+          f"RTT {RTT_SECONDS * 1000:.0f} ms, RetryAfter {RETRY_AFTER}s")
+    print(f"{'mode':>8} {'handler p50 ms':>15} {'handler max ms':>15} {'all delivered s':>16} {'api calls':>10} {'RetryAfter':>11}")
+    for mode, queued in (("direct", False), ("queue", True)):
+        result = asyncio.run(scenario(queued))
+        print(f"{mode:>8} {result['handler_p50']:>15.1f} {result['handler_max']:>15.1f} "
+              f"{result['delivered_s']:>16.2f} {result['calls']:>10} {result['flood']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""قياس وقت التشغيل لحد أول تحديث: snapshot JSON مقابل الـ snapshot الثنائي (SNAPSHOT_FORMAT=binary)
+
+كل قياس بيشتغل في عملية جديدة (import app ثم أول قراءة إحصائيات زي أول رسالة بتوصل للبوت)
+على قاعدة فيها COUNT حساب، ومعاه زمن قراءة الملف نفسه
+(json.loads مقابل BinarySnapshot.load اللي بيرجع الأعمدة كمان).
+
+التشغيل:
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COUNT = 200_000
+REPEATS = 3
+
+# بيتنفذ في عملية جديدة: الوقت من أول سطر لحد ما أول قراءة تخلص
+CHILD = """
+import time
+start = time.perf_counter()
+import logging, sys
+sys.path.insert(0, {root!r})
+logging.disable(logging.INFO)
+import app
+app.account_manager.get_statistics()
+print(time.perf_counter() - start)
+"""
+
+
+def make_db(count: int) -> dict:
+    rng = random.Random(count)
+    now = datetime.now()
+    accounts = {}
+    for i in range(count):
+        status = rng.choice(["pending", "available", "used"])
+        accounts[f"user{i}@example.com"] = {
+            "password": "PsPcXbox999" if rng.random() < 0.3 else f"pass{rng.randint(0, 99_999)}",
+            "added_at": now.isoformat(),
+            "available_at": (now + timedelta(seconds=rng.randint(-200_000, 200_000))).isoformat(),
+            "status": status,
+            "last_used": None if status == "pending" else now.isoformat(),
+            "use_count": rng.randint(0, 9),
+            "priority": 1
+        }
+    return {
+        "accounts": accounts,
+        "settings": {"pending_hours": 36, "cooldown_hours": 36, "fixed_password": "PsPcXbox999"},
+        "stats": {"total_requests": 0, "successful_requests": 0, "last_restart": now.isoformat()},
+        "journal_seq": 0
+    }
+
+
+def time_to_first_update(workdir: str, snapshot_format: str) -> float:
+    env = dict(os.environ, SNAPSHOT_FORMAT=snapshot_format, STORAGE_BACKEND="json")
+    best = float("inf")
+    for _ in range(REPEATS):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=ROOT)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        best = min(best, float(output.strip().splitlines()[-1]))
+    return best
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    json_dir = tempfile.mkdtemp(prefix="bench_startup_json_")
+    binary_dir = tempfile.mkdtemp(prefix="bench_startup_bin_")
+    # app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+    os.chdir(tempfile.mkdtemp(prefix="bench_startup_"))
+    from app import DB_FILE, BINARY_DB_FILE, Account, BinarySnapshot
+
+    db = make_db(COUNT)
+    with open(os.path.join(json_dir, DB_FILE), "w", encoding="utf-8") as f:
+        json.dump(db, f, ensure_ascii=False)
+    with open(os.path.join(binary_dir, BINARY_DB_FILE), "wb") as f:
+        records = {email: Account.from_dict(data) for email, data in db["accounts"].items()}
+        f.write(BinarySnapshot.encode(dict(db, accounts=records), 0))
+
+    json_path = os.path.join(json_dir, DB_FILE)
+    binary_path = os.path.join(binary_dir, BINARY_DB_FILE)
+    start = time.perf_counter()
+    with open(json_path, encoding="utf-8") as f:
+        json.loads(f.read())
+    json_read = time.perf_counter() - start
+    start = time.perf_counter()
+    BinarySnapshot.load(binary_path)
+    binary_read = time.perf_counter() - start
+
+    print(f"{COUNT} accounts")
+    print(f"{'':>24} {'json':>10} {'binary':>10}")
+    print(f"{'file MB':>24} {os.path.getsize(json_path) / 1024 / 1024:>10.1f} "
+          f"{os.path.getsize(binary_path) / 1024 / 1024:>10.1f}")
+    # الثنائي بيرجع الحسابات والأعمدة والفهرس المترتب جاهزين، JSON بيرجع الحسابات بس
+    print(f"{'load s':>24} {json_read:>10.2f} {binary_read:>10.2f}")
+    print(f"{'time to first update s':>24} {time_to_first_update(json_dir, 'json'):>10.2f} "
+          f"{time_to_first_update(binary_dir, 'binary'):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
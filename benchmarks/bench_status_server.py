@@ -0,0 +1,138 @@
+"""قياس زمن /health تحت طلبات متزامنة: Flask في خيط منفصل (الوضع الحالي) مقابل StatusServer على event loop البوت
+
+في الحالتين فيه event loop "بوت" شغال عليه حمل ثابت (قراءة إحصائيات كل TICK_SECONDS) زي رسايل بتوصل،
+في وضع flask الـ loop في خيط لوحده وFlask (threaded) في خيط تاني، وفي الوضع المدمج الخادم على نفس الـ loop.
+العميل بيشتغل في عملية منفصلة عشان ميزاحمش الخادم على الـ GIL، وكل طلب على اتصال جديد في الحالتين.
+
+التشغيل:
+    python benchmarks/bench_status_server.py
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCOUNTS = 20_000
+CONCURRENCY = [1, 10, 50]
+REQUESTS_PER_CLIENT = 200
+TICK_SECONDS = 0.01
+
+
+async def probe(port: int, concurrency: int, count: int) -> dict:
+    """concurrency عميل كل واحد بيبعت count طلب ورا بعض، والنتيجة أزمنة كل الطلبات"""
+    latencies = []
+
+    async def client():
+        for _ in range(count):
+            start = time.perf_counter()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            assert response.startswith(b"HTTP/1.") and b" 200 " in response.split(b"\r\n", 1)[0], response[:80]
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "max": latencies[-1] * 1000
+    }
+
+
+def run_client(port: int, concurrency: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--client", str(port), str(concurrency), str(REQUESTS_PER_CLIENT)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+async def bot_workload(app):
+    """حمل ثابت على loop البوت: قراءة إحصائيات زي اللي بتحصل مع كل رسالة"""
+    while True:
+        app.account_manager.get_statistics()
+        await asyncio.sleep(TICK_SECONDS)
+
+
+def start_bot_loop(app, status_server=None) -> asyncio.AbstractEventLoop:
+    """event loop في خيط لوحده عليه حمل البوت (ومعاه الخادم المدمج لو اتبعت)"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.create_task(bot_workload(app))
+        if status_server is not None:
+            loop.run_until_complete(status_server.start())
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+def stop_bot_loop(loop: asyncio.AbstractEventLoop, status_server=None):
+    async def shutdown():
+        if status_server is not None:
+            await status_server.stop()
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def main():
+    if sys.argv[1:2] == ["--client"]:
+        port, concurrency, count = map(int, sys.argv[2:5])
+        print(json.dumps(asyncio.run(probe(port, concurrency, count))))
+        return
+
+    import logging
+    sys.path.insert(0, ROOT)
+    # app.py بينشئ قاعدة بيانات في المجلد الحالي وقت الاستيراد
+    os.chdir(tempfile.mkdtemp(prefix="bench_status_server_"))
+    logging.disable(logging.INFO)
+    import app
+    from werkzeug.serving import make_server
+
+    app.account_manager.add_accounts_bulk([(f"user{i}@example.com", f"pass{i}") for i in range(ACCOUNTS)])
+
+    # الوضع الحالي: Flask threaded في خيط وloop البوت في خيط تاني
+    flask_server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=flask_server.serve_forever, daemon=True).start()
+    flask_loop = start_bot_loop(app)
+    flask_results = {concurrency: run_client(flask_server.server_port, concurrency) for concurrency in CONCURRENCY}
+    flask_server.shutdown()
+    stop_bot_loop(flask_loop)
+
+    # الوضع المدمج: الخادم على نفس loop البوت
+    status_server = app.StatusServer("127.0.0.1", 0)
+    integrated_loop = start_bot_loop(app, status_server)
+    integrated_results = {concurrency: run_client(status_server.port, concurrency) for concurrency in CONCURRENCY}
+    stop_bot_loop(integrated_loop, status_server)
+
+    print(f"{ACCOUNTS} accounts, GET /health, {REQUESTS_PER_CLIENT} requests per client, {os.cpu_count()} cpus")
+    print(f"{'mode':>12} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode, results in (("flask", flask_results), ("integrated", integrated_results)):
+        for concurrency, result in results.items():
+            print(f"{mode:>12} {concurrency:>8} {result['rps']:>8.0f} {result['p50']:>8.2f} "
+                  f"{result['p95']:>8.2f} {result['p99']:>8.2f} {result['max']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
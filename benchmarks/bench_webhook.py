@@ -0,0 +1,127 @@
+"""قياس استقبال التحديثات: polling مقابل webhook (UPDATE_MODE) ضد خادم Bot API محلي (fake_bot_api.py)
+
+البوت بيشتغل في عملية منفصلة (SERVE_MODE=integrated) وبيتوجه للخادم المحلي بـ BOT_API_URL.
+الخادم بيعيد تشغيل UPDATES تحديث /start من الأدمن (كل واحد من chat مختلف) مرة عادي ومرة البوت بياخد SIGUSR1
+في النص فبيعيد التشغيل. الزمن من إتاحة التحديث لحد أول sendMessage للـ chat بتاعه، والتحديثات اللي مترد عليهاش ضاعت.
+
+التشغيل:
+    python benchmarks/bench_webhook.py
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_bot_api import FakeBotAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPDATES = 200
+INTERVAL = 0.02
+ADMIN_ID = 1124247595
+SETTLE_SECONDS = 15
+
+
+def make_updates(count: int) -> list:
+    """تحديثات /start بشكل تيليجرام بالظبط - chat مختلف لكل تحديث عشان الرد يتربط بيه"""
+    now = int(time.time())
+    return [{
+        "update_id": 1000 + i,
+        "message": {
+            "message_id": i + 1,
+            "date": now,
+            "chat": {"id": 50_000 + i, "type": "private", "first_name": "Admin"},
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    } for i in range(count)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for(predicate, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    return predicate()
+
+
+async def run_mode(mode: str, updates: list, restart: bool) -> dict:
+    api = FakeBotAPI(updates, INTERVAL)
+    api_port = await api.start()
+    bot_port = free_port()
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="123456:FAKE",
+        BOT_API_URL=f"http://127.0.0.1:{api_port}",
+        SERVE_MODE="integrated",
+        UPDATE_MODE=mode,
+        PORT=str(bot_port),
+        WEBHOOK_URL=f"http://127.0.0.1:{bot_port}",
+        WEBHOOK_SECRET="bench-secret"
+    )
+    bot = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "app.py")],
+        cwd=tempfile.mkdtemp(prefix=f"bench_webhook_{mode}_"), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        # البوت جاهز لما يسجل الـ webhook أو يبدأ getUpdates
+        ready = {"webhook": "setWebhook", "polling": "getUpdates"}[mode]
+        if not await wait_for(lambda: any(name == ready for _, name, _ in api.calls), 30):
+            raise RuntimeError(f"{mode}: bot did not start")
+        if restart:
+            # إعادة تشغيل البوت في نص التحديثات
+            asyncio.get_running_loop().call_later(len(updates) * INTERVAL / 2, os.kill, bot.pid, signal.SIGUSR1)
+        await api.replay()
+        await wait_for(lambda: len(api.replies()) >= len(updates), SETTLE_SECONDS)
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        try:
+            # الخادم المحلي لازم يفضل يرد وقت إيقاف البوت
+            await asyncio.to_thread(bot.wait, 10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        await api.stop()
+
+    replies = api.replies()
+    latencies = sorted(
+        (replies[update["message"]["chat"]["id"]] - api.available_at[update["update_id"]]) * 1000
+        for update in updates if update["message"]["chat"]["id"] in replies
+    )
+    return {
+        "answered": len(latencies),
+        "lost": len(updates) - len(latencies),
+        "p50": latencies[len(latencies) // 2] if latencies else float("nan"),
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else float("nan"),
+        "max": latencies[-1] if latencies else float("nan")
+    }
+
+
+def main():
+    updates = make_updates(UPDATES)
+    # نسخة من التحديثات المتسجلة لتشغيل fake_bot_api.py يدوي
+    recorded = os.path.join(tempfile.gettempdir(), "bench_webhook_updates.jsonl")
+    with open(recorded, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(update, ensure_ascii=False) + "\n" for update in updates)
+
+    print(f"{UPDATES} updates every {INTERVAL * 1000:.0f} ms (recorded in {recorded})")
+    print(f"{'mode':>10} {'restart':>8} {'answered':>9} {'lost':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for restart in (False, True):
+        for mode in ("polling", "webhook"):
+            result = asyncio.run(run_mode(mode, updates, restart))
+            print(f"{mode:>10} {'yes' if restart else 'no':>8} {result['answered']:>9} {result['lost']:>6} "
+                  f"{result['p50']:>9.1f} {result['p95']:>9.1f} {result['max']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
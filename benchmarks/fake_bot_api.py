@@ -0,0 +1,236 @@
+"""خادم Bot API محلي للاختبار: بيعيد تشغيل تحديثات متسجلة على البوت (webhook أو getUpdates) وبيسجل الردود
+
+بيرد على الطرق اللي البوت بيستخدمها (getMe وsetWebhook وdeleteWebhook وgetUpdates وsendMessage ...)
+وأي طريقة تانية بترجع true. التحديثات بتتاح واحد ورا التاني بفاصل ثابت:
+- لو فيه webhook متسجل بتتبعت POST بالترتيب ومع كل رد غير 200 بيعيد المحاولة بعد RETRY_SECONDS زي تيليجرام
+- غير كده بتستنى getUpdates، وdrop_pending_updates بيمسح اللي لسه متسلمش
+
+التشغيل (البوت بيتوجه له بـ BOT_API_URL=http://127.0.0.1:8081):
+    python benchmarks/fake_bot_api.py --port 8081 --updates recorded_updates.jsonl
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+import httpx
+
+RETRY_SECONDS = 0.5
+
+
+class FakeBotAPI:
+    def __init__(self, updates: list, interval: float = 0.02):
+        self.updates = updates
+        self.interval = interval
+        self.webhook_url = None
+        self.secret = None
+        # تحديثات متاحة ولسه متسلمتش (getUpdates) - (update_id, التحديث)
+        self.pending = deque()
+        self.available_at = {}
+        self.acknowledged = {}
+        self.dropped = set()
+        # (الوقت، الطريقة، الباراميترز) لكل طلب من البوت
+        self.calls = []
+        self._changed = asyncio.Condition()
+        self._webhook_queue = asyncio.Queue()
+        self._message_id = 0
+        self._server = None
+        self._tasks = []
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self._tasks.append(asyncio.create_task(self._deliver_webhooks()))
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def replay(self):
+        """إتاحة التحديثات المتسجلة واحد ورا التاني"""
+        for update in self.updates:
+            update_id = update["update_id"]
+            self.available_at[update_id] = time.perf_counter()
+            async with self._changed:
+                self.pending.append((update_id, update))
+                self._changed.notify_all()
+            if self.webhook_url:
+                self._webhook_queue.put_nowait(update_id)
+            await asyncio.sleep(self.interval)
+
+    def replies(self, method: str = "sendMessage") -> dict:
+        """chat_id -> وقت أول رد من الطريقة دي"""
+        first = {}
+        for at, name, params in self.calls:
+            if name == method:
+                first.setdefault(int(params["chat_id"]), at)
+        return first
+
+    def _pop_pending(self, update_id: int):
+        for index, (pending_id, _) in enumerate(self.pending):
+            if pending_id == update_id:
+                del self.pending[index]
+                return
+
+    async def _deliver_webhooks(self):
+        async with httpx.AsyncClient(timeout=10) as client:
+            while True:
+                update_id = await self._webhook_queue.get()
+                update = self.available_update(update_id)
+                while update is not None and self.webhook_url:
+                    headers = {"X-Telegram-Bot-Api-Secret-Token": self.secret} if self.secret else {}
+                    try:
+                        response = await client.post(self.webhook_url, json=update, headers=headers)
+                        if response.status_code == 200:
+                            self.acknowledged[update_id] = time.perf_counter()
+                            self._pop_pending(update_id)
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    await asyncio.sleep(RETRY_SECONDS)
+
+    def available_update(self, update_id: int):
+        for pending_id, update in self.pending:
+            if pending_id == update_id:
+                return update
+        return None
+
+    def _drop_pending(self):
+        self.dropped.update(update_id for update_id, _ in self.pending)
+        self.pending.clear()
+
+    def _message(self, params: dict, **fields) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        }
+        message.update(fields)
+        return message
+
+    async def call(self, method: str, params: dict):
+        self.calls.append((time.perf_counter(), method, params))
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+                    "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method == "setWebhook":
+            if params.get("drop_pending_updates"):
+                self._drop_pending()
+            self.webhook_url = params["url"]
+            self.secret = params.get("secret_token")
+            # اللي اتاح قبل تسجيل الـ webhook بيتبعت عليه بالترتيب
+            for update_id, _ in list(self.pending):
+                self._webhook_queue.put_nowait(update_id)
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            if params.get("drop_pending_updates"):
+                self._drop_pending()
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": len(self.pending)}
+        if method == "getUpdates":
+            return await self._get_updates(int(params.get("offset") or 0), float(params.get("timeout") or 0))
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params, text=params.get("text", ""))
+        if method == "sendDocument":
+            return self._message(params, document={"file_id": "fake", "file_unique_id": "fake"})
+        return True
+
+    async def _get_updates(self, offset: int, timeout: float) -> list:
+        # offset بيأكد استلام كل اللي قبله
+        while self.pending and self.pending[0][0] < offset:
+            update_id, _ = self.pending.popleft()
+            self.acknowledged[update_id] = time.perf_counter()
+        async with self._changed:
+            if not self.pending:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return [update for _, update in self.pending]
+
+    @staticmethod
+    def _params(body: bytes, content_type: str) -> dict:
+        """PTB بيبعت form فيها كل قيمة مش نصية JSON، وبعض العملاء بيبعتوا JSON مباشرة"""
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        params = {}
+        for key, values in parse_qs(body.decode("utf-8")).items():
+            try:
+                params[key] = json.loads(values[0])
+            except ValueError:
+                params[key] = values[0]
+        return params
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                _, target, _ = request_line.decode("latin-1").split()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                method = target.split("?")[0].rsplit("/", 1)[-1]
+                content_type = headers.get("content-type", "")
+                if content_type.startswith("multipart/"):
+                    # الملفات مش محتاجين محتواها - الرد على الطريقة بس
+                    params = {"chat_id": 0}
+                else:
+                    params = self._params(body, content_type)
+                result = await self.call(method, params)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def serve(port: int, updates: list, interval: float, delay: float):
+    api = FakeBotAPI(updates, interval)
+    port = await api.start(port=port)
+    print(f"fake Bot API on http://127.0.0.1:{port} - {len(updates)} updates after {delay}s")
+    await asyncio.sleep(delay)
+    await api.replay()
+    while len(api.acknowledged) + len(api.dropped) < len(updates):
+        await asyncio.sleep(0.5)
+    print(f"acknowledged {len(api.acknowledged)}, dropped {len(api.dropped)}, replies {len(api.replies())}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--updates", required=True, help="ملف JSONL فيه تحديث تيليجرام في كل سطر")
+    parser.add_argument("--interval", type=float, default=0.02, help="الفاصل بين التحديثات بالثواني")
+    parser.add_argument("--delay", type=float, default=5, help="وقت الانتظار قبل أول تحديث (لحد ما البوت يشتغل)")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, load_updates(args.updates), args.interval, args.delay))
+
+
+if __name__ == "__main__":
+    main()